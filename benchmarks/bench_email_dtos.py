@@ -0,0 +1,120 @@
+"""Compare the slotted Message DTOs with the previous dataclasses.
+
+Builds a synthetic Graph page of --messages messages (HTML body, several
+recipients), then for each implementation measures parse throughput,
+to_dict round-trip time, peak memory per message while the page is alive
+and the memory retained once the page itself has been released
+(tracemalloc, so the JSON text is not counted).
+
+    python benchmarks/bench_email_dtos.py --messages 10000
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "email_processer"))
+sys.path.insert(0, os.path.dirname(__file__))
+
+import legacy_email_dtos  # noqa: E402
+from utils import email_dtos  # noqa: E402
+
+
+def recipient(i: int) -> dict:
+    return {"emailAddress": {"name": f"Person {i}", "address": f"person{i}@vendor{i % 50}.example.com"}}
+
+
+def build_page(messages: int) -> str:
+    html = "<html><body>" + "<p>Please find attached the reconciliation report.</p>" * 60 + "</body></html>"
+    values = []
+    for i in range(messages):
+        values.append({
+            "@odata.etag": f"W/\"CQAAABYAAAA{i}\"",
+            "id": f"AAMkAGI2TG93AAA{i:08d}",
+            "createdDateTime": "2025-10-01T08:15:00Z",
+            "lastModifiedDateTime": "2025-10-01T08:15:02Z",
+            "changeKey": f"CQAAABYAAAA{i}",
+            "categories": [],
+            "receivedDateTime": "2025-10-01T08:15:00Z",
+            "sentDateTime": "2025-10-01T08:14:58Z",
+            "hasAttachments": True,
+            "internetMessageId": f"<{i}@vendor.example.com>",
+            "subject": f"Daily reconciliation report {i}",
+            "bodyPreview": "Please find attached the reconciliation report.",
+            "importance": "normal",
+            "parentFolderId": "AAMkAGI2TG93AAAuAAAAAAA",
+            "conversationId": f"AAQkAGI2TG93{i}",
+            "conversationIndex": "AQHW8Vz2",
+            "isDeliveryReceiptRequested": False,
+            "isReadReceiptRequested": False,
+            "isRead": False,
+            "isDraft": False,
+            "webLink": f"https://outlook.office365.com/owa/?ItemID=AAMkAGI2TG93AAA{i:08d}",
+            "inferenceClassification": "focused",
+            "body": {"contentType": "html", "content": html},
+            "sender": recipient(i),
+            "from": recipient(i),
+            "toRecipients": [recipient(i + 1), recipient(i + 2), recipient(i + 3)],
+            "ccRecipients": [recipient(i + 4), recipient(i + 5)],
+            "bccRecipients": [],
+            "replyTo": [recipient(i)],
+            "flag": {"flagStatus": "notFlagged"}
+        })
+    return json.dumps({"@odata.context": "https://graph.microsoft.com/v1.0/$metadata#users('x')/messages", "value": values})
+
+
+def measure(label: str, message_cls, text: str):
+    count = len(json.loads(text)["value"])
+
+    # Parse throughput, starting from decoded JSON like graph_api_util does.
+    values = json.loads(text)["value"]
+    start = time.perf_counter()
+    messages = [message_cls.from_dict(m) for m in values]
+    parse_s = time.perf_counter() - start
+
+    # Typical access pattern of the timer and the processor.
+    start = time.perf_counter()
+    for m in messages:
+        m.id, m.subject, m.receivedDateTime, m.from_.emailAddress.address
+    access_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for m in messages:
+        m.to_dict()
+    to_dict_s = time.perf_counter() - start
+    del messages, values
+    gc.collect()
+
+    # Peak memory while the decoded page and its messages are both alive
+    # (as in graph_api_util), and memory retained once the page is dropped.
+    tracemalloc.start()
+    page = json.loads(text)
+    messages = [message_cls.from_dict(m) for m in page["value"]]
+    _, peak = tracemalloc.get_traced_memory()
+    del page
+    gc.collect()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del messages
+    gc.collect()
+
+    print(f"{label:<8} parse={count / parse_s:>10,.0f} msg/s  access={access_s * 1000:7.1f}ms  "
+          f"to_dict={to_dict_s * 1000:7.1f}ms  peak={peak / count:8,.0f} retained={retained / count:8,.0f} bytes/msg")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=10000)
+    args = parser.parse_args()
+
+    text = build_page(args.messages)
+    print(f"{args.messages} messages, page size {len(text) / 1024 / 1024:.1f} MiB")
+    measure("legacy", legacy_email_dtos.Message, text)
+    measure("slotted", email_dtos.Message, text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Compare the pandas DataFrame report path against ExcelReportWriter.
+
+Every (writer, rows) case runs in its own subprocess so that the reported
+peak RSS belongs to that case alone. Both paths write the columns of
+get_report_columns(), as the daily report does. The pandas case needs pandas
+installed (it is no longer a dependency of the report app); without it the
+run says so and measures the streaming writer only.
+
+    python benchmarks/bench_excel_report.py --rows 1000 100000 1000000
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "email-report-timer"))
+
+from utils.excel_report_writer import ExcelReportWriter, get_report_columns  # noqa: E402
+from utils.storage_table_entities import EmailAttachmentEntity  # noqa: E402
+
+
+def iter_entities(rows: int):
+    for i in range(rows):
+        yield EmailAttachmentEntity(
+            PartitionKey=f"AAMkAGI2TG93AAA{i // 3:08d}",
+            RowKey=f"AAMkAGI2TG93AAABEgAQ{i:08d}",
+            email_subject=f"Invoice {i} for October",
+            sender=f"billing@vendor{i % 50}.example.com",
+            receivedDateTime="2025-10-01T08:15:00Z",
+            processDateTime="2025-10-01T08:16:03.512000+00:00",
+            attachmentName=f"invoice-{i}.pdf",
+            extension=".pdf",
+            size=120000 + i,
+            siteId="contoso.sharepoint.com,1f0e3c1b,9a2d",
+            siteName="Vendors",
+            driveId="b!Xy2lZmVudG9yc0RyaXZl",
+            filepath=f"/Attachments/Vendor{i % 50}/{i:012x}-invoice-{i}.pdf",
+            reportDateTime=None,
+            contentHash=f"{i:064x}",
+            itemId=f"01BYE5RZ{i:08d}",
+            vendor=f"Vendor{i % 50}"
+        )
+
+
+def write_pandas(path: str, rows: int):
+    import pandas as pd
+    columns = get_report_columns()
+    data_dicts = [
+        {k: v for k, v in asdict(entity).items() if k in columns}
+        for entity in iter_entities(rows)
+    ]
+    pd.DataFrame(data_dicts, columns=columns).to_excel(path, index=False)
+
+
+def write_streaming(path: str, rows: int):
+    ExcelReportWriter(path, get_report_columns()).write_all(iter_entities(rows))
+
+
+def run_case(writer: str, rows: int):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "report.xlsx")
+        start = time.perf_counter()
+        (write_pandas if writer == "pandas" else write_streaming)(path, rows)
+        elapsed = time.perf_counter() - start
+        size = os.path.getsize(path)
+    # ru_maxrss is reported in KiB on Linux
+    peak_mib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps({"elapsed": elapsed, "peak_mib": peak_mib, "size": size}))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 100000, 1000000])
+    parser.add_argument("--case", nargs=2, metavar=("WRITER", "ROWS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        run_case(args.case[0], int(args.case[1]))
+        return
+
+    try:
+        import pandas
+        print(f"pandas {pandas.__version__}")
+        writers = ["pandas", "streaming"]
+    except ImportError:
+        print("pandas is not installed: the pandas comparison is MISSING, only the streaming writer is measured.")
+        writers = ["streaming"]
+
+    for rows in args.rows:
+        for writer in writers:
+            process = subprocess.run(
+                [sys.executable, __file__, "--case", writer, str(rows)],
+                capture_output=True, text=True
+            )
+            if process.returncode != 0:
+                # A negative code is the signal, e.g. -9 when the OOM killer stopped the case.
+                print(f"{writer:<10} rows={rows:<8} failed with exit code {process.returncode}")
+                continue
+            result = json.loads(process.stdout.strip().splitlines()[-1])
+            print(f"{writer:<10} rows={rows:<8} total={result['elapsed']:.2f}s "
+                  f"peak_rss={result['peak_mib']:.1f}MiB file={result['size'] / 1024 / 1024:.1f}MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Compare per-call requests.get against the shared HttpSession.
+
+Starts a local HTTP/1.1 keep-alive stub server, sends the same number of
+requests both ways and reports the number of TCP connections the server
+accepted and the mean latency per call.
+
+    python benchmarks/bench_http_session.py --calls 500
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "email_processer"))
+
+import requests  # noqa: E402
+
+from utils.http_session import HttpSession  # noqa: E402
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    connections = 0
+    connections_lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with StubHandler.connections_lock:
+            StubHandler.connections += 1
+
+    def do_GET(self):
+        body = b'{"value": []}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run(label: str, calls: int, send) -> float:
+    StubHandler.connections = 0
+    start = time.perf_counter()
+    for _ in range(calls):
+        response = send()
+        response.raise_for_status()
+    elapsed = time.perf_counter() - start
+    per_call_ms = elapsed / calls * 1000
+    print(f"{label:<18} calls={calls} connections={StubHandler.connections} total={elapsed:.3f}s per_call={per_call_ms:.3f}ms")
+    return per_call_ms
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=500)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/v1.0/me/messages"
+
+    try:
+        baseline = run("requests.get", args.calls, lambda: requests.get(url, timeout=5))
+        pooled = run("HttpSession", args.calls, lambda: HttpSession.request("GET", url))
+        print(f"saved per call: {baseline - pooled:.3f}ms ({(1 - pooled / baseline) * 100:.1f}%)")
+    finally:
+        HttpSession.close()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
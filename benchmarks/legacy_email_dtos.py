@@ -1,6 +1,7 @@
+# Message DTOs as they were before the slotted rewrite; kept only
+# as the baseline for bench_email_dtos.py.
 from dataclasses import dataclass
 from typing import List, Optional, Dict, Any
-import json
 
 @dataclass
 class EmailAddress:
@@ -199,4 +200,16 @@ class FileAttachment:
     size: int
     media_content_type: str   # corresponds to "@odata.mediaContentType"
     media_read_link: str      # corresponds to "@odata.mediaReadLink"
-    content_bytes: Optional[str] = None  # Base64 encoded content, may not be present in metadata response
\ No newline at end of file
+    content_bytes: Optional[str] = None  # Base64 encoded content, may not be present in metadata response
+
+    @staticmethod
+    def from_dict(obj: Dict[str, Any]) -> "FileAttachment":
+        return FileAttachment(
+            odata_type=obj.get("@odata.type", ""),
+            id=obj.get("id", ""),
+            name=obj.get("name", ""),
+            size=obj.get("size", 0),
+            media_content_type=obj.get("@odata.mediaContentType", ""),
+            media_read_link=obj.get("@odata.mediaReadLink", ""),
+            content_bytes=obj.get("contentBytes", None)
+        )
@@ -0,0 +1,117 @@
+"""Profile cold start of the function apps and check it against a budget.
+
+Each app is imported in a fresh interpreter (the way the Functions host
+loads function_app.py), once with -X importtime to record per-module import
+time and then --runs more times to measure cold-start wall time. With
+--budget the script exits non-zero when an app's median cold start exceeds
+its budget or when one of the budget's deferred modules is imported at
+startup, so it can run as a CI step:
+
+    python benchmarks/startup_profile.py --top 15
+    python benchmarks/startup_profile.py --budget benchmarks/startup_budget.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+APPS = ["email-timer", "email_processer", "email-report-timer"]
+
+# Imports the app module and reports its wall time and the modules it pulled in.
+PROBE = (
+    "import json, sys, time\n"
+    "start = time.perf_counter()\n"
+    "import {module}\n"
+    "elapsed = time.perf_counter() - start\n"
+    "print(json.dumps({{'elapsed_ms': elapsed * 1000, 'modules': sorted(sys.modules)}}))\n"
+)
+
+
+def run_probe(app: str, module: str, importtime: bool = False) -> Tuple[dict, str]:
+    command = [sys.executable]
+    if importtime:
+        command += ["-X", "importtime"]
+    command += ["-c", PROBE.format(module=module)]
+    # Runs with the real configuration; cache warm-ups start on the first invocation, not at import.
+    process = subprocess.run(command, cwd=os.path.join(ROOT, app), capture_output=True, text=True)
+    if process.returncode != 0:
+        errors = [line for line in process.stderr.splitlines() if not line.startswith("import time:")]
+        raise Exception(f"Importing {module} in {app} failed:\n" + "\n".join(errors))
+    return json.loads(process.stdout.strip().splitlines()[-1]), process.stderr
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int]]:
+    # Lines look like "import time:   self [us] | cumulative | imported package".
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def profile_app(app: str, module: str, runs: int, top: int) -> Dict[str, object]:
+    result, stderr = run_probe(app, module, importtime=True)
+    imports = parse_importtime(stderr)
+    print(f"\n{app}: top {top} imports by cumulative time")
+    for name, self_us, cumulative_us in sorted(imports, key=lambda row: row[2], reverse=True)[:top]:
+        print(f"  {cumulative_us / 1000:9.1f}ms cumulative {self_us / 1000:8.1f}ms self  {name}")
+
+    timings = [run_probe(app, module)[0]["elapsed_ms"] for _ in range(runs)]
+    median_ms = statistics.median(timings)
+    print(f"{app}: cold start median={median_ms:.1f}ms min={min(timings):.1f}ms max={max(timings):.1f}ms over {runs} runs")
+    return {"median_ms": median_ms, "modules": result["modules"]}
+
+
+def check_budget(app: str, profile: Dict[str, object], budget: dict) -> List[str]:
+    failures = []
+    limit_ms = budget.get("cold_start_ms", {}).get(app)
+    if limit_ms is not None and profile["median_ms"] > limit_ms:
+        failures.append(f"{app}: cold start {profile['median_ms']:.1f}ms exceeds budget of {limit_ms}ms")
+    loaded = set(profile["modules"])
+    for module in budget.get("deferred_modules", []):
+        if module in loaded:
+            failures.append(f"{app}: {module} is imported at startup but should be deferred to first use")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--apps", nargs="+", default=APPS)
+    parser.add_argument("--module", default="function_app")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--budget", help="JSON file with cold_start_ms per app and deferred_modules")
+    args = parser.parse_args()
+
+    budget = None
+    if args.budget:
+        with open(args.budget) as f:
+            budget = json.load(f)
+
+    failures = []
+    for app in args.apps:
+        try:
+            profile = profile_app(app, args.module, args.runs, args.top)
+        except Exception as e:
+            failures.append(str(e))
+            continue
+        if budget is not None:
+            failures.extend(check_budget(app, profile, budget))
+
+    if failures:
+        print("\nStartup check failed:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    if budget is not None:
+        print("\nAll apps are within the startup budget.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,12 @@
-from datetime import timedelta, timezone, datetime
-from email.message import EmailMessage
+from datetime import timezone, datetime
 import logging
-import mimetypes
 from pathlib import Path
-import smtplib
-from typing import List
+from typing import Iterable, Iterator, List, Tuple
+import itertools
 import azure.functions as func
-from utils.storage_table_entities import EmailAttachmentEntity
+from utils.storage_table_entities import EmailAttachmentEntity, EmailAttachmentIndexEntity
 from utils.storage_table_util import StorageTableUtil
-import pandas as pd
-from dataclasses import asdict
+from utils.excel_report_writer import ExcelReportWriter, get_report_columns
 import os
 app = func.FunctionApp()
 
@@ -24,40 +21,70 @@ def daily_report_timer(myTimer: func.TimerRequest) -> None:
 
 def generate_report() -> str:
     table_name = os.getenv("STORAGE_TABLE_NAME")
-    # Fetch all attachments processed in the last 24 hours
-    attachments:List[EmailAttachmentEntity] = StorageTableUtil.get_all_attachments_processed_in_24hrs(table_name)
-    if not attachments:
+    index_table_name = get_index_table_name()
+    report_columns = get_report_columns()
+    # Fetch attachments processed in the last 24 hours page by page, reading only the report columns
+    if index_table_name:
+        # Only the last 24 hourly partitions of the report index are read.
+        pages = StorageTableUtil.iter_unreported_attachments_from_index(
+            index_table_name,
+            select=["PartitionKey", "RowKey", "emailId", "attachmentId"] + [c for c in report_columns if c not in ("PartitionKey", "RowKey")]
+        )
+    else:
+        pages = StorageTableUtil.iter_attachments_processed_in_24hrs(
+            table_name,
+            select=report_columns + ["processDateTime"]
+        )
+
+    # Only the keys are kept in memory to mark the rows as reported afterwards.
+    keys: List[Tuple[str, str]] = []
+    index_keys: List[Tuple[str, str]] = []
+
+    def iter_attachments() -> Iterator[EmailAttachmentEntity]:
+        for page in pages:
+            for entity in page:
+                if isinstance(entity, EmailAttachmentIndexEntity):
+                    index_keys.append((entity.PartitionKey, entity.RowKey))
+                    entity = entity.to_attachment_entity()
+                keys.append((entity.PartitionKey, entity.RowKey))
+                yield entity
+
+    attachments = iter_attachments()
+    first = next(attachments, None)
+    if first is None:
         logging.info("No attachments processed in the last 24 hours.")
         return "No attachments processed in the last 24 hours."
     # Convert to Excel
-    excel_file_path = convert_to_excel(attachments)
+    excel_file_path = convert_to_excel(itertools.chain([first], attachments))
     # send email with excel attachment
     send_gmail_with_attachment(excel_file_path)
     
     # Mark all as reported
-    mark_attachments_as_reported(attachments, table_name)
+    mark_attachments_as_reported(keys, table_name, index_table_name, index_keys)
     return "Report generated and email sent."  
 
 
-def convert_to_excel(attachments: List[EmailAttachmentEntity]) -> str:
-    data_dicts = [
-        {k: v for k, v in asdict(entity).items() if k != "isReported" and k != "processDateTime"}
-        for entity in attachments
-    ]
-
-    # Create a DataFrame
-    df = pd.DataFrame(data_dicts)
+def convert_to_excel(attachments: Iterable[EmailAttachmentEntity]) -> str:
     excel_file_name = os.getenv("EXCEL_FILE_NAME", "daily_report.xlsx")
     temp_dir = "/tmp"
-    os.makedirs(temp_dir, exist_ok=True)
-
     # Build full destination path
     destination_path = os.path.join(temp_dir, excel_file_name)
-    # Save to Excel
-    df.to_excel(destination_path, index=False)
+    # Rows are streamed into the workbook, one sheet per value of REPORT_SHEET_BY if set.
+    sheet_by_column = get_report_sheet_by_column()
+    writer = ExcelReportWriter(
+        destination_path,
+        get_report_columns(),
+        sheet_by=(lambda entity: getattr(entity, sheet_by_column, None)) if sheet_by_column else None
+    )
+    writer.write_all(attachments)
+    logging.info(f"Wrote {writer.row_count} rows to {destination_path} in {len(writer.sheets)} sheets.")
     return destination_path
 
 def send_gmail_with_attachment(excel_file: str):
+    # Mail modules are only needed once a report is sent, so they stay off the cold-start path.
+    import mimetypes
+    import smtplib
+    from email.message import EmailMessage
     SMTP_SERVER = "smtp.gmail.com"       # e.g., Gmail SMTP
     SMTP_PORT = 587
     SENDER_EMAIL = os.getenv("SENDER_EMAIL")  # Your Gmail address
@@ -85,12 +112,28 @@ def send_gmail_with_attachment(excel_file: str):
 
             logging.info("Email sent successfully!")
 
-def mark_attachments_as_reported(attachments: List[EmailAttachmentEntity], table_name: str):
-    entities = []
-    for attachment in attachments:
+def mark_attachments_as_reported(keys: List[Tuple[str, str]], table_name: str, index_table_name: str = None,
+                                 index_keys: List[Tuple[str, str]] = None):
+    report_date_time = datetime.now(timezone.utc).isoformat()
+    # MERGE only the reporting columns
+    entities = [
+        {"PartitionKey": partition_key, "RowKey": row_key, "isReported": True, "reportDateTime": report_date_time}
+        for partition_key, row_key in keys
+    ]
+    StorageTableUtil.batch_update_entity(table_name, entities)
+    if index_table_name and index_keys:
+        index_entities = [
+            {"PartitionKey": partition_key, "RowKey": row_key, "isReported": True, "reportDateTime": report_date_time}
+            for partition_key, row_key in index_keys
+        ]
+        StorageTableUtil.batch_update_entity(index_table_name, index_entities)
 
-        attachment.isReported = True
-        attachment.processDateTime = datetime.now(timezone.utc)
-        entities.append(attachment.__dict__)
-    
-    StorageTableUtil.batch_update_entity(table_name, entities)
\ No newline at end of file
+
+def get_index_table_name() -> str:
+    # Set STORAGE_INDEX_TABLE_NAME to "" to fall back to scanning the attachments table.
+    return os.getenv("STORAGE_INDEX_TABLE_NAME", "AttachmentsByHour")
+
+
+def get_report_sheet_by_column() -> str:
+    # Column whose values split the report into sheets, e.g. "vendor"; empty for a single sheet.
+    return os.getenv("REPORT_SHEET_BY", "")
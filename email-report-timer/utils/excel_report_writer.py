@@ -0,0 +1,76 @@
+import os
+import re
+from dataclasses import fields
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from utils.storage_table_entities import EmailAttachmentEntity
+
+
+def get_report_columns() -> List[str]:
+    # Report columns in entity order; bookkeeping columns are left out.
+    excluded = ("isReported", "processDateTime", "contentHash", "itemId")
+    return [f.name for f in fields(EmailAttachmentEntity) if f.name not in excluded]
+
+
+class ExcelReportWriter:
+    # Streams report rows into an xlsx file with openpyxl's write-only mode:
+    # rows are serialised as they are appended, so memory stays flat no
+    # matter how many rows the report has. With sheet_by set, every distinct
+    # value (e.g. a vendor) gets its own sheet, created on first use.
+    default_sheet_name = "Sheet1"
+    max_sheet_name_length = 31
+    invalid_sheet_chars = re.compile(r"[\[\]:*?/\\]")
+
+    def __init__(self, path: str, columns: List[str], sheet_by: Optional[Callable[[Any], str]] = None):
+        # openpyxl is imported here so that it is only loaded when a report is written.
+        from openpyxl import Workbook
+        self.path = path
+        self.columns = columns
+        self.sheet_by = sheet_by
+        self.workbook = Workbook(write_only=True)
+        self.sheets: Dict[str, Any] = {}
+        self.row_count = 0
+
+    def get_sheet(self, name: str):
+        sheet_name = self.get_sheet_name(name)
+        sheet = self.sheets.get(sheet_name)
+        if sheet is None:
+            from openpyxl.cell import WriteOnlyCell
+            from openpyxl.styles import Font
+            sheet = self.workbook.create_sheet(title=sheet_name)
+            header = []
+            for column in self.columns:
+                cell = WriteOnlyCell(sheet, value=column)
+                cell.font = Font(bold=True)
+                header.append(cell)
+            sheet.append(header)
+            self.sheets[sheet_name] = sheet
+        return sheet
+
+    @classmethod
+    def get_sheet_name(cls, name: str) -> str:
+        name = cls.invalid_sheet_chars.sub("_", str(name or "")).strip("'") or "Other"
+        return name[:cls.max_sheet_name_length]
+
+    def append(self, row: Any):
+        # row is a dataclass entity or a dict keyed by column name.
+        if isinstance(row, dict):
+            values = [row.get(column) for column in self.columns]
+        else:
+            values = [getattr(row, column, None) for column in self.columns]
+        sheet_name = self.sheet_by(row) if self.sheet_by else self.default_sheet_name
+        self.get_sheet(sheet_name).append(values)
+        self.row_count += 1
+
+    def write_all(self, rows: Iterable[Any]) -> str:
+        for row in rows:
+            self.append(row)
+        return self.close()
+
+    def close(self) -> str:
+        if not self.sheets:
+            # An xlsx file needs at least one sheet.
+            self.get_sheet(self.default_sheet_name)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.workbook.save(self.path)
+        return self.path
@@ -1,5 +1,21 @@
-from dataclasses import dataclass
-from typing import Optional
+from dataclasses import MISSING, dataclass, fields
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+
+def build_entity(entity_cls, obj: Dict[str, Any]):
+    # Builds a table entity dataclass from a queried row. Columns that were not
+    # selected fall back to the field default (or None); properties the
+    # dataclass does not know about are ignored.
+    values = {}
+    for f in fields(entity_cls):
+        if f.name in obj:
+            values[f.name] = obj[f.name]
+        else:
+            values[f.name] = f.default if f.default is not MISSING else None
+    return entity_cls(**values)
+
+
 @dataclass
 class EmailAttachmentEntity:
     # Table Storage Keys
@@ -23,4 +39,157 @@ class EmailAttachmentEntity:
 
     # Reporting info
     isReported: bool = False
-    reportDateTime: Optional[str] = None
\ No newline at end of file
+    reportDateTime: Optional[str] = None
+
+    # SHA-256 of the content; attachments with the same hash share one uploaded file
+    contentHash: Optional[str] = None
+    itemId: Optional[str] = None    # OneDrive item holding the file
+
+    # Vendor matched from the sender domain, None when no vendor matched
+    vendor: Optional[str] = None
+
+    @staticmethod
+    def from_dict(obj: Dict[str, Any]) -> "EmailAttachmentEntity":
+        return build_entity(EmailAttachmentEntity, obj)
+
+
+@dataclass
+class EmailAttachmentIndexEntity:
+    # Secondary index of EmailAttachmentEntity for the daily report.
+    # Partitioned by processing hour so the report reads a short range of
+    # partitions instead of scanning the whole attachments table.
+    PartitionKey: str   # Processing hour bucket, "yyyyMMddHH" in UTC
+    RowKey: str         # "{email id}|{attachment id}"
+
+    emailId: str
+    attachmentId: str
+    email_subject: str
+    sender: str
+    receivedDateTime: str
+    processDateTime: str
+    attachmentName: str
+    extension: str
+    size: int
+    siteId: str
+    siteName: str
+    driveId: str
+    filepath: str
+    isReported: bool = False
+    reportDateTime: Optional[str] = None
+    contentHash: Optional[str] = None
+    itemId: Optional[str] = None
+    vendor: Optional[str] = None
+
+    @staticmethod
+    def from_dict(obj: Dict[str, Any]) -> "EmailAttachmentIndexEntity":
+        return build_entity(EmailAttachmentIndexEntity, obj)
+
+    @staticmethod
+    def get_hour_bucket(date_time: str) -> str:
+        parsed = datetime.fromisoformat(date_time.replace("Z", "+00:00"))
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(timezone.utc)
+        return parsed.strftime("%Y%m%d%H")
+
+    @staticmethod
+    def from_attachment_entity(entity: EmailAttachmentEntity) -> "EmailAttachmentIndexEntity":
+        return EmailAttachmentIndexEntity(
+            PartitionKey=EmailAttachmentIndexEntity.get_hour_bucket(entity.processDateTime),
+            RowKey=f"{entity.PartitionKey}|{entity.RowKey}",
+            emailId=entity.PartitionKey,
+            attachmentId=entity.RowKey,
+            email_subject=entity.email_subject,
+            sender=entity.sender,
+            receivedDateTime=entity.receivedDateTime,
+            processDateTime=entity.processDateTime,
+            attachmentName=entity.attachmentName,
+            extension=entity.extension,
+            size=entity.size,
+            siteId=entity.siteId,
+            siteName=entity.siteName,
+            driveId=entity.driveId,
+            filepath=entity.filepath,
+            isReported=entity.isReported,
+            reportDateTime=entity.reportDateTime,
+            contentHash=entity.contentHash,
+            itemId=entity.itemId,
+            vendor=entity.vendor
+        )
+
+    def to_attachment_entity(self) -> EmailAttachmentEntity:
+        return EmailAttachmentEntity(
+            PartitionKey=self.emailId,
+            RowKey=self.attachmentId,
+            email_subject=self.email_subject,
+            sender=self.sender,
+            receivedDateTime=self.receivedDateTime,
+            processDateTime=self.processDateTime,
+            attachmentName=self.attachmentName,
+            extension=self.extension,
+            size=self.size,
+            siteId=self.siteId,
+            siteName=self.siteName,
+            driveId=self.driveId,
+            filepath=self.filepath,
+            isReported=self.isReported,
+            reportDateTime=self.reportDateTime,
+            contentHash=self.contentHash,
+            itemId=self.itemId,
+            vendor=self.vendor
+        )
+
+
+@dataclass
+class AttachmentClaimEntity:
+    # Lease on one attachment, taken before any transfer starts so that
+    # concurrent processors never download and upload the same file twice.
+    PartitionKey: str   # Email Id
+    RowKey: str         # Attachment Id
+
+    owner: str              # lease token of the worker holding the claim
+    status: str             # "leased" while in progress; "done" is treated as processed
+    leaseExpiresAt: str     # ISO 8601 UTC; an expired "leased" claim may be taken over
+    claimedDateTime: str
+
+    @staticmethod
+    def from_dict(obj: Dict[str, Any]) -> "AttachmentClaimEntity":
+        return build_entity(AttachmentClaimEntity, obj)
+
+    def is_expired(self, now: datetime) -> bool:
+        return datetime.fromisoformat(self.leaseExpiresAt.replace("Z", "+00:00")) <= now
+
+
+@dataclass
+class AttachmentContentEntity:
+    # Content-addressed index of uploaded attachments: the first upload of a
+    # given content is recorded here and later copies point at its file.
+    PartitionKey: str   # SHA-256 of the content, hex
+    RowKey: str         # Size in bytes
+
+    filepath: str
+    driveId: str
+    itemId: str
+    attachmentName: str
+    emailId: str        # Email the content was first uploaded from
+    attachmentId: str
+    uploadedDateTime: str
+    itemETag: Optional[str] = None  # eTag of the drive item right after the upload; changes if the file is overwritten
+
+    @staticmethod
+    def from_dict(obj: Dict[str, Any]) -> "AttachmentContentEntity":
+        return build_entity(AttachmentContentEntity, obj)
+
+
+@dataclass
+class VendorDomainEntity:
+    # One sender domain of a vendor. A domain also matches its subdomains,
+    # so "redtiger.com" routes mail from "reports.redtiger.com" as well.
+    PartitionKey: str   # Vendor name
+    RowKey: str         # Sender domain, e.g. "redtiger.com"
+
+    folder: Optional[str] = None    # OneDrive folder; defaults to "Attachments/<vendor>"
+    isActive: bool = True
+
+    @staticmethod
+    def from_dict(obj: Dict[str, Any]) -> "VendorDomainEntity":
+        return build_entity(VendorDomainEntity, obj)
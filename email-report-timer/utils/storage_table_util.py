@@ -1,14 +1,21 @@
-from typing import List
-from azure.data.tables import TableServiceClient, TableClient, UpdateMode, TableTransactionError
+from typing import TYPE_CHECKING, Iterator, List
 from datetime import timedelta, timezone, datetime
 import os
+import threading
 import logging
 
-from utils.email_dtos import FileAttachment
-from utils.storage_table_entities import EmailAttachmentEntity
+from utils.table_batch_writer import ChunkResult, TableBatchWriter
+from utils.storage_table_entities import EmailAttachmentEntity, EmailAttachmentIndexEntity
+
+if TYPE_CHECKING:
+    from azure.data.tables import TableClient
+
 
 class StorageTableUtil:
     table_service = None
+    # Per-process registry of table clients whose table is known to exist.
+    table_clients = {}
+    lock = threading.Lock()
     
     @classmethod
     def get_connection_string(cls)-> str:
@@ -17,8 +24,11 @@ class StorageTableUtil:
     @classmethod
     def get_table_service(cls):
         if cls.table_service is None:
-            
-            cls.table_service = TableServiceClient.from_connection_string(cls.get_connection_string())
+            # The Azure SDK is imported on first use to keep it off the cold-start path.
+            from azure.data.tables import TableServiceClient
+            with cls.lock:
+                if cls.table_service is None:
+                    cls.table_service = TableServiceClient.from_connection_string(cls.get_connection_string())
         return cls.table_service
     
     @classmethod
@@ -30,58 +40,118 @@ class StorageTableUtil:
             raise Exception(f"Error creating or accessing table {table_name}: {str(e)}")
         
     @classmethod
-    def get_table_client(cls, table_name: str)-> TableClient:
-        cls.ensure_table_exists(table_name)
-        table_service = cls.get_table_service()
-        return table_service.get_table_client(table_name)
+    def get_table_client(cls, table_name: str)-> "TableClient":
+        # The table is checked/created only the first time it is used in this process.
+        table_client = cls.table_clients.get(table_name)
+        if table_client is None:
+            cls.ensure_table_exists(table_name)
+            table_client = cls.get_table_service().get_table_client(table_name)
+            cls.table_clients[table_name] = table_client
+        return table_client
+
+    @classmethod
+    def is_table_not_found(cls, e: Exception) -> bool:
+        from azure.core.exceptions import ResourceNotFoundError
+        return isinstance(e, ResourceNotFoundError) and getattr(e, "error_code", None) == "TableNotFound"
+
+    @classmethod
+    def run_table_operation(cls, table_name: str, operation):
+        # Runs operation(table_client); if the table was deleted since it was
+        # registered, re-creates it once and retries.
+        try:
+            return operation(cls.get_table_client(table_name))
+        except Exception as e:
+            if not cls.is_table_not_found(e):
+                raise
+            logging.warning(f"Table {table_name} not found, re-creating it.")
+            cls.table_clients.pop(table_name, None)
+            return operation(cls.get_table_client(table_name))
     
     @classmethod
     def insert_entity(cls, table_name: str, entity: dict):
-        table_client = cls.get_table_client(table_name)
         try:
-            table_client.create_entity(entity=entity)
+            cls.run_table_operation(table_name, lambda table_client: table_client.create_entity(entity=entity))
         except Exception as e:
             raise Exception(f"Error inserting entity into table {table_name}: {str(e)}")
         
     @classmethod
-    def get_all_attachments_processed_in_24hrs(cls, table_name: str)-> List[EmailAttachmentEntity]:
-        
+    def query_entity_pages(cls, table_name: str, query_filter: str, parameters: dict = None,
+                           select: List[str] = None, page_size: int = None) -> Iterator[List[dict]]:
+        # Lazily yields one service page at a time; only the selected columns are transferred.
+        page_size = page_size or int(os.getenv("TABLE_QUERY_PAGE_SIZE", "1000"))
         table_client = cls.get_table_client(table_name)
         try:
-            twenty_four_hours_ago = datetime.now(timezone.utc) - timedelta(hours=24)
-            filter_query = (
-                f"processDateTime ge '{twenty_four_hours_ago.isoformat()}' "
-                f"and isReported eq false"
-            )
-            entities = table_client.query_entities(query_filter=filter_query)
-            return [EmailAttachmentEntity(**entity) for entity in entities]
+            pages = table_client.query_entities(
+                query_filter=query_filter,
+                parameters=parameters,
+                select=select,
+                results_per_page=page_size
+            ).by_page()
+            for page in pages:
+                yield list(page)
         except Exception as e:
+            if cls.is_table_not_found(e):
+                # A table that does not exist has no rows; re-check it on next use.
+                cls.table_clients.pop(table_name, None)
+                logging.warning(f"Table {table_name} not found while querying.")
+                return
             raise Exception(f"Error querying entities from table {table_name}: {str(e)}")
-    
+
     @classmethod
-    def batch_update_entity(cls, table_name: str, entities: list):
-        table_client:TableClient = cls.get_table_client(table_name)
-        batch_ops = [
-        ("update", entity, {"mode": UpdateMode.MERGE}) for entity in entities
-        ]
-        try:
-            responses = table_client.submit_transaction(batch_ops)
-            return responses
-        except TableTransactionError as e:
-            # - e.message : error message
-            # - e.response : HTTP response from the server
-            logging.error("Batch update failed!")
-            logging.error("Error message:", e.message)
-            
-            # The failed operation details are inside e.response
-            logging.error("Failed operation HTTP status:", e.response.status_code)
-            logging.error("Failed operation body:", e.response.text)
+    def iter_attachments_processed_in_24hrs(cls, table_name: str, select: List[str] = None,
+                                            page_size: int = None) -> Iterator[List[EmailAttachmentEntity]]:
+        twenty_four_hours_ago = datetime.now(timezone.utc) - timedelta(hours=24)
+        filter_query = "processDateTime ge @since and isReported eq false"
+        for page in cls.query_entity_pages(table_name, filter_query, {"since": twenty_four_hours_ago.isoformat()}, select, page_size):
+            yield [EmailAttachmentEntity.from_dict(entity) for entity in page]
+
+    @classmethod
+    def get_all_attachments_processed_in_24hrs(cls, table_name: str)-> List[EmailAttachmentEntity]:
+        return [entity for page in cls.iter_attachments_processed_in_24hrs(table_name) for entity in page]
+
+    @classmethod
+    def iter_unreported_attachments_from_index(cls, index_table_name: str, hours: int = 24, select: List[str] = None,
+                                               page_size: int = None) -> Iterator[List[EmailAttachmentIndexEntity]]:
+        # Range query over the last `hours` hourly partitions of the report index.
+        now = datetime.now(timezone.utc)
+        parameters = {
+            "start": (now - timedelta(hours=hours)).strftime("%Y%m%d%H"),
+            "end": now.strftime("%Y%m%d%H")
+        }
+        filter_query = "PartitionKey ge @start and PartitionKey le @end and isReported eq false"
+        for page in cls.query_entity_pages(index_table_name, filter_query, parameters, select, page_size):
+            yield [EmailAttachmentIndexEntity.from_dict(entity) for entity in page]
+
+    @classmethod
+    def get_unreported_attachments_from_index(cls, index_table_name: str, hours: int = 24) -> List[EmailAttachmentIndexEntity]:
+        return [entity for page in cls.iter_unreported_attachments_from_index(index_table_name, hours) for entity in page]
+
+    @classmethod
+    def get_batch_writer(cls, table_name: str) -> TableBatchWriter:
+        return TableBatchWriter(
+            table_name,
+            submit=lambda ops: cls.run_table_operation(table_name, lambda table_client: table_client.submit_transaction(ops))
+        )
+
+    @classmethod
+    def batch_update_entity(cls, table_name: str, entities: list) -> List[ChunkResult]:
+        # Split per partition into transactions of at most 100 entities; failed chunks are retried and reported.
+        from azure.data.tables import UpdateMode
+        writer = cls.get_batch_writer(table_name)
+        writer.add_all(entities, operation="update", options={"mode": UpdateMode.MERGE})
+        results = writer.flush()
+        for result in results:
+            if not result.success:
+                logging.error(f"Batch update of {result.size} entities in partition {result.partition_key} failed: {result.error}")
+        return results
 
     @classmethod
     def get_entity(cls, table_name: str, partition_key: str, row_key: str) -> dict:
-        table_client = cls.get_table_client(table_name)
         try:
-            entity = table_client.get_entity(partition_key=partition_key, row_key=row_key)
+            entity = cls.run_table_operation(
+                table_name,
+                lambda table_client: table_client.get_entity(partition_key=partition_key, row_key=row_key)
+            )
             return entity
         except Exception as e:
             logging.error(f"Error retrieving entity from table {table_name}: {str(e)}")
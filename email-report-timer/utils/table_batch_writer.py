@@ -0,0 +1,79 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+@dataclass
+class ChunkResult:
+    partition_key: str
+    size: int
+    success: bool
+    attempts: int
+    error: Optional[str] = None
+
+
+class TableBatchWriter:
+    # Buffers table operations and writes them as entity group transactions.
+    # A transaction may only touch one PartitionKey and at most 100 entities,
+    # so buffered operations are grouped by partition, split into chunks of
+    # max_chunk_size and submitted concurrently. Only failed chunks are retried.
+    max_chunk_size = 100
+
+    def __init__(self, table_name: str, submit: Callable[[List[Tuple]], Any], max_workers: int = None, max_retries: int = None):
+        self.table_name = table_name
+        self.submit = submit
+        self.max_workers = max_workers or int(os.getenv("TABLE_BATCH_MAX_WORKERS", "4"))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("TABLE_BATCH_MAX_RETRIES", "2"))
+        self.pending: Dict[str, List[Tuple]] = {}
+        self.lock = threading.Lock()
+
+    def add(self, entity: dict, operation: str = "upsert", options: dict = None):
+        # operation is any submit_transaction verb: "create", "upsert", "update", "delete".
+        op = (operation, entity, options) if options else (operation, entity)
+        with self.lock:
+            self.pending.setdefault(entity["PartitionKey"], []).append(op)
+
+    def add_all(self, entities: List[dict], operation: str = "upsert", options: dict = None):
+        for entity in entities:
+            self.add(entity, operation, options)
+
+    def get_chunks(self) -> List[Tuple[str, List[Tuple]]]:
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        chunks = []
+        for partition_key, ops in pending.items():
+            for start in range(0, len(ops), self.max_chunk_size):
+                chunks.append((partition_key, ops[start:start + self.max_chunk_size]))
+        return chunks
+
+    def submit_chunk(self, partition_key: str, ops: List[Tuple]) -> ChunkResult:
+        attempts = 0
+        error = None
+        while attempts <= self.max_retries:
+            attempts += 1
+            try:
+                self.submit(ops)
+                return ChunkResult(partition_key=partition_key, size=len(ops), success=True, attempts=attempts)
+            except Exception as e:
+                error = str(e)
+                logging.warning(f"Transaction of {len(ops)} entities in partition {partition_key} of table {self.table_name} failed (attempt {attempts}): {error}")
+        return ChunkResult(partition_key=partition_key, size=len(ops), success=False, attempts=attempts, error=error)
+
+    def flush(self) -> List[ChunkResult]:
+        chunks = self.get_chunks()
+        if not chunks:
+            return []
+        if len(chunks) == 1:
+            results = [self.submit_chunk(*chunks[0])]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(chunks)), thread_name_prefix="table-batch") as executor:
+                results = list(executor.map(lambda chunk: self.submit_chunk(*chunk), chunks))
+        failed = [r for r in results if not r.success]
+        logging.info(
+            f"Wrote {sum(r.size for r in results if r.success)} entities to table {self.table_name} "
+            f"in {len(results)} transactions, {len(failed)} failed."
+        )
+        return results
@@ -1,9 +1,18 @@
+import json
 import logging
 import os
+from typing import Dict, List
 import azure.functions as func
 from utils.graph_api_util import GraphAPIUtil
-from utils.email_dtos import MessageResponse, Message
-import requests
+from utils.email_dispatcher import EmailDispatcher
+from utils.email_dtos import FileAttachment, Message
+from utils.http_session import HttpSession
+from utils.mailbox_delta_sync import MailboxDeltaSync
+from utils.message_envelope import EnvelopeMessage, MessageEnvelope
+from utils.message_query import MessageQuery
+from utils.message_queue import QueueUtil
+from utils.rate_limiter import GraphRateLimiter
+from utils.token_provider import TokenProvider
 
 app = func.FunctionApp()
 @app.timer_trigger(schedule="0 */1 * * * *", arg_name="myTimer", run_on_startup=False,
@@ -13,40 +22,149 @@ def get_email_timer_task(myTimer: func.TimerRequest) -> None:
         logging.info('The timer is past due!')
 
     logging.info('Python timer trigger function executed.')
-    get_unread_emails_and_process()
+    if get_email_sync_mode() == "delta":
+        get_new_emails_by_delta_and_process()
+    else:
+        get_unread_emails_and_process()
+    logging.info(f"Token cache stats: {TokenProvider.get_stats()}, Graph rate limits: {GraphRateLimiter.get_stats()}")
 
 
 
 def get_unread_emails_and_process():
     try:
-        
-        msg_resp : MessageResponse = GraphAPIUtil.get_messages_by_filter(get_email_filter())
-        logging.info(f"Fetched {len(msg_resp.value)} unread emails.")
-        for msg in msg_resp.value:
-            logging.info(f"Email ID: {msg.id}, Subject: {msg.subject}, Received: {msg.receivedDateTime}")
-            #GraphAPIUtil.mark_message_as_read(msg.id)
-            call_azure_email_processing_function(msg)
+        query = MessageQuery.from_env()
+        dispatcher = EmailDispatcher(get_dispatch_function())
+        try:
+            for msg in GraphAPIUtil.iter_messages(
+                filter=query.build_filter(),
+                top=get_email_page_size(),
+                select=query.build_select(),
+                orderby=get_email_orderby()
+            ):
+                if not query.matches(msg):
+                    continue
+                logging.info(f"Email ID: {msg.id}, Subject: {msg.subject}, Received: {msg.receivedDateTime}")
+                dispatcher.submit(msg)
+        finally:
+            results = dispatcher.wait()
+            logging.info(f"Fetched {len(results)} unread emails, skipped {query.skipped}. Dispatch summary: {dispatcher.get_summary()}")
+        mark_dispatched_emails_as_read([r.message_id for r in results if r.success])
     except Exception as e:
         logging.error(f"Error fetching unread emails: {e}")
 
-def get_email_filter():
-    # Example filter to get unread emails
-    return os.getenv("EMAIL_FILTER", "isRead eq false")
+def get_new_emails_by_delta_and_process():
+    try:
+        query = MessageQuery.from_env()
+        sync = MailboxDeltaSync(select=query.build_select(), page_size=get_email_page_size())
+        dispatcher = EmailDispatcher(get_dispatch_function())
+        try:
+            for msg in sync.iter_new_messages():
+                # messages/delta only filters on receivedDateTime, so the other criteria apply here.
+                if not query.matches(msg):
+                    continue
+                logging.info(f"Email ID: {msg.id}, Subject: {msg.subject}, Received: {msg.receivedDateTime}")
+                dispatcher.submit(msg)
+        finally:
+            results = dispatcher.wait()
+            logging.info(f"Delta sync stats: {sync.stats}, skipped {query.skipped}. Dispatch summary: {dispatcher.get_summary()}")
+        mark_dispatched_emails_as_read([r.message_id for r in results if r.success])
+        # The cursor always advances; failed emails are stored with it and retried by id.
+        sync.commit(failed_ids=[r.message_id for r in results if not r.success])
+    except Exception as e:
+        logging.error(f"Error syncing mailbox delta: {e}")
+
+def mark_dispatched_emails_as_read(message_ids):
+    # Marks every dispatched email as read in $batch round trips of 20 instead of one PATCH each.
+    if not message_ids or os.getenv("EMAIL_MARK_AS_READ", "false").lower() != "true":
+        return
+    try:
+        errors = GraphAPIUtil.set_messages_read_state_batch(message_ids, is_read=True)
+        for message_id, error in errors.items():
+            logging.error(f"Failed to mark email {message_id} as read: {error}")
+    except Exception as e:
+        logging.error(f"Error marking emails as read: {e}")
+
+def get_email_sync_mode() -> str:
+    # "filter" rescans unread mail every tick, "delta" only fetches changes since the last tick
+    return os.getenv("EMAIL_SYNC_MODE", "filter").lower()
+
+def get_email_page_size() -> int:
+    return int(os.getenv("EMAIL_PAGE_SIZE", "50"))
+
+def get_email_orderby():
+    # Graph requires $orderby properties to also appear first in $filter
+    return os.getenv("EMAIL_ORDERBY") or None
 
-def call_azure_email_processing_function(email: Message)-> bool:
-    # Placeholder for calling another Azure Function for email processing
+def get_email_processing_timeout() -> tuple:
+    # (connect, read) timeout for one processor call, so a slow call cannot stall the tick
+    return (
+        float(os.getenv("HTTP_CONNECT_TIMEOUT", "5")),
+        float(os.getenv("EMAIL_PROCESSING_TIMEOUT_SECONDS", "120"))
+    )
+
+def get_dispatch_function():
+    # "queue" hands emails to the processor through a storage queue, "http" calls it directly.
+    if os.getenv("EMAIL_DISPATCH_MODE", "http").lower() == "queue":
+        return enqueue_emails_for_processing
+    return call_azure_email_processing_function
+
+def get_email_queue_name() -> str:
+    # Must match the queue the processor's queue trigger listens on.
+    return os.getenv("EMAIL_QUEUE_NAME", "email-processing")
+
+def get_prefetch_attachments() -> bool:
+    # Fetch attachment metadata for each dispatch batch with one $batch call so the processor can skip it.
+    return os.getenv("EMAIL_PREFETCH_ATTACHMENTS", "false").lower() == "true"
+
+def get_prefetched_attachments(messages: List[Message]) -> Dict[str, List[FileAttachment]]:
+    if not get_prefetch_attachments():
+        return {}
+    try:
+        attachments, errors = GraphAPIUtil.get_attachments_metadata_batch([m.id for m in messages])
+        for message_id, error in errors.items():
+            # The processor fetches the metadata itself for these.
+            logging.warning(f"Could not prefetch attachments of email {message_id}: {error}")
+        return attachments
+    except Exception as e:
+        logging.warning(f"Attachment prefetch failed, processor will fetch metadata: {e}")
+        return {}
+
+def call_azure_email_processing_function(messages: List[Message]) -> Dict[str, bool]:
+    # Sends one envelope per batch; returns success by message id.
     function_url = os.getenv("EMAIL_PROCESSING_FUNCTION_URL")
     if not function_url:
         logging.error("EMAIL_PROCESSING_FUNCTION_URL is not set.")
-        return False
+        return {}
+    attachments = get_prefetched_attachments(messages)
+    envelope = MessageEnvelope(messages=[EnvelopeMessage.from_message(m, attachments.get(m.id)) for m in messages])
     try:
-        response = requests.post(function_url, json=email.to_dict())
+        response = HttpSession.request("POST", function_url, json=envelope.to_dict(), timeout=get_email_processing_timeout())
         if response.status_code == 200:
-            logging.info(f"Successfully called email processing function for email ID: {email.id}")
-            return True
-        else:
-            logging.error(f"Failed to call email processing function. Status code: {response.status_code}, Response: {response.text}")
+            logging.info(f"Successfully called email processing function for {len(messages)} emails.")
+            return {m.id: True for m in messages}
+        if response.status_code == 207:
+            # Partial success: the processor reports the outcome of every message.
+            outcome = {r.get("id"): bool(r.get("success")) for r in response.json().get("messages", [])}
+            logging.warning(f"Email processing function failed {sum(1 for ok in outcome.values() if not ok)} of {len(messages)} emails.")
+            return outcome
+        logging.error(f"Failed to call email processing function. Status code: {response.status_code}, Response: {response.text}")
     except Exception as e:
         logging.error(f"Exception while calling email processing function: {e}")
     
-    return False
\ No newline at end of file
+    return {}
+
+def enqueue_emails_for_processing(messages: List[Message]) -> Dict[str, bool]:
+    # One envelope per email, so the processor retries and poisons emails individually.
+    queue = QueueUtil.get_queue(get_email_queue_name())
+    attachments = get_prefetched_attachments(messages)
+    outcome = {}
+    for m in messages:
+        envelope = MessageEnvelope(messages=[EnvelopeMessage.from_message(m, attachments.get(m.id))])
+        try:
+            queue.send(json.dumps(envelope.to_dict()))
+            outcome[m.id] = True
+        except Exception as e:
+            logging.error(f"Failed to enqueue email {m.id}: {e}")
+            outcome[m.id] = False
+    logging.info(f"Enqueued {sum(outcome.values())} of {len(messages)} emails to queue {get_email_queue_name()}.")
+    return outcome
@@ -0,0 +1,81 @@
+import json
+from typing import Dict
+
+import pytest
+
+from utils.email_dtos import Message, MessageDeltaPage
+from utils.graph_api_util import GraphAPIUtil
+from utils.mailbox_delta_sync import MailboxDeltaSync
+from utils.storage_table_util import StorageTableUtil
+
+
+class FakeMailbox:
+    # Delta pages and by-id reads of an in-memory mailbox, plus the sync state row.
+    def __init__(self):
+        self.state: Dict[str, dict] = {}
+        self.delta = [{"id": "m1", "isRead": False}, {"id": "m2", "isRead": False}]
+        self.by_id = {}
+        self.storage_error = None
+
+    def get_entity(self, table_name: str, partition_key: str, row_key: str):
+        if self.storage_error:
+            raise Exception(self.storage_error)
+        return self.state.get(row_key)
+
+    def upsert_entity(self, table_name: str, entity: dict):
+        self.state[entity["RowKey"]] = dict(entity)
+
+    def iter_message_delta_pages(self, delta_link=None, **kwargs):
+        yield MessageDeltaPage(messages=[Message.from_dict(m) for m in self.delta], removed_ids=[], delta_link=f"{delta_link or 'start'}+1")
+
+    def get_messages_batch(self, message_ids, select=None):
+        found = {i: Message.from_dict(self.by_id[i]) for i in message_ids if i in self.by_id}
+        return found, {i: "404 ErrorItemNotFound: gone" for i in message_ids if i not in self.by_id}
+
+
+@pytest.fixture
+def mailbox(monkeypatch):
+    fake = FakeMailbox()
+    monkeypatch.setenv("EMAIL_DELTA_MAX_RETRIES", "2")
+    monkeypatch.setattr(StorageTableUtil, "get_entity", fake.get_entity)
+    monkeypatch.setattr(StorageTableUtil, "upsert_entity", fake.upsert_entity)
+    monkeypatch.setattr(GraphAPIUtil, "iter_message_delta_pages", fake.iter_message_delta_pages)
+    monkeypatch.setattr(GraphAPIUtil, "get_messages_batch", fake.get_messages_batch)
+    return fake
+
+
+def run_tick(failed=()):
+    sync = MailboxDeltaSync()
+    ids = [msg.id for msg in sync.iter_new_messages()]
+    sync.commit(failed_ids=[i for i in ids if i in failed])
+    return ids
+
+
+def test_cursor_advances_past_a_failed_dispatch_which_is_retried_by_id(mailbox):
+    assert run_tick(failed={"m2"}) == ["m1", "m2"]
+    assert mailbox.state["inbox"]["deltaLink"] == "start+1"
+    assert json.loads(mailbox.state["inbox"]["retryIds"]) == {"m2": 1}
+
+    mailbox.delta = [{"id": "m3", "isRead": False}]
+    mailbox.by_id["m2"] = {"id": "m2", "isRead": False}
+    assert run_tick() == ["m2", "m3"]
+    assert mailbox.state["inbox"]["deltaLink"] == "start+1+1"
+    assert mailbox.state["inbox"]["retryIds"] is None
+
+
+def test_email_that_keeps_failing_is_dropped_after_max_retries(mailbox):
+    mailbox.delta = [{"id": "m1", "isRead": False}]
+    mailbox.by_id["m1"] = {"id": "m1", "isRead": False}
+    run_tick(failed={"m1"})
+    mailbox.delta = []
+    run_tick(failed={"m1"})
+    assert json.loads(mailbox.state["inbox"]["retryIds"]) == {"m1": 2}
+    run_tick(failed={"m1"})
+    assert mailbox.state["inbox"]["retryIds"] is None
+
+
+def test_storage_error_does_not_restart_the_initial_sync(mailbox):
+    mailbox.storage_error = "Service unavailable"
+    with pytest.raises(Exception, match="Service unavailable"):
+        run_tick()
+    assert mailbox.state == {}
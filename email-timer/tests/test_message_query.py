@@ -0,0 +1,18 @@
+from datetime import datetime, timezone
+
+from utils.message_query import MessageQuery
+
+
+def test_received_window_is_off_by_default(monkeypatch):
+    for name in ("EMAIL_RECEIVED_WINDOW_HOURS", "EMAIL_FILTER", "EMAIL_REQUIRE_ATTACHMENTS"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("EMAIL_SENDER_FILTER", "off")
+    query = MessageQuery.from_env()
+    assert query.get_received_since() is None
+    assert query.build_filter() == "isRead eq false and hasAttachments eq true"
+
+
+def test_received_window_leads_the_filter_when_set():
+    query = MessageQuery(received_window_hours=24, sender_filter="off")
+    now = datetime(2026, 10, 18, 12, 0, tzinfo=timezone.utc)
+    assert query.build_filter(now) == "receivedDateTime ge 2026-10-17T12:00:00Z and isRead eq false and hasAttachments eq true"
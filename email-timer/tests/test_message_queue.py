@@ -0,0 +1,71 @@
+import pytest
+
+from utils.message_queue import InMemoryQueue, MessageQueue
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr("utils.message_queue.time.monotonic", clock)
+    return clock
+
+
+def test_interface_cannot_be_instantiated():
+    with pytest.raises(TypeError):
+        MessageQueue()
+
+
+def test_received_message_is_invisible_until_its_timeout(clock):
+    queue = InMemoryQueue("email-processing")
+    queue.send("envelope")
+    first = queue.receive(visibility_timeout=30)
+    assert [m.content for m in first] == ["envelope"] and first[0].dequeue_count == 1
+    assert queue.receive() == []
+
+    clock.now += 31
+    again = queue.receive()
+    assert [m.id for m in again] == [first[0].id]
+    assert again[0].dequeue_count == 2
+    assert again[0].pop_receipt != first[0].pop_receipt
+
+
+def test_deleted_message_is_not_redelivered(clock):
+    queue = InMemoryQueue("email-processing")
+    queue.send("envelope")
+    queue.delete(queue.receive(visibility_timeout=30)[0])
+    clock.now += 31
+    assert queue.receive() == []
+    assert len(queue) == 0
+
+
+def test_delete_with_a_stale_pop_receipt_is_ignored(clock):
+    queue = InMemoryQueue("email-processing")
+    queue.send("envelope")
+    stale = queue.receive(visibility_timeout=30)[0]
+    clock.now += 31
+    current = queue.receive(visibility_timeout=30)[0]
+
+    queue.delete(stale)
+    assert len(queue) == 1
+    queue.delete(current)
+    assert len(queue) == 0
+
+
+def test_message_moves_to_poison_after_max_dequeue_count(clock):
+    poison = InMemoryQueue("email-processing-poison")
+    queue = InMemoryQueue("email-processing", max_dequeue_count=3, poison_queue=poison)
+    queue.send("envelope")
+    for attempt in range(1, 4):
+        assert queue.receive(visibility_timeout=30)[0].dequeue_count == attempt
+        clock.now += 31
+    assert queue.receive() == []
+    assert len(queue) == 0
+    assert [m.content for m in poison.receive()] == ["envelope"]
@@ -0,0 +1,112 @@
+import logging
+import math
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from utils.email_dtos import Message
+
+
+@dataclass
+class DispatchResult:
+    message_id: str
+    success: bool
+    latency_ms: float
+    error: Optional[str] = None
+
+
+@dataclass
+class DispatchSummary:
+    total: int
+    succeeded: int
+    failed: int
+    elapsed_seconds: float
+    throughput_per_second: float
+    p50_ms: float
+    p95_ms: float
+
+
+class EmailDispatcher:
+    # Sends messages to the processor in batches of batch_size, with at most
+    # max_in_flight batch calls running at once. submit() blocks while all
+    # slots are busy, so a paged message iterator is consumed no faster than
+    # messages can be dispatched. send(batch) returns success by message id.
+    def __init__(self, send: Callable[[List[Message]], Dict[str, bool]], max_in_flight: int = None, batch_size: int = None):
+        self.send = send
+        self.max_in_flight = max_in_flight or int(os.getenv("EMAIL_DISPATCH_MAX_IN_FLIGHT", "16"))
+        self.batch_size = max(1, batch_size or int(os.getenv("EMAIL_DISPATCH_BATCH_SIZE", "10")))
+        self.executor = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="email-dispatch")
+        self.slots = threading.BoundedSemaphore(self.max_in_flight)
+        self.pending: List[Message] = []
+        self.futures: List[Future] = []
+        self.results: List[DispatchResult] = []
+        self.started_at: Optional[float] = None
+        self.elapsed_seconds = 0.0
+
+    def submit(self, msg: Message):
+        if self.started_at is None:
+            self.started_at = time.perf_counter()
+        self.pending.append(msg)
+        if len(self.pending) >= self.batch_size:
+            self.submit_batch()
+
+    def submit_batch(self):
+        batch, self.pending = self.pending, []
+        if not batch:
+            return
+        self.slots.acquire()
+        try:
+            future = self.executor.submit(self.dispatch_batch, batch)
+        except Exception:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+        self.futures.append(future)
+
+    def dispatch_batch(self, batch: List[Message]) -> List[DispatchResult]:
+        start = time.perf_counter()
+        error = None
+        try:
+            outcome = self.send(batch) or {}
+        except Exception as e:
+            outcome = {}
+            error = str(e)
+        latency_ms = (time.perf_counter() - start) * 1000
+        return [
+            DispatchResult(message_id=msg.id, success=bool(outcome.get(msg.id)), latency_ms=latency_ms, error=error)
+            for msg in batch
+        ]
+
+    def wait(self) -> List[DispatchResult]:
+        self.submit_batch()
+        self.results = [result for future in self.futures for result in future.result()]
+        self.executor.shutdown(wait=True)
+        if self.started_at is not None:
+            self.elapsed_seconds = time.perf_counter() - self.started_at
+        for result in self.results:
+            if result.error:
+                logging.error(f"Dispatch of email {result.message_id} raised: {result.error}")
+        return self.results
+
+    @staticmethod
+    def percentile(sorted_values: List[float], pct: float) -> float:
+        if not sorted_values:
+            return 0.0
+        rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+        return sorted_values[rank - 1]
+
+    def get_summary(self) -> DispatchSummary:
+        latencies = sorted(r.latency_ms for r in self.results)
+        succeeded = sum(1 for r in self.results if r.success)
+        return DispatchSummary(
+            total=len(self.results),
+            succeeded=succeeded,
+            failed=len(self.results) - succeeded,
+            elapsed_seconds=round(self.elapsed_seconds, 3),
+            throughput_per_second=round(len(self.results) / self.elapsed_seconds, 2) if self.elapsed_seconds else 0.0,
+            p50_ms=round(self.percentile(latencies, 50), 1),
+            p95_ms=round(self.percentile(latencies, 95), 1)
+        )
@@ -1,8 +1,9 @@
 from dataclasses import dataclass
-from typing import List, Optional, Dict, Any
+from typing import Any, Dict, List, Optional
 
 @dataclass
 class EmailAddress:
+    __slots__ = ("name", "address")
     name: str
     address: str
 
@@ -22,12 +23,13 @@ class EmailAddress:
 
 @dataclass
 class Recipient:
+    __slots__ = ("emailAddress",)
     emailAddress: EmailAddress
 
     @staticmethod
     def from_dict(obj: Dict[str, Any]) -> "Recipient":
         return Recipient(
-            emailAddress=EmailAddress.from_dict(obj.get("emailAddress", {}))
+            emailAddress=EmailAddress.from_dict(obj.get("emailAddress") or {})
         )
 
     def to_dict(self) -> Dict[str, Any]:
@@ -38,6 +40,7 @@ class Recipient:
 
 @dataclass
 class Body:
+    __slots__ = ("contentType", "content")
     contentType: str
     content: str
 
@@ -57,6 +60,7 @@ class Body:
 
 @dataclass
 class Flag:
+    __slots__ = ("flagStatus",)
     flagStatus: str
 
     @staticmethod
@@ -71,71 +75,62 @@ class Flag:
         }
 
 
-@dataclass
+def parse_recipients(values: Optional[List[Dict[str, Any]]]) -> List[Recipient]:
+    return [Recipient.from_dict(r) for r in values or []]
+
+
+def dump_recipients(recipients: List[Recipient]) -> List[Dict[str, Any]]:
+    return [r.to_dict() for r in recipients]
+
+
 class Message:
-    id: str
-    createdDateTime: str
-    lastModifiedDateTime: str
-    changeKey: str
-    categories: List[str]
-    receivedDateTime: str
-    sentDateTime: str
-    hasAttachments: bool
-    internetMessageId: str
-    subject: str
-    bodyPreview: str
-    importance: str
-    parentFolderId: str
-    conversationId: str
-    conversationIndex: str
-    isDeliveryReceiptRequested: Optional[bool]
-    isReadReceiptRequested: bool
-    isRead: bool
-    isDraft: bool
-    webLink: str
-    inferenceClassification: str
-    body: Body
-    sender: Recipient
-    from_: Recipient  # "from" is reserved
-    toRecipients: List[Recipient]
-    ccRecipients: List[Recipient]
-    bccRecipients: List[Recipient]
-    replyTo: List[Recipient]
-    flag: Flag
+    # Every property lives in a slot and nested objects are decoded once into
+    # the slotted classes above, so the raw Graph dicts can be released with
+    # the page: a slotted Recipient costs a fraction of the two JSON dicts it
+    # comes from.
+    __slots__ = (
+        "id", "createdDateTime", "lastModifiedDateTime", "changeKey", "categories",
+        "receivedDateTime", "sentDateTime", "hasAttachments", "internetMessageId",
+        "subject", "bodyPreview", "importance", "parentFolderId", "conversationId",
+        "conversationIndex", "isDeliveryReceiptRequested", "isReadReceiptRequested",
+        "isRead", "isDraft", "webLink", "inferenceClassification",
+        "body", "sender", "from_", "toRecipients", "ccRecipients",
+        "bccRecipients", "replyTo", "flag"
+    )
 
     @staticmethod
     def from_dict(obj: Dict[str, Any]) -> "Message":
-        return Message(
-            id=obj.get("id", ""),
-            createdDateTime=obj.get("createdDateTime", ""),
-            lastModifiedDateTime=obj.get("lastModifiedDateTime", ""),
-            changeKey=obj.get("changeKey", ""),
-            categories=obj.get("categories", []),
-            receivedDateTime=obj.get("receivedDateTime", ""),
-            sentDateTime=obj.get("sentDateTime", ""),
-            hasAttachments=obj.get("hasAttachments", False),
-            internetMessageId=obj.get("internetMessageId", ""),
-            subject=obj.get("subject", ""),
-            bodyPreview=obj.get("bodyPreview", ""),
-            importance=obj.get("importance", ""),
-            parentFolderId=obj.get("parentFolderId", ""),
-            conversationId=obj.get("conversationId", ""),
-            conversationIndex=obj.get("conversationIndex", ""),
-            isDeliveryReceiptRequested=obj.get("isDeliveryReceiptRequested"),
-            isReadReceiptRequested=obj.get("isReadReceiptRequested", False),
-            isRead=obj.get("isRead", False),
-            isDraft=obj.get("isDraft", False),
-            webLink=obj.get("webLink", ""),
-            inferenceClassification=obj.get("inferenceClassification", ""),
-            body=Body.from_dict(obj.get("body", {})),
-            sender=Recipient.from_dict(obj.get("sender", {})),
-            from_=Recipient.from_dict(obj.get("from", {})),
-            toRecipients=[Recipient.from_dict(r) for r in obj.get("toRecipients", [])],
-            ccRecipients=[Recipient.from_dict(r) for r in obj.get("ccRecipients", [])],
-            bccRecipients=[Recipient.from_dict(r) for r in obj.get("bccRecipients", [])],
-            replyTo=[Recipient.from_dict(r) for r in obj.get("replyTo", [])],
-            flag=Flag.from_dict(obj.get("flag", {}))
-        )
+        message = Message.__new__(Message)
+        message.id = obj.get("id", "")
+        message.createdDateTime = obj.get("createdDateTime", "")
+        message.lastModifiedDateTime = obj.get("lastModifiedDateTime", "")
+        message.changeKey = obj.get("changeKey", "")
+        message.categories = obj.get("categories", [])
+        message.receivedDateTime = obj.get("receivedDateTime", "")
+        message.sentDateTime = obj.get("sentDateTime", "")
+        message.hasAttachments = obj.get("hasAttachments", False)
+        message.internetMessageId = obj.get("internetMessageId", "")
+        message.subject = obj.get("subject", "")
+        message.bodyPreview = obj.get("bodyPreview", "")
+        message.importance = obj.get("importance", "")
+        message.parentFolderId = obj.get("parentFolderId", "")
+        message.conversationId = obj.get("conversationId", "")
+        message.conversationIndex = obj.get("conversationIndex", "")
+        message.isDeliveryReceiptRequested = obj.get("isDeliveryReceiptRequested")
+        message.isReadReceiptRequested = obj.get("isReadReceiptRequested", False)
+        message.isRead = obj.get("isRead", False)
+        message.isDraft = obj.get("isDraft", False)
+        message.webLink = obj.get("webLink", "")
+        message.inferenceClassification = obj.get("inferenceClassification", "")
+        message.body = Body.from_dict(obj.get("body") or {})
+        message.sender = Recipient.from_dict(obj.get("sender") or {})
+        message.from_ = Recipient.from_dict(obj.get("from") or {})  # "from" is reserved
+        message.toRecipients = parse_recipients(obj.get("toRecipients"))
+        message.ccRecipients = parse_recipients(obj.get("ccRecipients"))
+        message.bccRecipients = parse_recipients(obj.get("bccRecipients"))
+        message.replyTo = parse_recipients(obj.get("replyTo"))
+        message.flag = Flag.from_dict(obj.get("flag") or {})
+        return message
 
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -163,13 +158,16 @@ class Message:
             "body": self.body.to_dict(),
             "sender": self.sender.to_dict(),
             "from": self.from_.to_dict(),
-            "toRecipients": [r.to_dict() for r in self.toRecipients],
-            "ccRecipients": [r.to_dict() for r in self.ccRecipients],
-            "bccRecipients": [r.to_dict() for r in self.bccRecipients],
-            "replyTo": [r.to_dict() for r in self.replyTo],
+            "toRecipients": dump_recipients(self.toRecipients),
+            "ccRecipients": dump_recipients(self.ccRecipients),
+            "bccRecipients": dump_recipients(self.bccRecipients),
+            "replyTo": dump_recipients(self.replyTo),
             "flag": self.flag.to_dict()
         }
 
+    def __repr__(self) -> str:
+        return f"Message(id={self.id!r}, subject={self.subject!r})"
+
 
 @dataclass
 class MessageResponse:
@@ -189,3 +187,74 @@ class MessageResponse:
             "value": [m.to_dict() for m in self.value]
         }
 
+
+@dataclass
+class MessageDeltaPage:
+    messages: List[Message]
+    removed_ids: List[str]
+    next_link: Optional[str] = None    # corresponds to "@odata.nextLink"
+    delta_link: Optional[str] = None   # corresponds to "@odata.deltaLink", only on the last page
+
+    @staticmethod
+    def from_dict(obj: Dict[str, Any]) -> "MessageDeltaPage":
+        values = obj.get("value", [])
+        return MessageDeltaPage(
+            messages=[Message.from_dict(m) for m in values if "@removed" not in m],
+            removed_ids=[m.get("id", "") for m in values if "@removed" in m],
+            next_link=obj.get("@odata.nextLink"),
+            delta_link=obj.get("@odata.deltaLink")
+        )
+
+
+class FileAttachment:
+    odata_type: str           # corresponds to "@odata.type"
+    id: str
+    name: str
+    size: int
+    media_content_type: str   # corresponds to "@odata.mediaContentType"
+    media_read_link: str      # corresponds to "@odata.mediaReadLink"
+    content_bytes: Optional[str]  # Base64 encoded content, may not be present in metadata response
+    __slots__ = ("odata_type", "id", "name", "size", "media_content_type", "media_read_link", "content_bytes")
+
+    def __init__(self, odata_type: str, id: str, name: str, size: int, media_content_type: str,
+                 media_read_link: str, content_bytes: Optional[str] = None):
+        self.odata_type = odata_type
+        self.id = id
+        self.name = name
+        self.size = size
+        self.media_content_type = media_content_type
+        self.media_read_link = media_read_link
+        self.content_bytes = content_bytes
+
+    @staticmethod
+    def from_dict(obj: Dict[str, Any]) -> "FileAttachment":
+        return FileAttachment(
+            odata_type=obj.get("@odata.type", ""),
+            id=obj.get("id", ""),
+            name=obj.get("name", ""),
+            size=obj.get("size", 0),
+            media_content_type=obj.get("@odata.mediaContentType", ""),
+            media_read_link=obj.get("@odata.mediaReadLink", ""),
+            content_bytes=obj.get("contentBytes", None)
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        obj = {
+            "@odata.type": self.odata_type,
+            "id": self.id,
+            "name": self.name,
+            "size": self.size,
+            "@odata.mediaContentType": self.media_content_type,
+            "@odata.mediaReadLink": self.media_read_link
+        }
+        if self.content_bytes is not None:
+            obj["contentBytes"] = self.content_bytes
+        return obj
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, FileAttachment):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self) -> str:
+        return f"FileAttachment(id={self.id!r}, name={self.name!r}, size={self.size!r})"
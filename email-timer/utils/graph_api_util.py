@@ -1,9 +1,19 @@
 import os
-import msal
-import requests
+from typing import Any, Dict, Iterator, List, Tuple
+from urllib.parse import quote
 import logging
 
-from utils.email_dtos import MessageResponse
+from utils.graph_batch import GraphBatchClient, GraphBatchRequest
+from utils.http_session import HttpSession
+from utils.token_provider import TokenProvider
+from utils.email_dtos import FileAttachment, Message, MessageDeltaPage, MessageResponse
+
+
+class DeltaLinkExpiredError(Exception):
+    # Raised when Graph no longer accepts a stored deltaLink and a full resync is needed.
+    pass
+
+
 class GraphAPIUtil:
     @staticmethod
     def get_graph_api_url():
@@ -28,56 +38,98 @@ class GraphAPIUtil:
     
     @staticmethod
     def get_msal_app():
-        return msal.ConfidentialClientApplication(
-            client_id=GraphAPIUtil.get_client_id(),
-            client_credential=GraphAPIUtil.get_client_secret(),
-            authority=f"https://login.microsoftonline.com/{GraphAPIUtil.get_tenant_id()}"
-        )
+        return TokenProvider.get_msal_app()
     
     @staticmethod
     def get_access_token():
-        # if token provided in env, use it directly (for testing)
-        token = os.getenv("TOKEN", None)
-        if token:
-            logging.info("Using token from environment variable.")
-            return token
-        app = GraphAPIUtil.get_msal_app()
-        scopes = ["https://graph.microsoft.com/.default"]
-        result = app.acquire_token_for_client(scopes=scopes)
-        if "access_token" in result:
-            return result["access_token"]
-        else:
-            raise Exception("Could not obtain access token from MSAL.")
+        return TokenProvider.get_token()
 
     @staticmethod
-    def get_messages_by_filter(filter: str) -> MessageResponse:
-        token = GraphAPIUtil.get_access_token()
+    def build_query(params: Dict[str, Any]) -> str:
+        # Encode OData query options with %20 for spaces; Graph does not treat "+" as a space in $filter.
+        return "&".join(
+            key + "=" + quote(str(value), safe="',()") for key, value in params.items() if value not in (None, "")
+        )
+
+    @staticmethod
+    def iter_messages(filter: str = None, top: int = None, select: List[str] = None, orderby: str = None) -> Iterator[Message]:
+        # Yields messages one page at a time, following @odata.nextLink lazily so
+        # callers can start work before the last page has been requested.
         headers = {
-            "Authorization": f"Bearer {token}",
             "Content-Type": "application/json"
         }
-        url = f"{GraphAPIUtil.get_graph_api_messages_url()}?$filter={filter}"
-        response = requests.get(url, headers=headers)
-        if response.status_code == 200:
-            msg_resp : MessageResponse = MessageResponse.from_dict(response.json())
-            logging.info(f"response: {response.text}")
-            return msg_resp
+        query = GraphAPIUtil.build_query({
+            "$filter": filter,
+            "$top": top,
+            "$select": ",".join(select) if select else None,
+            "$orderby": orderby
+        })
+        url = f"{GraphAPIUtil.get_graph_api_messages_url()}?{query}" if query else GraphAPIUtil.get_graph_api_messages_url()
+        page = 0
+        while url:
+            response = HttpSession.graph_request("GET", url, headers=headers)
+            if response.status_code != 200:
+                raise Exception(f"Error fetching messages: {response.status_code} {response.text}")
+            data = response.json()
+            page += 1
+            values = data.get("value", [])
+            # nextLink already carries every query option of the original request
+            url = data.get("@odata.nextLink")
+            del data
+            logging.info(f"Fetched page {page} with {len(values)} messages, more pages: {url is not None}.")
+            values.reverse()
+            while values:
+                yield Message.from_dict(values.pop())
+
+    @staticmethod
+    def iter_message_delta_pages(delta_link: str = None, folder: str = "inbox", select: List[str] = None,
+                                 page_size: int = None, received_since: str = None) -> Iterator[MessageDeltaPage]:
+        # Starts a new delta round from delta_link, or an initial sync of the folder when it is None.
+        # The last page carries the deltaLink to persist for the next round.
+        headers = {
+            "Content-Type": "application/json"
+        }
+        if page_size:
+            headers["Prefer"] = f"odata.maxpagesize={page_size}"
+        if delta_link:
+            url = delta_link
         else:
-            raise Exception(f"Error fetching messages: {response.status_code} {response.text}")
+            query = GraphAPIUtil.build_query({
+                "$select": ",".join(select) if select else None,
+                "$filter": f"receivedDateTime ge {received_since}" if received_since else None
+            })
+            url = f"{GraphAPIUtil.get_graph_api_url()}/me/mailFolders/{folder}/messages/delta"
+            if query:
+                url = f"{url}?{query}"
+        while url:
+            response = HttpSession.graph_request("GET", url, headers=headers)
+            if response.status_code == 410:
+                raise DeltaLinkExpiredError(f"Delta link expired for folder {folder}: {response.text}")
+            if response.status_code != 200:
+                raise Exception(f"Error fetching message delta: {response.status_code} {response.text}")
+            page = MessageDeltaPage.from_dict(response.json())
+            logging.info(f"Fetched delta page with {len(page.messages)} changed and {len(page.removed_ids)} removed messages.")
+            yield page
+            url = page.next_link
+
+    @staticmethod
+    def get_messages_by_filter(filter: str) -> MessageResponse:
+        return MessageResponse(
+            odata_context="",
+            value=list(GraphAPIUtil.iter_messages(filter=filter))
+        )
         
 
     @staticmethod
     def mark_message_as_read(message_id: str) -> None:
-        token = GraphAPIUtil.get_access_token()
         headers = {
-            "Authorization": f"Bearer {token}",
             "Content-Type": "application/json"
         }
         url = f"{GraphAPIUtil.get_graph_api_messages_url()}/{message_id}"
         body = {
             "isRead": True
         }
-        response = requests.patch(url, headers=headers, json=body)
+        response = HttpSession.graph_request("PATCH", url, headers=headers, json=body)
         if response.status_code == 200:
             logging.info(f"Message {message_id} marked as read.")
         else:
@@ -86,23 +138,90 @@ class GraphAPIUtil:
     
     @staticmethod
     def mark_message_as_unread(message_id: str) -> None:
-        token = GraphAPIUtil.get_access_token()
         headers = {
-            "Authorization": f"Bearer {token}",
             "Content-Type": "application/json"
         }
         url = f"{GraphAPIUtil.get_graph_api_messages_url()}/{message_id}"
         body = {    
             "isRead": False
         }
-        response = requests.patch(url, headers=headers, json=body)
+        response = HttpSession.graph_request("PATCH", url, headers=headers, json=body)
         if response.status_code == 200:
             logging.info(f"Message {message_id} marked as unread.")
         else:
             raise Exception(f"Error marking message as unread: {response.status_code} {response.text}")
-        
 
-    
 
-    
+    @staticmethod
+    def parse_file_attachments(attachments_data: List[Dict[str, Any]]) -> List[FileAttachment]:
+        return [
+            FileAttachment.from_dict(att) for att in attachments_data
+            if att.get("@odata.type") == "#microsoft.graph.fileAttachment"
+        ]
+
+    @staticmethod
+    def get_attachments_metadata_batch(message_ids: List[str]) -> Tuple[Dict[str, List[FileAttachment]], Dict[str, str]]:
+        # One $batch round trip per 20 messages; returns (attachments by message id, errors by message id).
+        # contentBytes is excluded so the batch response stays small.
+        batch_requests = [
+            GraphBatchRequest(
+                id=str(i),
+                method="GET",
+                url=f"/me/messages/{message_id}/attachments?$select=id,name,size,contentType"
+            )
+            for i, message_id in enumerate(message_ids)
+        ]
+        results = GraphBatchClient.execute(batch_requests)
+        attachments: Dict[str, List[FileAttachment]] = {}
+        errors: Dict[str, str] = {}
+        for i, message_id in enumerate(message_ids):
+            result = results.get(str(i))
+            if result is not None and result.ok:
+                attachments[message_id] = GraphAPIUtil.parse_file_attachments((result.body or {}).get("value", []))
+            else:
+                errors[message_id] = result.error_message if result is not None else "no response"
+        return attachments, errors
 
+    @staticmethod
+    def get_messages_batch(message_ids: List[str], select: List[str] = None) -> Tuple[Dict[str, Message], Dict[str, str]]:
+        # One $batch round trip per 20 messages; returns (messages by id, errors by message id).
+        query = GraphAPIUtil.build_query({"$select": ",".join(select) if select else None})
+        batch_requests = [
+            GraphBatchRequest(
+                id=str(i),
+                method="GET",
+                url=f"/me/messages/{message_id}?{query}" if query else f"/me/messages/{message_id}"
+            )
+            for i, message_id in enumerate(message_ids)
+        ]
+        results = GraphBatchClient.execute(batch_requests)
+        messages: Dict[str, Message] = {}
+        errors: Dict[str, str] = {}
+        for i, message_id in enumerate(message_ids):
+            result = results.get(str(i))
+            if result is not None and result.ok:
+                messages[message_id] = Message.from_dict(result.body or {})
+            else:
+                errors[message_id] = result.error_message if result is not None else "no response"
+        return messages, errors
+
+    @staticmethod
+    def set_messages_read_state_batch(message_ids: List[str], is_read: bool = True) -> Dict[str, str]:
+        # Returns errors by message id; an empty dict means every message was updated.
+        batch_requests = [
+            GraphBatchRequest(
+                id=str(i),
+                method="PATCH",
+                url=f"/me/messages/{message_id}",
+                body={"isRead": is_read}
+            )
+            for i, message_id in enumerate(message_ids)
+        ]
+        results = GraphBatchClient.execute(batch_requests)
+        errors: Dict[str, str] = {}
+        for i, message_id in enumerate(message_ids):
+            result = results.get(str(i))
+            if result is None or not result.ok:
+                errors[message_id] = result.error_message if result is not None else "no response"
+        logging.info(f"Set isRead={is_read} on {len(message_ids) - len(errors)} of {len(message_ids)} messages.")
+        return errors
@@ -0,0 +1,182 @@
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from utils.http_session import HttpSession
+from utils.rate_limiter import GraphRateLimiter
+
+
+@dataclass
+class GraphBatchRequest:
+    id: str
+    method: str
+    url: str                    # relative to the API version, e.g. "/me/messages/{id}"
+    body: Optional[Dict[str, Any]] = None
+    headers: Optional[Dict[str, str]] = None
+    depends_on: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        obj = {
+            "id": self.id,
+            "method": self.method,
+            "url": self.url
+        }
+        if self.body is not None:
+            obj["body"] = self.body
+            obj["headers"] = dict(self.headers or {}, **{"Content-Type": "application/json"})
+        elif self.headers:
+            obj["headers"] = self.headers
+        if self.depends_on:
+            obj["dependsOn"] = self.depends_on
+        return obj
+
+
+@dataclass
+class GraphBatchResponse:
+    id: str
+    status: int
+    headers: Dict[str, str]
+    body: Any
+
+    @staticmethod
+    def from_dict(obj: Dict[str, Any]) -> "GraphBatchResponse":
+        return GraphBatchResponse(
+            id=obj.get("id", ""),
+            status=obj.get("status", 0),
+            headers=obj.get("headers", {}) or {},
+            body=obj.get("body")
+        )
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status < 300
+
+    @property
+    def error_message(self) -> str:
+        if isinstance(self.body, dict):
+            error = self.body.get("error", {})
+            return f"{self.status} {error.get('code', '')}: {error.get('message', '')}"
+        return str(self.status)
+
+
+class GraphBatchClient:
+    # Graph JSON batching: up to 20 sub-requests per POST /$batch. Requests
+    # linked by dependsOn are always kept in the same batch, and only
+    # throttled sub-requests (plus dependents that failed because of them)
+    # are retried.
+    max_batch_size = 20
+    retry_statuses = (429, 503)
+
+    @staticmethod
+    def get_batch_url() -> str:
+        return f"{os.getenv('GRAPH_API_URL', 'https://graph.microsoft.com/v1.0')}/$batch"
+
+    @staticmethod
+    def get_max_retries() -> int:
+        return int(os.getenv("GRAPH_BATCH_MAX_RETRIES", "3"))
+
+    @classmethod
+    def split_into_batches(cls, requests: List[GraphBatchRequest]) -> List[List[GraphBatchRequest]]:
+        # Group requests into dependsOn chains, then pack whole chains into batches.
+        by_id = {r.id: r for r in requests}
+        if len(by_id) != len(requests):
+            raise Exception("Batch request ids must be unique.")
+        parent = {r.id: r.id for r in requests}
+
+        def find(request_id: str) -> str:
+            while parent[request_id] != request_id:
+                parent[request_id] = parent[parent[request_id]]
+                request_id = parent[request_id]
+            return request_id
+
+        for r in requests:
+            for dep in r.depends_on:
+                if dep not in by_id:
+                    raise Exception(f"Batch request {r.id} depends on unknown request {dep}.")
+                parent[find(r.id)] = find(dep)
+
+        groups: Dict[str, List[GraphBatchRequest]] = {}
+        for r in requests:
+            groups.setdefault(find(r.id), []).append(r)
+
+        batches: List[List[GraphBatchRequest]] = []
+        current: List[GraphBatchRequest] = []
+        for group in groups.values():
+            if len(group) > cls.max_batch_size:
+                raise Exception(f"dependsOn chain of {len(group)} requests exceeds the batch limit of {cls.max_batch_size}.")
+            if len(current) + len(group) > cls.max_batch_size:
+                batches.append(current)
+                current = []
+            current.extend(group)
+        if current:
+            batches.append(current)
+        return batches
+
+    @classmethod
+    def send_batch(cls, batch: List[GraphBatchRequest]) -> Dict[str, GraphBatchResponse]:
+        response = HttpSession.graph_request(
+            "POST",
+            cls.get_batch_url(),
+            headers={"Content-Type": "application/json"},
+            json={"requests": [r.to_dict() for r in batch]}
+        )
+        if response.status_code != 200:
+            raise Exception(f"Error sending batch request: {response.status_code} {response.text}")
+        results = [GraphBatchResponse.from_dict(r) for r in response.json().get("responses", [])]
+        return {r.id: r for r in results}
+
+    @classmethod
+    def get_retry_ids(cls, batch: List[GraphBatchRequest], results: Dict[str, GraphBatchResponse]) -> List[str]:
+        retry_ids = set(r.id for r in results.values() if r.status in cls.retry_statuses)
+        # 424 Failed Dependency: retry if the request it depended on is being retried.
+        for r in batch:
+            result = results.get(r.id)
+            if result is not None and result.status == 424 and any(dep in retry_ids for dep in r.depends_on):
+                retry_ids.add(r.id)
+        return [r.id for r in batch if r.id in retry_ids]
+
+    @classmethod
+    def get_retry_delay(cls, results: List[GraphBatchResponse], attempt: int) -> float:
+        delays = []
+        for r in results:
+            retry_after = r.headers.get("Retry-After") or r.headers.get("retry-after")
+            if retry_after:
+                try:
+                    delays.append(float(retry_after))
+                except ValueError:
+                    pass
+        return max(delays) if delays else min(2 ** attempt, 30)
+
+    @classmethod
+    def execute(cls, requests: List[GraphBatchRequest]) -> Dict[str, GraphBatchResponse]:
+        results: Dict[str, GraphBatchResponse] = {}
+        for batch in cls.split_into_batches(requests):
+            pending = batch
+            attempt = 0
+            while pending:
+                batch_results = cls.send_batch(pending)
+                results.update(batch_results)
+                retry_ids = cls.get_retry_ids(pending, batch_results)
+                if not retry_ids or attempt >= cls.get_max_retries():
+                    break
+                attempt += 1
+                delay = cls.get_retry_delay([batch_results[i] for i in retry_ids], attempt)
+                GraphRateLimiter.on_throttled("batch")
+                logging.warning(f"{len(retry_ids)} batch sub-requests throttled, retrying in {delay}s (attempt {attempt}).")
+                time.sleep(delay)
+                retry_set = set(retry_ids)
+                pending = [
+                    GraphBatchRequest(
+                        id=r.id,
+                        method=r.method,
+                        url=r.url,
+                        body=r.body,
+                        headers=r.headers,
+                        # dependencies that already succeeded are not resent
+                        depends_on=[dep for dep in r.depends_on if dep in retry_set]
+                    )
+                    for r in pending if r.id in retry_set
+                ]
+        return results
@@ -0,0 +1,131 @@
+import logging
+import os
+import threading
+import time
+from typing import TYPE_CHECKING
+
+from utils.rate_limiter import GraphRateLimiter
+from utils.token_provider import TokenProvider
+
+if TYPE_CHECKING:
+    import requests
+
+
+class GraphRequestError(Exception):
+    # Carries the HTTP status so callers can react to specific failures (e.g. 404).
+    def __init__(self, message: str, status_code: int = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class HttpSession:
+    # One pooled keep-alive requests.Session per worker process, shared by
+    # every Graph call (and any other outbound HTTP) in the function app.
+    session = None
+    lock = threading.Lock()
+
+    @classmethod
+    def get_pool_connections(cls) -> int:
+        return int(os.getenv("HTTP_POOL_CONNECTIONS", "10"))
+
+    @classmethod
+    def get_pool_maxsize(cls) -> int:
+        return int(os.getenv("HTTP_POOL_MAXSIZE", "32"))
+
+    @classmethod
+    def get_default_timeout(cls) -> tuple:
+        # (connect, read) in seconds
+        return (
+            float(os.getenv("HTTP_CONNECT_TIMEOUT", "5")),
+            float(os.getenv("HTTP_READ_TIMEOUT", "60"))
+        )
+
+    @classmethod
+    def get_transfer_timeout(cls) -> tuple:
+        # Longer read timeout for attachment downloads and file uploads.
+        return (
+            float(os.getenv("HTTP_CONNECT_TIMEOUT", "5")),
+            float(os.getenv("HTTP_TRANSFER_TIMEOUT", "300"))
+        )
+
+    @classmethod
+    def get_session(cls) -> "requests.Session":
+        if cls.session is None:
+            # requests is imported on first use to keep it off the cold-start path.
+            import requests
+            from requests.adapters import HTTPAdapter
+            with cls.lock:
+                if cls.session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(
+                        pool_connections=cls.get_pool_connections(),
+                        pool_maxsize=cls.get_pool_maxsize(),
+                        pool_block=False
+                    )
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    session.headers.update({"Connection": "keep-alive"})
+                    cls.session = session
+                    logging.info(f"Created shared HTTP session (pool_connections={cls.get_pool_connections()}, pool_maxsize={cls.get_pool_maxsize()}).")
+        return cls.session
+
+    @classmethod
+    def request(cls, method: str, url: str, timeout=None, **kwargs) -> "requests.Response":
+        if timeout is None:
+            timeout = cls.get_default_timeout()
+        return cls.get_session().request(method, url, timeout=timeout, **kwargs)
+
+    @classmethod
+    def graph_request(cls, method: str, url: str, headers: dict = None, timeout=None, **kwargs) -> "requests.Response":
+        # The bearer token is added per call rather than on the session so it
+        # is never sent to non-Graph hosts that share the same session.
+        # Calls are paced by the per-endpoint-class rate limiter; 429 is retried
+        # for any method (the request was not processed), 503 and connection
+        # errors only for idempotent methods, honouring Retry-After.
+        import requests
+        endpoint_class = GraphRateLimiter.classify(url)
+        idempotent = method.upper() in GraphRateLimiter.idempotent_methods
+        data = kwargs.get("data")
+        replayable = data is None or isinstance(data, (bytes, str, dict)) or hasattr(data, "seek")
+        start_position = data.tell() if hasattr(data, "tell") else None
+        max_retries = GraphRateLimiter.get_max_retries() if replayable else 0
+        attempt = 0
+        while True:
+            headers = dict(headers or {})
+            headers["Authorization"] = f"Bearer {TokenProvider.get_token()}"
+            if start_position is not None and attempt > 0:
+                data.seek(start_position)
+            GraphRateLimiter.acquire(endpoint_class)
+            try:
+                response = cls.request(method, url, headers=headers, timeout=timeout, **kwargs)
+            except requests.exceptions.RequestException as e:
+                if not idempotent or attempt >= max_retries:
+                    raise
+                attempt += 1
+                delay = GraphRateLimiter.get_backoff_delay(attempt)
+                logging.warning(f"{method} {endpoint_class} request failed ({e}), retrying in {delay:.1f}s (attempt {attempt}).")
+                time.sleep(delay)
+                continue
+
+            status = response.status_code
+            if status == 429 or (status == 503 and idempotent):
+                retry_after = GraphRateLimiter.parse_retry_after(response.headers.get("Retry-After"))
+                GraphRateLimiter.on_throttled(endpoint_class, retry_after)
+                if attempt >= max_retries:
+                    return response
+                attempt += 1
+                delay = GraphRateLimiter.get_backoff_delay(attempt, retry_after)
+                logging.warning(f"Graph throttled {method} {endpoint_class} request with {status}, retrying in {delay:.1f}s (attempt {attempt}).")
+                response.close()
+                time.sleep(delay)
+                continue
+            if status < 500:
+                GraphRateLimiter.on_success(endpoint_class)
+            return response
+
+    @classmethod
+    def close(cls):
+        with cls.lock:
+            if cls.session is not None:
+                cls.session.close()
+                cls.session = None
@@ -0,0 +1,133 @@
+import json
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional
+
+from utils.email_dtos import Message
+from utils.graph_api_util import DeltaLinkExpiredError, GraphAPIUtil
+from utils.storage_table_entities import MailboxSyncStateEntity
+from utils.storage_table_util import StorageTableUtil
+
+
+class MailboxDeltaSync:
+    # Incremental mailbox sync on top of Graph messages/delta. The deltaLink
+    # of the last completed round is stored in Table Storage, so each tick
+    # only sees messages that changed since the previous tick. The cursor
+    # advances even when some dispatches fail; those message ids are stored
+    # with it and fetched by id at the start of the next ticks, up to
+    # EMAIL_DELTA_MAX_RETRIES times, so one failing email never holds the
+    # cursor back.
+    mailbox = "me"
+
+    def __init__(self, folder: str = None, select: List[str] = None, page_size: int = None):
+        self.folder = folder or os.getenv("EMAIL_DELTA_FOLDER", "inbox")
+        self.select = select
+        self.page_size = page_size
+        self.pending_delta_link: Optional[str] = None
+        self.retry_counts: Dict[str, int] = {}  # failed dispatches so far, by message id
+        self.unfetched_ids: List[str] = []
+        self.stats = {"pages": 0, "changed": 0, "removed": 0, "skipped_read": 0, "retried": 0}
+
+    @staticmethod
+    def get_table_name() -> str:
+        return os.getenv("EMAIL_SYNC_STATE_TABLE", "MailboxSyncState")
+
+    @staticmethod
+    def get_max_retries() -> int:
+        return int(os.getenv("EMAIL_DELTA_MAX_RETRIES", "5"))
+
+    @staticmethod
+    def get_initial_received_since() -> str:
+        # The first round (or a resync after the cursor expired) only looks back this far.
+        hours = int(os.getenv("EMAIL_DELTA_INITIAL_HOURS", "24"))
+        since = datetime.now(timezone.utc) - timedelta(hours=hours)
+        return since.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    def load_delta_link(self) -> Optional[str]:
+        # A storage error raises rather than reading as "no cursor", which would restart the initial sync.
+        entity = StorageTableUtil.get_entity(table_name=self.get_table_name(), partition_key=self.mailbox, row_key=self.folder)
+        if entity is None:
+            return None
+        state = MailboxSyncStateEntity.from_dict(entity)
+        self.retry_counts = json.loads(state.retryIds) if state.retryIds else {}
+        return state.deltaLink
+
+    def iter_new_messages(self) -> Iterator[Message]:
+        delta_link = self.load_delta_link()
+        if delta_link is None:
+            logging.info(f"No delta cursor stored for folder {self.folder}, starting initial sync.")
+        seen = set()
+        for msg in self.iter_retries():
+            seen.add(msg.id)
+            yield msg
+        try:
+            yield from (msg for msg in self.iter_delta(delta_link) if msg.id not in seen)
+        except DeltaLinkExpiredError as e:
+            if delta_link is None:
+                raise
+            logging.warning(f"{e}. Starting a new initial sync.")
+            yield from (msg for msg in self.iter_delta(None) if msg.id not in seen)
+
+    def iter_retries(self) -> Iterator[Message]:
+        # Unread emails whose dispatch failed in earlier ticks. One that cannot be
+        # fetched counts as failing again; one read since is dropped.
+        if not self.retry_counts:
+            return
+        messages, errors = GraphAPIUtil.get_messages_batch(list(self.retry_counts), select=self.select)
+        for message_id, error in errors.items():
+            logging.warning(f"Could not fetch email {message_id} to retry its dispatch: {error}")
+            self.unfetched_ids.append(message_id)
+        for msg in messages.values():
+            if msg.isRead:
+                continue
+            self.stats["retried"] += 1
+            yield msg
+
+    def iter_delta(self, delta_link: Optional[str]) -> Iterator[Message]:
+        for page in GraphAPIUtil.iter_message_delta_pages(
+            delta_link=delta_link,
+            folder=self.folder,
+            select=self.select,
+            page_size=self.page_size,
+            received_since=None if delta_link else self.get_initial_received_since()
+        ):
+            self.stats["pages"] += 1
+            self.stats["removed"] += len(page.removed_ids)
+            for msg in page.messages:
+                if msg.isRead:
+                    # Delta also reports messages that were only marked as read.
+                    self.stats["skipped_read"] += 1
+                    continue
+                self.stats["changed"] += 1
+                yield msg
+            if page.delta_link:
+                self.pending_delta_link = page.delta_link
+
+    def get_next_retry_counts(self, failed_ids: List[str]) -> Dict[str, int]:
+        retry_counts: Dict[str, int] = {}
+        for message_id in dict.fromkeys(failed_ids + self.unfetched_ids):
+            attempts = self.retry_counts.get(message_id, 0) + 1
+            if attempts > self.get_max_retries():
+                logging.error(f"Giving up on email {message_id} after {attempts} failed dispatches.")
+                continue
+            retry_counts[message_id] = attempts
+        return retry_counts
+
+    def commit(self, failed_ids: List[str] = None) -> bool:
+        # Persist the cursor only once the whole round has been handed off,
+        # so an interrupted tick is replayed rather than lost. failed_ids are
+        # the emails whose dispatch failed, including retries that failed again.
+        if not self.pending_delta_link:
+            return False
+        retry_counts = self.get_next_retry_counts(list(failed_ids or []))
+        entity = MailboxSyncStateEntity(
+            PartitionKey=self.mailbox,
+            RowKey=self.folder,
+            deltaLink=self.pending_delta_link,
+            updatedDateTime=datetime.now(timezone.utc).isoformat(),
+            retryIds=json.dumps(retry_counts) if retry_counts else None
+        ).__dict__
+        StorageTableUtil.upsert_entity(table_name=self.get_table_name(), entity=entity)
+        logging.info(f"Stored delta cursor for folder {self.folder}, {len(retry_counts)} emails to retry.")
+        return True
@@ -0,0 +1,78 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from utils.email_dtos import FileAttachment, Message
+
+
+@dataclass
+class EnvelopeMessage:
+    # The part of a Graph message the processor needs.
+    id: str
+    subject: str
+    sender: str                 # from.emailAddress.address
+    receivedDateTime: str
+    attachments: Optional[List[FileAttachment]] = None   # pre-fetched metadata; None means "not fetched"
+
+    @staticmethod
+    def from_message(message: Message, attachments: Optional[List[FileAttachment]] = None) -> "EnvelopeMessage":
+        return EnvelopeMessage(
+            id=message.id,
+            subject=message.subject,
+            sender=message.from_.emailAddress.address,
+            receivedDateTime=message.receivedDateTime,
+            attachments=attachments
+        )
+
+    @staticmethod
+    def from_dict(obj: Dict[str, Any]) -> "EnvelopeMessage":
+        attachments = obj.get("attachments")
+        return EnvelopeMessage(
+            id=obj.get("id", ""),
+            subject=obj.get("subject", ""),
+            sender=obj.get("sender", ""),
+            receivedDateTime=obj.get("receivedDateTime", ""),
+            attachments=[FileAttachment.from_dict(a) for a in attachments] if attachments is not None else None
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        obj = {
+            "id": self.id,
+            "subject": self.subject,
+            "sender": self.sender,
+            "receivedDateTime": self.receivedDateTime
+        }
+        if self.attachments is not None:
+            # Metadata only; content is always downloaded by the processor.
+            obj["attachments"] = [
+                {k: v for k, v in a.to_dict().items() if k != "contentBytes" and v != ""}
+                for a in self.attachments
+            ]
+        return obj
+
+
+@dataclass
+class MessageEnvelope:
+    # Timer -> processor payload carrying one or more messages. The processor
+    # also still accepts a bare Graph message (the previous payload format).
+    messages: List[EnvelopeMessage]
+    version: int = 1
+
+    envelope_type = "messageEnvelope"
+
+    @staticmethod
+    def is_envelope(obj: Any) -> bool:
+        return isinstance(obj, dict) and obj.get("type") == MessageEnvelope.envelope_type
+
+    @staticmethod
+    def from_dict(obj: Dict[str, Any]) -> "MessageEnvelope":
+        return MessageEnvelope(
+            messages=[EnvelopeMessage.from_dict(m) for m in obj.get("messages", [])],
+            version=obj.get("version", 1)
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "type": self.envelope_type,
+            "version": self.version,
+            "messages": [m.to_dict() for m in self.messages]
+        }
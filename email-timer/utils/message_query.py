@@ -0,0 +1,100 @@
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from utils.email_dtos import Message
+from utils.vendor_router import VendorRouter
+
+
+class MessageQuery:
+    # Graph $filter/$select for the mailbox scan, built so that mail the
+    # processor would do nothing with (no attachments, unknown senders, old
+    # mail) is dropped by the server instead of being fetched and dispatched.
+    # matches() applies the same criteria to each message that comes back,
+    # which covers what the server cannot filter (messages/delta only accepts
+    # a receivedDateTime filter) and the coarse server-side domain match.
+
+    # Everything the timer and the processor envelope read from a message.
+    required_select = ["id", "subject", "from", "receivedDateTime", "hasAttachments", "isRead"]
+
+    def __init__(self, base_filter: str = "isRead eq false", require_attachments: bool = True,
+                 received_window_hours: int = 0, sender_filter: str = "client",
+                 sender_domains: List[str] = None, select: List[str] = None):
+        self.base_filter = base_filter
+        self.require_attachments = require_attachments
+        self.received_window_hours = received_window_hours
+        self.sender_filter = sender_filter          # "client", "server" or "off"
+        self.sender_domains = sender_domains or []
+        self.select = select
+        self.skipped = {"no_attachments": 0, "sender": 0}
+
+    @staticmethod
+    def get_max_server_domains() -> int:
+        # Beyond this many domains the endswith() clauses make the URL too long; filter on the client instead.
+        return int(os.getenv("EMAIL_SENDER_FILTER_MAX_DOMAINS", "15"))
+
+    @staticmethod
+    def from_env() -> "MessageQuery":
+        sender_filter = os.getenv("EMAIL_SENDER_FILTER", "client").lower()
+        sender_domains = []
+        if sender_filter != "off":
+            try:
+                sender_domains = VendorRouter.get_domains()
+            except Exception as e:
+                logging.warning(f"Could not load vendor domains, not filtering by sender: {e}")
+        fields = [f.strip() for f in os.getenv("EMAIL_SELECT_FIELDS", "").split(",") if f.strip()]
+        return MessageQuery(
+            base_filter=os.getenv("EMAIL_FILTER", "isRead eq false"),
+            require_attachments=os.getenv("EMAIL_REQUIRE_ATTACHMENTS", "true").lower() == "true",
+            # Off by default: with a window, unread mail older than it is never dispatched again.
+            received_window_hours=int(os.getenv("EMAIL_RECEIVED_WINDOW_HOURS", "0")),
+            sender_filter=sender_filter,
+            sender_domains=sender_domains,
+            select=fields or None
+        )
+
+    def get_received_since(self, now: datetime = None) -> Optional[str]:
+        if self.received_window_hours <= 0:
+            return None
+        since = (now or datetime.now(timezone.utc)) - timedelta(hours=self.received_window_hours)
+        return since.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    def uses_server_sender_filter(self) -> bool:
+        return self.sender_filter == "server" and 0 < len(self.sender_domains) <= self.get_max_server_domains()
+
+    def build_filter(self, now: datetime = None) -> Optional[str]:
+        clauses = []
+        received_since = self.get_received_since(now)
+        if received_since:
+            logging.info(f"Unread mail received before {received_since} is not fetched (EMAIL_RECEIVED_WINDOW_HOURS={self.received_window_hours}).")
+            # First, so $orderby=receivedDateTime stays valid (Graph wants ordered properties leading the filter).
+            clauses.append(f"receivedDateTime ge {received_since}")
+        if self.base_filter:
+            clauses.append(f"({self.base_filter})" if " or " in self.base_filter else self.base_filter)
+        if self.require_attachments:
+            clauses.append("hasAttachments eq true")
+        if self.uses_server_sender_filter():
+            # endswith without the "@" also admits subdomains; matches() drops look-alike domains.
+            domains = " or ".join(
+                "endswith(from/emailAddress/address,'{}')".format(domain.replace("'", "''"))
+                for domain in self.sender_domains
+            )
+            clauses.append(f"({domains})")
+        return " and ".join(clauses) or None
+
+    def build_select(self) -> List[str]:
+        # Custom fields are extended with the required ones so matches() and the envelope keep working.
+        if not self.select:
+            return list(self.required_select)
+        return self.select + [f for f in self.required_select if f not in self.select]
+
+    def matches(self, message: Message) -> bool:
+        if self.require_attachments and not message.hasAttachments:
+            self.skipped["no_attachments"] += 1
+            return False
+        if self.sender_filter != "off" and self.sender_domains:
+            if VendorRouter.resolve(message.from_.emailAddress.address) is None:
+                self.skipped["sender"] += 1
+                return False
+        return True
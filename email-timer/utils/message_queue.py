@@ -0,0 +1,161 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import dataclass, replace
+from typing import Deque, Dict, List, Optional
+
+
+@dataclass
+class QueuedMessage:
+    id: str
+    content: str
+    dequeue_count: int = 0
+    pop_receipt: Optional[str] = None
+
+
+class MessageQueue(ABC):
+    # Minimal queue interface used for the timer -> processor handoff, so the
+    # Azure Storage queue can be swapped for an in-memory one (or Azurite via
+    # its connection string) in tests.
+    @abstractmethod
+    def send(self, content: str) -> str:
+        ...
+
+    @abstractmethod
+    def receive(self, max_messages: int = 1, visibility_timeout: int = 30) -> List[QueuedMessage]:
+        ...
+
+    @abstractmethod
+    def delete(self, message: QueuedMessage):
+        ...
+
+
+class AzureStorageQueue(MessageQueue):
+    def __init__(self, queue_name: str, connection_string: str):
+        # The SDK is imported on first use to keep it off the cold-start path.
+        from azure.storage.queue import QueueClient, TextBase64DecodePolicy, TextBase64EncodePolicy
+        # Base64 is what the Functions queue trigger expects by default.
+        self.queue_client = QueueClient.from_connection_string(
+            connection_string,
+            queue_name,
+            message_encode_policy=TextBase64EncodePolicy(),
+            message_decode_policy=TextBase64DecodePolicy()
+        )
+        self.queue_name = queue_name
+        self.ensure_queue_exists()
+
+    def ensure_queue_exists(self):
+        from azure.core.exceptions import ResourceExistsError
+        try:
+            self.queue_client.create_queue()
+        except ResourceExistsError:
+            pass
+        except Exception as e:
+            raise Exception(f"Error creating or accessing queue {self.queue_name}: {str(e)}")
+
+    def send(self, content: str) -> str:
+        return self.queue_client.send_message(content).id
+
+    def receive(self, max_messages: int = 1, visibility_timeout: int = 30) -> List[QueuedMessage]:
+        messages = self.queue_client.receive_messages(messages_per_page=max_messages, visibility_timeout=visibility_timeout, max_messages=max_messages)
+        return [
+            QueuedMessage(id=m.id, content=m.content, dequeue_count=m.dequeue_count, pop_receipt=m.pop_receipt)
+            for m in messages
+        ]
+
+    def delete(self, message: QueuedMessage):
+        self.queue_client.delete_message(message.id, message.pop_receipt)
+
+
+class InMemoryQueue(MessageQueue):
+    # In-process stand-in with the same visibility-timeout semantics: a
+    # received message reappears unless it is deleted in time, and once it
+    # has been dequeued max_dequeue_count times it moves to the poison queue.
+    def __init__(self, queue_name: str, max_dequeue_count: int = 5, poison_queue: "InMemoryQueue" = None):
+        self.queue_name = queue_name
+        self.max_dequeue_count = max_dequeue_count
+        self.poison_queue = poison_queue
+        self.messages: Deque[QueuedMessage] = deque()
+        self.invisible: Dict[str, tuple] = {}   # id -> (message, visible_at)
+        self.lock = threading.Lock()
+
+    def send(self, content: str) -> str:
+        message = QueuedMessage(id=str(uuid.uuid4()), content=content)
+        with self.lock:
+            self.messages.append(message)
+        return message.id
+
+    def restore_expired(self, now: float):
+        # Caller must hold self.lock.
+        for message_id, (message, visible_at) in list(self.invisible.items()):
+            if visible_at <= now:
+                del self.invisible[message_id]
+                self.messages.append(message)
+
+    def receive(self, max_messages: int = 1, visibility_timeout: int = 30) -> List[QueuedMessage]:
+        received = []
+        with self.lock:
+            now = time.monotonic()
+            self.restore_expired(now)
+            while self.messages and len(received) < max_messages:
+                message = self.messages.popleft()
+                if message.dequeue_count >= self.max_dequeue_count:
+                    if self.poison_queue is not None:
+                        self.poison_queue.send(message.content)
+                    logging.warning(f"Message {message.id} moved to poison queue after {message.dequeue_count} attempts.")
+                    continue
+                message.dequeue_count += 1
+                message.pop_receipt = str(uuid.uuid4())
+                self.invisible[message.id] = (message, now + visibility_timeout)
+                # A copy, so a consumer holding an earlier delivery keeps its own (stale) pop receipt.
+                received.append(replace(message))
+        return received
+
+    def delete(self, message: QueuedMessage):
+        with self.lock:
+            entry = self.invisible.get(message.id)
+            if entry is not None and entry[0].pop_receipt == message.pop_receipt:
+                del self.invisible[message.id]
+
+    def __len__(self) -> int:
+        with self.lock:
+            return len(self.messages) + len(self.invisible)
+
+
+class QueueUtil:
+    # Per-process registry of queues. EMAIL_QUEUE_BACKEND selects "azure"
+    # (Storage account or Azurite from AzureWebJobsStorage) or "memory".
+    queues: Dict[str, MessageQueue] = {}
+    lock = threading.Lock()
+
+    @staticmethod
+    def get_backend() -> str:
+        return os.getenv("EMAIL_QUEUE_BACKEND", "azure").lower()
+
+    @staticmethod
+    def get_connection_string() -> str:
+        return os.getenv("EMAIL_QUEUE_CONNECTION") or os.environ["AzureWebJobsStorage"]
+
+    @classmethod
+    def get_queue(cls, queue_name: str) -> MessageQueue:
+        queue = cls.queues.get(queue_name)
+        if queue is None:
+            with cls.lock:
+                queue = cls.queues.get(queue_name)
+                if queue is None:
+                    if cls.get_backend() == "memory":
+                        queue = InMemoryQueue(queue_name, poison_queue=InMemoryQueue(f"{queue_name}-poison"))
+                    else:
+                        queue = AzureStorageQueue(queue_name, cls.get_connection_string())
+                    cls.queues[queue_name] = queue
+        return queue
+
+    @classmethod
+    def set_queue(cls, queue_name: str, queue: MessageQueue):
+        # Lets tests install their own queue implementation.
+        with cls.lock:
+            cls.queues[queue_name] = queue
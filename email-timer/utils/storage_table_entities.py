@@ -0,0 +1,72 @@
+from dataclasses import MISSING, dataclass, fields
+from typing import Any, Dict, Optional
+
+
+def build_entity(entity_cls, obj: Dict[str, Any]):
+    # Builds a table entity dataclass from a queried row. Columns that were not
+    # selected fall back to the field default (or None); properties the
+    # dataclass does not know about are ignored.
+    values = {}
+    for f in fields(entity_cls):
+        if f.name in obj:
+            values[f.name] = obj[f.name]
+        else:
+            values[f.name] = f.default if f.default is not MISSING else None
+    return entity_cls(**values)
+
+
+@dataclass
+class EmailAttachmentEntity:
+    # Table Storage Keys
+    PartitionKey: str   # Email Id
+    RowKey: str         # Attachment Id
+
+    # Email metadata
+    email_subject: str
+    sender: str
+    receivedDateTime: str
+    processDateTime: str
+    attachmentName: str
+    extension: str
+    size: int
+
+    # SharePoint context
+    siteId: str
+    siteName: str
+    driveId: str
+    filepath: str
+
+    # Reporting info
+    isReported: bool = False
+    reportDateTime: Optional[str] = None
+
+
+@dataclass
+class MailboxSyncStateEntity:
+    # Table Storage Keys
+    PartitionKey: str   # Mailbox, e.g. "me"
+    RowKey: str         # Mail folder, e.g. "inbox"
+
+    # Graph messages/delta cursor
+    deltaLink: str
+    updatedDateTime: str
+    retryIds: Optional[str] = None     # JSON {message id: failed dispatches} of emails to dispatch again
+
+    @staticmethod
+    def from_dict(obj: Dict[str, Any]) -> "MailboxSyncStateEntity":
+        return build_entity(MailboxSyncStateEntity, obj)
+
+
+@dataclass
+class VendorDomainEntity:
+    # One sender domain of a vendor. A domain also matches its subdomains,
+    # so "redtiger.com" routes mail from "reports.redtiger.com" as well.
+    PartitionKey: str   # Vendor name
+    RowKey: str         # Sender domain, e.g. "redtiger.com"
+
+    folder: Optional[str] = None    # OneDrive folder; defaults to "Attachments/<vendor>"
+    isActive: bool = True
+
+    @staticmethod
+    def from_dict(obj: Dict[str, Any]) -> "VendorDomainEntity":
+        return build_entity(VendorDomainEntity, obj)
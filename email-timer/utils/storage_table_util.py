@@ -0,0 +1,91 @@
+from typing import TYPE_CHECKING, List, Optional
+import os
+import threading
+import logging
+
+if TYPE_CHECKING:
+    from azure.data.tables import TableClient
+
+
+class StorageTableUtil:
+    table_service = None
+    # Per-process registry of table clients whose table is known to exist.
+    table_clients = {}
+    lock = threading.Lock()
+    
+    @classmethod
+    def get_connection_string(cls)-> str:
+        return  os.environ["AzureWebJobsStorage"]
+
+    @classmethod
+    def get_table_service(cls):
+        if cls.table_service is None:
+            # The Azure SDK is imported on first use to keep it off the cold-start path.
+            from azure.data.tables import TableServiceClient
+            with cls.lock:
+                if cls.table_service is None:
+                    cls.table_service = TableServiceClient.from_connection_string(cls.get_connection_string())
+        return cls.table_service
+    
+    @classmethod
+    def ensure_table_exists(cls, table_name: str):
+        table_service = cls.get_table_service()
+        try:
+            table_service.create_table_if_not_exists(table_name=table_name)
+        except Exception as e:
+            raise Exception(f"Error creating or accessing table {table_name}: {str(e)}")
+        
+    @classmethod
+    def get_table_client(cls, table_name: str)-> "TableClient":
+        # The table is checked/created only the first time it is used in this process.
+        table_client = cls.table_clients.get(table_name)
+        if table_client is None:
+            cls.ensure_table_exists(table_name)
+            table_client = cls.get_table_service().get_table_client(table_name)
+            cls.table_clients[table_name] = table_client
+        return table_client
+
+    @classmethod
+    def is_table_not_found(cls, e: Exception) -> bool:
+        from azure.core.exceptions import ResourceNotFoundError
+        return isinstance(e, ResourceNotFoundError) and getattr(e, "error_code", None) == "TableNotFound"
+
+    @classmethod
+    def run_table_operation(cls, table_name: str, operation):
+        # Runs operation(table_client); if the table was deleted since it was
+        # registered, re-creates it once and retries.
+        try:
+            return operation(cls.get_table_client(table_name))
+        except Exception as e:
+            if not cls.is_table_not_found(e):
+                raise
+            logging.warning(f"Table {table_name} not found, re-creating it.")
+            cls.table_clients.pop(table_name, None)
+            return operation(cls.get_table_client(table_name))
+    
+    @classmethod
+    def upsert_entity(cls, table_name: str, entity: dict):
+        from azure.data.tables import UpdateMode
+        try:
+            cls.run_table_operation(table_name, lambda table_client: table_client.upsert_entity(entity=entity, mode=UpdateMode.REPLACE))
+        except Exception as e:
+            raise Exception(f"Error upserting entity into table {table_name}: {str(e)}")
+
+    @classmethod
+    def get_entity(cls, table_name: str, partition_key: str, row_key: str) -> Optional[dict]:
+        # None only when the entity does not exist; any other failure raises.
+        from azure.core.exceptions import ResourceNotFoundError
+        try:
+            return cls.run_table_operation(table_name, lambda table_client: table_client.get_entity(partition_key=partition_key, row_key=row_key))
+        except ResourceNotFoundError:
+            return None
+        except Exception as e:
+            raise Exception(f"Error reading entity from table {table_name}: {str(e)}")
+
+    @classmethod
+    def list_entities(cls, table_name: str, select: List[str] = None) -> List[dict]:
+        # Whole-table read, for small lookup tables loaded into memory.
+        try:
+            return cls.run_table_operation(table_name, lambda table_client: list(table_client.list_entities(select=select)))
+        except Exception as e:
+            raise Exception(f"Error listing entities from table {table_name}: {str(e)}")
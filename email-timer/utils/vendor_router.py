@@ -0,0 +1,120 @@
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from utils.storage_table_entities import VendorDomainEntity
+from utils.storage_table_util import StorageTableUtil
+
+
+@dataclass(frozen=True)
+class VendorRoute:
+    vendor: str
+    folder: str
+
+
+class VendorRouter:
+    # Process-wide index of sender domain -> vendor route, loaded in one read
+    # of the vendor table and rebuilt every VENDOR_ROUTING_TTL_SECONDS, so no
+    # storage call is made per message. A sender is matched by walking its
+    # domain from the full name up to its parents ("a.reports.redtiger.com",
+    # "reports.redtiger.com", "redtiger.com", ...); the most specific entry
+    # wins, and each step is one dict lookup regardless of how many domains
+    # are configured.
+    index: Dict[str, VendorRoute] = {}
+    expires_at: float = 0.0
+    lock = threading.Lock()
+
+    @staticmethod
+    def get_table_name() -> str:
+        return os.getenv("STORAGE_VENDOR_TABLE_NAME", "VendorDomains")
+
+    @staticmethod
+    def get_ttl_seconds() -> int:
+        return int(os.getenv("VENDOR_ROUTING_TTL_SECONDS", "300"))
+
+    @staticmethod
+    def get_default_folder() -> str:
+        # Where attachments from senders without a vendor go.
+        return os.getenv("VENDOR_DEFAULT_FOLDER", "Attachments")
+
+    @staticmethod
+    def normalize_domain(domain: str) -> str:
+        # "@RedTiger.com", "*.redtiger.com" and "redtiger.com." all become "redtiger.com".
+        domain = domain.strip().lower().lstrip("@")
+        if domain.startswith("*."):
+            domain = domain[2:]
+        return domain.strip(".")
+
+    @classmethod
+    def build_index(cls, entities) -> Dict[str, VendorRoute]:
+        index: Dict[str, VendorRoute] = {}
+        for entity in entities:
+            vendor_domain = VendorDomainEntity.from_dict(entity)
+            if not vendor_domain.isActive:
+                continue
+            domain = cls.normalize_domain(vendor_domain.RowKey)
+            if domain in index:
+                logging.warning(f"Domain {domain} is mapped to both {index[domain].vendor} and {vendor_domain.PartitionKey}, keeping the first.")
+                continue
+            folder = (vendor_domain.folder or f"{cls.get_default_folder()}/{vendor_domain.PartitionKey}").strip("/")
+            index[domain] = VendorRoute(vendor=vendor_domain.PartitionKey, folder=folder)
+        return index
+
+    @classmethod
+    def get_index(cls) -> Dict[str, VendorRoute]:
+        if time.time() < cls.expires_at:
+            return cls.index
+        with cls.lock:
+            if time.time() < cls.expires_at:
+                return cls.index
+            try:
+                cls.index = cls.build_index(StorageTableUtil.list_entities(cls.get_table_name(), select=["PartitionKey", "RowKey", "folder", "isActive"]))
+                logging.info(f"Loaded {len(cls.index)} vendor domains from table {cls.get_table_name()}.")
+            except Exception as e:
+                # Keep routing with the previous index; try again after the next TTL.
+                logging.warning(f"Could not refresh vendor domains, keeping {len(cls.index)} cached: {e}")
+            cls.expires_at = time.time() + cls.get_ttl_seconds()
+            return cls.index
+
+    @classmethod
+    def resolve(cls, sender: str) -> Optional[VendorRoute]:
+        # sender is an email address or a bare domain.
+        domain = cls.normalize_domain(sender.rpartition("@")[2])
+        index = cls.get_index()
+        while domain:
+            route = index.get(domain)
+            if route is not None:
+                return route
+            domain = domain.partition(".")[2]
+        return None
+
+    @classmethod
+    def get_domains(cls) -> List[str]:
+        return sorted(cls.get_index())
+
+    @classmethod
+    def get_folder(cls, sender: str) -> str:
+        route = cls.resolve(sender)
+        return route.folder if route is not None else cls.get_default_folder()
+
+    @classmethod
+    def invalidate(cls):
+        with cls.lock:
+            cls.expires_at = 0.0
+
+    @classmethod
+    def warm(cls):
+        # Load the index in the background so the first invocation does not pay for it.
+        if "AzureWebJobsStorage" not in os.environ:
+            return
+
+        def load_quietly():
+            try:
+                cls.get_index()
+            except Exception as e:
+                logging.warning(f"Could not warm vendor domains: {e}")
+
+        threading.Thread(target=load_quietly, name="vendor-router-warmup", daemon=True).start()
@@ -1,82 +1,325 @@
-from ast import List
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set, Tuple
 import azure.functions as func
 import logging
 import os
+import threading
+from utils.attachment_claims import AttachmentClaims
+from utils.attachment_content_index import AttachmentContentIndex
+from utils.attachment_pipeline import AttachmentPipeline, AttachmentResult
 from utils.email_dtos import FileAttachment, Message
 from utils.graph_api_util import GraphAPIUtil
+from utils.message_envelope import EnvelopeMessage, MessageEnvelope
+from utils.report_index import ReportIndex
+from utils.rate_limiter import GraphRateLimiter
+from utils.token_provider import TokenProvider
+from utils.vendor_router import VendorRoute, VendorRouter
 from utils.storage_table_util import StorageTableUtil
+from utils.table_batch_writer import TableBatchWriter
 from datetime import datetime
-from utils.storage_table_entities import EmailAttachmentEntity
+from utils.storage_table_entities import AttachmentContentEntity, EmailAttachmentEntity
 
 app = func.FunctionApp(http_auth_level=func.AuthLevel.ANONYMOUS)
+caches_warmed = threading.Event()
 
 @app.route(route="email_processer")
 def email_processer(req: func.HttpRequest) -> func.HttpResponse:
     logging.info('Python HTTP trigger function processed a request.')
+    warm_caches()
     #GraphAPIUtil.upload_attachment_to_one_drive(file_path="TEST.TXT", folder_path="Attachments")
 
     try:
-        email: Message = Message.from_dict(req.get_json())
-        process_email(email)
+        body = req.get_json()
+        if MessageEnvelope.is_envelope(body):
+            return process_envelope(MessageEnvelope.from_dict(body))
+        # Previous payload format: one full Graph message.
+        email = EnvelopeMessage.from_message(Message.from_dict(body))
+        results = process_email(email)
     except ValueError:
         return func.HttpResponse(
             "Invalid JSON in request body.",
             status_code=500
         )
-    logging.info(f"Python HTTP trigger function processed a request. Email: {email.subject}, From: {email.from_.emailAddress}")
+    logging.info(f"Python HTTP trigger function processed a request. Email: {email.subject}, From: {email.sender}")
+    logging.info(f"Token cache stats: {TokenProvider.get_stats()}, Graph rate limits: {GraphRateLimiter.get_stats()}")
 
-    #TODO: PROCESS EMAIL FUNCTION HERE 
+    failed = [r.name for r in results if r.status == "failed"]
+    if failed:
+        # Non-200 so the caller does not treat the email as done; processed attachments are skipped on retry.
+        return func.HttpResponse(
+            f"Failed to process attachments: {', '.join(failed)}",
+            status_code=500
+        )
     return func.HttpResponse(
             "This HTTP triggered function executed successfully. Pass a name in the query string or in the request body for a personalized response.",
             status_code=200
     )
 
-def process_email(email: Message):
+@app.queue_trigger(arg_name="msg", queue_name="email-processing", connection="AzureWebJobsStorage")
+def email_processer_queue(msg: func.QueueMessage) -> None:
+    # Envelopes enqueued by the timer. Raising leaves the message on the queue:
+    # it becomes visible again after the visibility timeout and moves to
+    # email-processing-poison after maxDequeueCount attempts (host.json).
+    logging.info(f"Queue message {msg.id} received, dequeue count {msg.dequeue_count}.")
+    warm_caches()
+    body = msg.get_json()
+    if MessageEnvelope.is_envelope(body):
+        envelope = MessageEnvelope.from_dict(body)
+    else:
+        envelope = MessageEnvelope(messages=[EnvelopeMessage.from_message(Message.from_dict(body))])
+    outcomes = process_envelope_messages(envelope)
+    failed = [o["id"] for o in outcomes if not o["success"]]
+    if failed:
+        # Attachments that did go through are skipped on the retry.
+        raise Exception(f"Failed to process emails {', '.join(failed)} from queue message {msg.id}.")
+
+def warm_caches():
+    # Started by the first invocation rather than at import, so loading the app makes no Graph or Table calls.
+    if caches_warmed.is_set():
+        return
+    caches_warmed.set()
+    VendorRouter.warm()
+
+def process_envelope(envelope: MessageEnvelope) -> func.HttpResponse:
+    # The response reports each email so the caller only retries the failed ones.
+    outcomes = process_envelope_messages(envelope)
+    succeeded = sum(1 for o in outcomes if o["success"])
+    return func.HttpResponse(
+        json.dumps({"messages": outcomes}),
+        status_code=200 if succeeded == len(outcomes) else 207,
+        mimetype="application/json"
+    )
+
+def process_envelope_messages(envelope: MessageEnvelope) -> List[dict]:
+    # Messages of one envelope are processed concurrently.
+    def process_one(email: EnvelopeMessage) -> dict:
+        try:
+            failed = [r.name for r in process_email(email) if r.status == "failed"]
+            return {"id": email.id, "success": not failed, "failed": failed}
+        except Exception as e:
+            logging.error(f"Error processing email {email.id}: {e}")
+            return {"id": email.id, "success": False, "error": str(e)}
+
+    max_workers = min(get_envelope_max_workers(), len(envelope.messages)) or 1
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="envelope") as executor:
+        outcomes = list(executor.map(process_one, envelope.messages))
+    succeeded = sum(1 for o in outcomes if o["success"])
+    logging.info(f"Processed envelope of {len(outcomes)} emails, {len(outcomes) - succeeded} failed.")
+    logging.info(f"Token cache stats: {TokenProvider.get_stats()}, Graph rate limits: {GraphRateLimiter.get_stats()}")
+    return outcomes
+
+def process_email(email: EnvelopeMessage) -> List[AttachmentResult]:
     # Example function to demonstrate processing the email
     logging.info(f"Processing email with subject: {email.subject}")
     # Add your email processing logic here
 
-    # 1. get attachments metadata
-    attachements: List[FileAttachment] = GraphAPIUtil.get_attachments_metadata(email.id)
+    # 1. get attachments metadata, unless the timer already sent it along
+    if email.attachments is not None:
+        attachements: List[FileAttachment] = email.attachments
+    else:
+        attachements: List[FileAttachment] = GraphAPIUtil.get_attachments_metadata(email.id)
+    processed_ids = get_processed_attachment_ids(email.id) if attachements else set()
+    if processed_ids:
+        # An index row whose write failed after its main row is re-created here; a no-op once checked.
+        ReportIndex.ensure_indexed(os.getenv("STORAGE_TABLE_NAME"), email.id, [a.id for a in attachements if a.id in processed_ids])
+    pending: List[FileAttachment] = []
     for attachment in attachements:
         logging.info(f"Attachment: {attachment.name}, Size: {attachment.size} bytes")
-        if check_attachment_processed(email.id, attachment.id):
+        if attachment.id in processed_ids:
             logging.info(f"Attachment {attachment.name} already processed, skipping.")
             continue
-    # 2. Download attachment
-        destination_path: str =  GraphAPIUtil.download_attachment(attachment=attachment)
+        pending.append(attachment)
+    pipeline = AttachmentPipeline()
+    writer = StorageTableUtil.get_batch_writer(os.getenv("STORAGE_TABLE_NAME"))
+    entities: Dict[str, EmailAttachmentEntity] = {}
+    claims: Dict[str, str] = {}
+    # Lease the attachments first so a concurrent processor of the same email never transfers one twice
+    by_id = {r.attachment_id: r for r in pipeline.run(pending, lambda attachment: claim_attachment(email, attachment, claims))}
+    claimed = [a for a in pending if a.id in claims]
+    if claimed:
+        # Another worker may have completed an attachment (and deleted its claim) after the processed-rows
+        # read above; one more keys-only read after claiming covers every attachment of the email.
+        try:
+            completed_ids = get_processed_attachment_ids(email.id)
+        except Exception:
+            # Nothing was transferred; release the claims so the retry need not wait for the leases.
+            for attachment_id, etag in claims.items():
+                AttachmentClaims.release(email.id, attachment_id, etag)
+            raise
+        for attachment in claimed:
+            if attachment.id in completed_ids:
+                logging.info(f"Attachment {attachment.name} was completed by another worker, skipping.")
+                by_id[attachment.id].status = "skipped"
+        claimed = [a for a in claimed if a.id not in completed_ids]
+    # Vendor and target folder come from the sender domain, resolved from the in-memory index
+    route = VendorRouter.resolve(email.sender) if claimed else None
+    for result in pipeline.run(claimed, lambda attachment: process_attachment(email, attachment, pipeline, writer, entities, route)):
+        by_id[result.attachment_id] = result
+    results = [by_id[a.id] for a in pending]
+    # 4. Write metadata of every uploaded attachment in one transaction per 100 rows, then its hourly report index.
+    # The index only follows a successful main write; if it fails, the retry skips the attachments
+    # as processed and ReportIndex.ensure_indexed re-creates the missing rows from the main rows.
+    write_errors = [r.error for r in writer.flush() if not r.success]
+    if not write_errors and entities:
+        write_errors = [r.error for r in ReportIndex.write(list(entities.values())) if not r.success]
+    if write_errors:
+        for result in results:
+            if result.status == "processed":
+                result.status = "failed"
+                result.error = f"Metadata write failed: {write_errors[0]}"
+    settle_claims(email, results, claims)
+    failed = [r for r in results if r.status == "failed"]
+    logging.info(
+        f"Email {email.id}: {len(results) - len(failed)} of {len(results)} attachments handled, "
+        f"{len(failed)} failed, slowest {max((r.elapsed_ms for r in results), default=0)}ms."
+    )
+    return results
+
+
+def claim_attachment(email: EnvelopeMessage, attachment: FileAttachment, claims: Dict[str, str]) -> bool:
+    # True when leased (its claim ETag is kept in claims), False when another worker already completed it.
+    claim = AttachmentClaims.claim(email.id, attachment.id)
+    if claim.state == "done":
+        logging.info(f"Attachment {attachment.name} was completed by another worker, skipping.")
+        return False
+    if claim.state == "held":
+        # Failing (rather than skipping) keeps the email retryable in case the other worker dies.
+        raise Exception(f"Attachment {attachment.name} is being processed by another worker.")
+    claims[attachment.id] = claim.etag
+    return True
+
+
+def process_attachment(email: EnvelopeMessage, attachment: FileAttachment, pipeline: AttachmentPipeline,
+                       writer: TableBatchWriter, entities: Dict[str, EmailAttachmentEntity],
+                       route: Optional[VendorRoute] = None) -> bool:
+    folder_path = route.folder if route is not None else VendorRouter.get_default_folder()
+    filepath = f"/{folder_path}/{attachment.name}"
+    content_hash = None
+    if AttachmentContentIndex.is_enabled():
+        # 2./3. Download and hash in one pass; content already in the folder is not uploaded again
+        content, item = transfer_deduplicated(email, attachment, pipeline, folder_path)
+        filepath, content_hash = content.filepath, content.PartitionKey
+    else:
+        item = transfer_attachment(email, attachment, pipeline, folder_path)
+    # Site and drive of the item the file actually went to, as Graph returned it.
+    site_id, drive_id = get_item_location(item)
+    # 4. Buffer metadata for Azure Table Storage; written by process_email once all attachments are done
+    attachment_entity = EmailAttachmentEntity(
+        PartitionKey=email.id,
+        RowKey=attachment.id,
+        email_subject=email.subject,
+        sender=email.sender,
+        receivedDateTime=email.receivedDateTime,
+        processDateTime=datetime.utcnow().isoformat(),
+        attachmentName=attachment.name,
+        extension=os.path.splitext(attachment.name)[1],
+        size=attachment.size,
+        siteId=site_id,
+        siteName=os.getenv("SHAREPOINT_SITE_NAME"),
+        driveId=drive_id,
+        filepath=filepath,
+        isReported=False,
+        reportDateTime=None,
+        contentHash=content_hash,
+        itemId=item.get("id"),
+        vendor=route.vendor if route is not None else None
+    )
+    writer.add(attachment_entity.__dict__, operation="upsert")
+    entities[attachment.id] = attachment_entity
+    return True
+
+
+def transfer_deduplicated(email: EnvelopeMessage, attachment: FileAttachment, pipeline: AttachmentPipeline,
+                          folder_path: str) -> Tuple[AttachmentContentEntity, Dict[str, Any]]:
+    # Returns the index entry and the drive item of the OneDrive file holding the content.
+    with pipeline.stage("download"):
+        spool = GraphAPIUtil.spool_attachment(attachment, message_id=email.id)
+    filepath = f"/{folder_path}/{attachment.name}"
+    with spool:
+        existing = AttachmentContentIndex.lookup(spool.sha256, spool.size)
+        if existing is not None and AttachmentContentIndex.is_reusable(existing, filepath):
+            # Same content at the same path; reused only if nothing has overwritten the file since.
+            current = GraphAPIUtil.get_one_drive_item(existing.itemId)
+            if AttachmentContentIndex.is_current(existing, current):
+                logging.info(f"Attachment {attachment.name} is already in {existing.filepath} with the same content, upload skipped.")
+                return existing, current
+        with pipeline.stage("upload"):
+            item = GraphAPIUtil.upload_spooled_attachment_to_one_drive(spool, attachment.name, folder_path=folder_path)
+        logging.info(f"Attachment {attachment.name} uploaded to OneDrive in {folder_path} folder.")
+        return AttachmentContentIndex.record(
+            spool.sha256, spool.size, filepath,
+            drive_id=get_item_location(item)[1],
+            item_id=item.get("id", ""),
+            item_etag=item.get("eTag", ""),
+            attachment_name=attachment.name,
+            email_id=email.id,
+            attachment_id=attachment.id,
+            # The entry follows the latest upload of the content, so a resend under this name finds it.
+            replace=existing is not None
+        ), item
+
+
+def transfer_attachment(email: EnvelopeMessage, attachment: FileAttachment, pipeline: AttachmentPipeline, folder_path: str) -> Dict[str, Any]:
+    # 2./3. Stream attachment straight into OneDrive, falling back to download-then-upload via /tmp.
+    # Returns the uploaded drive item.
+    item = None
+    if get_attachment_transfer_mode() == "stream":
+        try:
+            with pipeline.stage("download"), pipeline.stage("upload"):
+                item = GraphAPIUtil.stream_attachment_to_one_drive(attachment, folder_path=folder_path, message_id=email.id)
+        except Exception as e:
+            logging.warning(f"Streaming transfer of {attachment.name} failed, falling back to file transfer: {e}")
+    if item is None:
+        # 2. Download attachment
+        with pipeline.stage("download"):
+            destination_path: str = GraphAPIUtil.download_attachment(attachment=attachment, message_id=email.id)
         logging.info(f"Attachment {attachment.name} downloaded to {destination_path}")
-        
-    # 3. Save attachment to SharePoint
-        #GraphAPIUtil.upload_attachment_to_sharepoint(site_name=os.getenv("SHAREPOINT_SITE_NAME"), file_path=destination_path, folder_path="Shared Documents/General")
-        GraphAPIUtil.upload_attachment_to_one_drive(file_path=destination_path, folder_path="Attachments")
-        logging.info(f"Attachment {attachment.name} uploaded to OneDrive in Attachments folder.")
-    # 4. Log metadata to Azure Table Storage
-        entity = EmailAttachmentEntity(
-            PartitionKey=email.id,
-            RowKey=attachment.id,
-            email_subject=email.subject,
-            sender=email.from_.emailAddress.address,
-            receivedDateTime=email.receivedDateTime,
-            processDateTime=datetime.utcnow().isoformat(),
-            attachmentName=attachment.name,
-            extension=os.path.splitext(attachment.name)[1],
-            size=attachment.size,
-            #siteId=GraphAPIUtil.get_sharepoint_site_id(os.getenv("SHAREPOINT_SITE_NAME")),   # You can fill these fields as needed
-            siteId="test",
-            siteName=os.getenv("SHAREPOINT_SITE_NAME"),
-            #driveId=GraphAPIUtil.get_sharepoint_drive_id(GraphAPIUtil.get_sharepoint_site_id(os.getenv("SHAREPOINT_SITE_NAME"))),
-            driveId="test",
-            filepath=f"/Attachments/{attachment.name}",
-            isReported=False,
-            reportDateTime=None
-        ).__dict__
-        StorageTableUtil.insert_entity(table_name=os.getenv("STORAGE_TABLE_NAME"), entity=entity)
-
-
-
-def check_attachment_processed(email_id: str, attachment_id: str) -> bool:
-
-    entity = StorageTableUtil.get_entity(table_name=os.getenv("STORAGE_TABLE_NAME"), partition_key=email_id, row_key=attachment_id)
-   
-    return entity is not None
+        try:
+        # 3. Save attachment to SharePoint
+            #GraphAPIUtil.upload_attachment_to_sharepoint(site_name=os.getenv("SHAREPOINT_SITE_NAME"), file_path=destination_path, folder_path="Shared Documents/General")
+            with pipeline.stage("upload"):
+                item = GraphAPIUtil.upload_attachment_to_one_drive(file_path=destination_path, folder_path=folder_path)
+        finally:
+            GraphAPIUtil.remove_downloaded_attachment(destination_path)
+    logging.info(f"Attachment {attachment.name} uploaded to OneDrive in {folder_path} folder.")
+    return item
+
+
+def settle_claims(email: EnvelopeMessage, results: List[AttachmentResult], claims: Dict[str, str]):
+    # Claims are deleted either way: for processed attachments the metadata row now
+    # records the work, the rest are released so a retry need not wait for the lease.
+    for result in results:
+        if result.attachment_id not in claims:
+            continue
+        etag = claims[result.attachment_id]
+        try:
+            if result.status == "processed":
+                AttachmentClaims.complete(email.id, result.attachment_id, etag)
+            else:
+                AttachmentClaims.release(email.id, result.attachment_id, etag)
+        except Exception as e:
+            # An unsettled claim only delays a retry until its lease expires.
+            logging.warning(f"Could not settle claim on attachment {result.name}: {e}")
+
+
+def get_item_location(item: Dict[str, Any]) -> Tuple[str, str]:
+    # (siteId, driveId) of an uploaded drive item; siteId is empty for a personal OneDrive.
+    parent = (item or {}).get("parentReference") or {}
+    return parent.get("siteId", ""), parent.get("driveId", "")
+
+
+def get_attachment_transfer_mode() -> str:
+    # "stream" pipes the download into the upload without a temp file, "file" always goes through /tmp
+    return os.getenv("ATTACHMENT_TRANSFER_MODE", "stream").lower()
+
+
+def get_envelope_max_workers() -> int:
+    # Emails of one envelope processed at the same time; each has its own attachment pipeline.
+    return int(os.getenv("ENVELOPE_MAX_WORKERS", "4"))
+
+
+def get_processed_attachment_ids(email_id: str) -> Set[str]:
+    # Single partition query for every attachment of the email, keys only.
+    processed = StorageTableUtil.get_processed_row_keys(table_name=os.getenv("STORAGE_TABLE_NAME"), partition_keys=[email_id])
+    return processed.get(email_id, set())
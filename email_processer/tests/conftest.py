@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The Functions host runs each app from its own folder, so utils is imported as a top-level package.
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
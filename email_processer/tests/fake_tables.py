@@ -0,0 +1,66 @@
+import itertools
+from typing import Dict, List, Optional, Set, Tuple
+
+
+class FakeEntity(dict):
+    # Stands in for azure.data.tables.TableEntity: a dict with metadata["etag"].
+    def __init__(self, values: dict, etag: str):
+        super().__init__(values)
+        self.metadata = {"etag": etag}
+
+
+class FakeTables:
+    # In-memory replacement for the StorageTableUtil point operations, with ETags.
+    def __init__(self):
+        self.tables: Dict[str, Dict[Tuple[str, str], Tuple[dict, str]]] = {}
+        self.etags = itertools.count(1)
+
+    def install(self, monkeypatch, storage_table_util):
+        for name in ("create_entity_if_absent", "get_entity", "update_entity_if_match", "delete_entity", "upsert_entity",
+                     "get_partition_entities", "get_row_keys_with_prefix"):
+            monkeypatch.setattr(storage_table_util, name, getattr(self, name))
+        return self
+
+    def rows(self, table_name: str) -> Dict[Tuple[str, str], Tuple[dict, str]]:
+        return self.tables.setdefault(table_name, {})
+
+    def next_etag(self) -> str:
+        return f"W/\"{next(self.etags)}\""
+
+    def create_entity_if_absent(self, table_name: str, entity: dict) -> Optional[str]:
+        key = (entity["PartitionKey"], entity["RowKey"])
+        if key in self.rows(table_name):
+            return None
+        self.rows(table_name)[key] = (dict(entity), self.next_etag())
+        return self.rows(table_name)[key][1]
+
+    def get_entity(self, table_name: str, partition_key: str, row_key: str) -> Optional[FakeEntity]:
+        row = self.rows(table_name).get((partition_key, row_key))
+        return FakeEntity(*row) if row is not None else None
+
+    def update_entity_if_match(self, table_name: str, entity: dict, etag: str) -> Optional[str]:
+        key = (entity["PartitionKey"], entity["RowKey"])
+        row = self.rows(table_name).get(key)
+        if row is None or row[1] != etag:
+            return None
+        self.rows(table_name)[key] = (dict(entity), self.next_etag())
+        return self.rows(table_name)[key][1]
+
+    def delete_entity(self, table_name: str, partition_key: str, row_key: str, etag: str = None) -> bool:
+        row = self.rows(table_name).get((partition_key, row_key))
+        if row is None or (etag is not None and row[1] != etag):
+            return False
+        del self.rows(table_name)[(partition_key, row_key)]
+        return True
+
+    def upsert_entity(self, table_name: str, entity: dict):
+        self.rows(table_name)[(entity["PartitionKey"], entity["RowKey"])] = (dict(entity), self.next_etag())
+
+    def get_partition_entities(self, table_name: str, partition_key: str, select: List[str] = None) -> List[dict]:
+        return [
+            {k: v for k, v in row.items() if select is None or k in select}
+            for (pk, _), (row, _) in self.rows(table_name).items() if pk == partition_key
+        ]
+
+    def get_row_keys_with_prefix(self, table_name: str, partition_key: str, prefix: str) -> Set[str]:
+        return {rk for pk, rk in self.rows(table_name) if pk == partition_key and rk.startswith(prefix)}
@@ -0,0 +1,80 @@
+from dataclasses import asdict
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from fake_tables import FakeTables
+from utils.attachment_claims import AttachmentClaims
+from utils.storage_table_util import StorageTableUtil
+
+TABLE = "AttachmentClaims"
+
+
+@pytest.fixture
+def tables(monkeypatch):
+    monkeypatch.delenv("STORAGE_CLAIM_TABLE_NAME", raising=False)
+    return FakeTables().install(monkeypatch, StorageTableUtil)
+
+
+def expire(tables: FakeTables, email_id: str, attachment_id: str):
+    row, etag = tables.rows(TABLE)[(email_id, attachment_id)]
+    row["leaseExpiresAt"] = (datetime.now(timezone.utc) - timedelta(seconds=1)).isoformat()
+    tables.rows(TABLE)[(email_id, attachment_id)] = (row, etag)
+
+
+def test_insert_race_has_one_winner(tables):
+    first = AttachmentClaims.claim("e1", "a1")
+    second = AttachmentClaims.claim("e1", "a1")
+    assert first.state == "acquired" and first.owner
+    assert second.state == "held" and second.owner is None
+    claim = tables.get_entity(TABLE, "e1", "a1")
+    assert claim["owner"] == first.owner and claim.metadata["etag"] == first.etag
+
+
+def test_expired_lease_is_taken_over_once(tables):
+    crashed = AttachmentClaims.claim("e1", "a1")
+    expire(tables, "e1", "a1")
+    stale = tables.get_entity(TABLE, "e1", "a1")
+
+    taken = AttachmentClaims.claim("e1", "a1")
+    assert taken.state == "acquired" and taken.owner != crashed.owner
+    assert tables.get_entity(TABLE, "e1", "a1").metadata["etag"] == taken.etag
+
+    # A second worker that read the same expired claim loses on the ETag.
+    replacement = AttachmentClaims.new_claim("e1", "a1", "late")
+    assert not StorageTableUtil.update_entity_if_match(TABLE, asdict(replacement), stale.metadata["etag"])
+    assert AttachmentClaims.claim("e1", "a1").state == "held"
+
+
+def test_release_lets_the_next_worker_claim(tables):
+    first = AttachmentClaims.claim("e1", "a1")
+    AttachmentClaims.release("e1", "a1", first.etag)
+    assert tables.get_entity(TABLE, "e1", "a1") is None
+    assert AttachmentClaims.claim("e1", "a1").state == "acquired"
+
+
+def test_release_with_a_stale_etag_keeps_the_claim(tables):
+    first = AttachmentClaims.claim("e1", "a1")
+    AttachmentClaims.release("e1", "a1", "W/\"stale\"")
+    assert tables.get_entity(TABLE, "e1", "a1")["owner"] == first.owner
+
+
+def test_complete_deletes_the_claim(tables):
+    first = AttachmentClaims.claim("e1", "a1")
+    AttachmentClaims.complete("e1", "a1", first.etag)
+    assert tables.rows(TABLE) == {}
+
+
+def test_complete_after_the_claim_was_lost_leaves_the_new_owner_alone(tables):
+    slow = AttachmentClaims.claim("e1", "a1")
+    expire(tables, "e1", "a1")
+    taken = AttachmentClaims.claim("e1", "a1")
+    AttachmentClaims.complete("e1", "a1", slow.etag)
+    assert tables.get_entity(TABLE, "e1", "a1")["owner"] == taken.owner
+
+
+def test_done_claim_is_reported_as_done(tables):
+    claim = AttachmentClaims.new_claim("e1", "a1", "old-worker")
+    claim.status = "done"
+    tables.create_entity_if_absent(TABLE, asdict(claim))
+    assert AttachmentClaims.claim("e1", "a1").state == "done"
@@ -0,0 +1,62 @@
+import pytest
+
+from fake_tables import FakeTables
+from utils.attachment_content_index import AttachmentContentIndex
+from utils.storage_table_util import StorageTableUtil
+
+SHA = "ab" * 32
+
+
+@pytest.fixture
+def tables(monkeypatch):
+    monkeypatch.setattr(AttachmentContentIndex, "cache", {})
+    return FakeTables().install(monkeypatch, StorageTableUtil)
+
+
+def record(name: str, folder: str = "Attachments", etag: str = "\"{1},1\"", replace: bool = False):
+    return AttachmentContentIndex.record(
+        SHA, 10, f"/{folder}/{name}", drive_id="drive", item_id="item", item_etag=etag,
+        attachment_name=name, email_id="e1", attachment_id="a1", replace=replace
+    )
+
+
+def test_dedup_is_opt_in(monkeypatch):
+    monkeypatch.delenv("ATTACHMENT_CONTENT_DEDUP", raising=False)
+    assert not AttachmentContentIndex.is_enabled()
+
+
+def test_recorded_content_keeps_its_name_and_is_reusable_only_at_its_path(tables):
+    entry = record("report.xlsx")
+    assert entry.filepath == "/Attachments/report.xlsx"
+    assert AttachmentContentIndex.lookup(SHA, 10) == entry
+    assert AttachmentContentIndex.is_reusable(entry, "/Attachments/report.xlsx")
+    assert not AttachmentContentIndex.is_reusable(entry, "/Attachments/RedTiger/report.xlsx")
+    assert not AttachmentContentIndex.is_reusable(entry, "/Attachments/copy.xlsx")
+
+
+def test_entry_is_current_only_while_the_item_keeps_its_etag(tables):
+    entry = record("report.xlsx")
+    assert AttachmentContentIndex.is_current(entry, {"id": "item", "eTag": "\"{1},1\""})
+    # Overwritten by a later attachment with the same name, or deleted.
+    assert not AttachmentContentIndex.is_current(entry, {"id": "item", "eTag": "\"{1},2\""})
+    assert not AttachmentContentIndex.is_current(entry, None)
+
+
+def test_entry_without_item_etag_is_not_reused(tables):
+    # Written before the eTag was recorded; there is no way to tell whether the file changed.
+    tables.upsert_entity(AttachmentContentIndex.get_table_name(), {
+        "PartitionKey": SHA, "RowKey": "10", "filepath": "/Attachments/report.xlsx", "driveId": "", "itemId": "item",
+        "attachmentName": "report.xlsx", "emailId": "e0", "attachmentId": "a0", "uploadedDateTime": ""
+    })
+    legacy = AttachmentContentIndex.lookup(SHA, 10)
+    assert not AttachmentContentIndex.is_reusable(legacy, "/Attachments/report.xlsx")
+
+
+def test_first_writer_wins_unless_replacing(tables):
+    first = record("report.xlsx")
+    record("copy.xlsx")
+    assert tables.get_entity(AttachmentContentIndex.get_table_name(), SHA, "10")["filepath"] == first.filepath
+
+    entry = record("report.xlsx", etag="\"{1},2\"", replace=True)
+    assert AttachmentContentIndex.lookup(SHA, 10) == entry
+    assert tables.get_entity(AttachmentContentIndex.get_table_name(), SHA, "10")["itemETag"] == "\"{1},2\""
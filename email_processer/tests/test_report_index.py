@@ -0,0 +1,61 @@
+from dataclasses import asdict
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from fake_tables import FakeTables
+from utils.report_index import ReportIndex
+from utils.storage_table_entities import EmailAttachmentEntity, EmailAttachmentIndexEntity
+from utils.storage_table_util import StorageTableUtil
+
+MAIN = "Attachments"
+INDEX = "AttachmentsByHour"
+
+
+@pytest.fixture
+def tables(monkeypatch):
+    monkeypatch.delenv("STORAGE_INDEX_TABLE_NAME", raising=False)
+    monkeypatch.setattr(ReportIndex, "indexed", set())
+    return FakeTables().install(monkeypatch, StorageTableUtil)
+
+
+def add_main_row(tables: FakeTables, attachment_id: str, hours_ago: float = 1, reported: bool = False) -> EmailAttachmentEntity:
+    entity = EmailAttachmentEntity(
+        PartitionKey="e1", RowKey=attachment_id, email_subject="Invoice", sender="billing@redtiger.com",
+        receivedDateTime="", processDateTime=(datetime.now(timezone.utc) - timedelta(hours=hours_ago)).isoformat(),
+        attachmentName=f"{attachment_id}.pdf", extension=".pdf", size=10, siteId="", siteName="", driveId="",
+        filepath=f"/Attachments/{attachment_id}.pdf", isReported=reported, reportDateTime=None
+    )
+    tables.upsert_entity(MAIN, asdict(entity))
+    return entity
+
+
+def index_row(entity: EmailAttachmentEntity) -> dict:
+    return asdict(EmailAttachmentIndexEntity.from_attachment_entity(entity))
+
+
+def test_missing_index_row_is_created_once(tables):
+    entity = add_main_row(tables, "a1")
+    assert ReportIndex.ensure_indexed(MAIN, "e1", ["a1"]) == 1
+    row = index_row(entity)
+    assert tables.get_entity(INDEX, row["PartitionKey"], row["RowKey"])["isReported"] is False
+
+    # Checked attachments are remembered, so a re-dispatch reads nothing.
+    tables.tables.pop(MAIN)
+    assert ReportIndex.ensure_indexed(MAIN, "e1", ["a1"]) == 0
+
+
+def test_existing_index_row_is_never_rewritten(tables):
+    entity = add_main_row(tables, "a1")
+    row = index_row(entity)
+    row["isReported"] = True
+    tables.upsert_entity(INDEX, row)
+    assert ReportIndex.ensure_indexed(MAIN, "e1", ["a1"]) == 0
+    assert tables.get_entity(INDEX, row["PartitionKey"], row["RowKey"])["isReported"] is True
+
+
+def test_reported_and_old_rows_are_not_indexed(tables):
+    add_main_row(tables, "a1", reported=True)
+    add_main_row(tables, "a2", hours_ago=30)
+    assert ReportIndex.ensure_indexed(MAIN, "e1", ["a1", "a2"]) == 0
+    assert tables.rows(INDEX) == {}
@@ -0,0 +1,57 @@
+import pytest
+
+from utils.graph_api_util import GraphAPIUtil
+from utils.sharepoint_resolver import SharePointResolver
+
+
+class FakeGraph:
+    def __init__(self):
+        self.site_calls = 0
+        self.fail = True
+
+    def get_sharepoint_site_id(self, site_name: str):
+        self.site_calls += 1
+        if self.fail:
+            raise Exception(f"Site {site_name} not found")
+        return f"site-{site_name}"
+
+    def get_sharepoint_drive_id(self, site_id: str):
+        return f"drive-{site_id}"
+
+
+@pytest.fixture
+def graph(monkeypatch):
+    fake = FakeGraph()
+    monkeypatch.setattr(SharePointResolver, "cache", {})
+    monkeypatch.setattr(SharePointResolver, "failures", {})
+    monkeypatch.setattr(GraphAPIUtil, "get_hostname", staticmethod(lambda: "contoso.sharepoint.com"))
+    monkeypatch.setattr(GraphAPIUtil, "get_sharepoint_site_id", staticmethod(fake.get_sharepoint_site_id))
+    monkeypatch.setattr(GraphAPIUtil, "get_sharepoint_drive_id", staticmethod(fake.get_sharepoint_drive_id))
+    return fake
+
+
+def test_failure_is_cached_until_negative_ttl_expires(graph, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("utils.sharepoint_resolver.time.time", lambda: now[0])
+    monkeypatch.setenv("SHAREPOINT_ID_NEGATIVE_TTL_SECONDS", "60")
+
+    with pytest.raises(Exception, match="not found"):
+        SharePointResolver.resolve("Invoices")
+    with pytest.raises(Exception, match="could not be resolved recently"):
+        SharePointResolver.resolve("Invoices")
+    assert graph.site_calls == 1
+
+    graph.fail = False
+    now[0] += 61
+    assert SharePointResolver.resolve("Invoices") == ("site-Invoices", "drive-site-Invoices")
+    assert graph.site_calls == 2
+    assert SharePointResolver.failures == {}
+
+
+def test_invalidate_drops_cached_failure(graph):
+    with pytest.raises(Exception):
+        SharePointResolver.resolve("Invoices")
+    graph.fail = False
+    SharePointResolver.invalidate("Invoices")
+    assert SharePointResolver.resolve("Invoices") == ("site-Invoices", "drive-site-Invoices")
+    assert graph.site_calls == 2
@@ -0,0 +1,50 @@
+import sys
+import threading
+import types
+
+import pytest
+
+from utils.token_provider import TokenProvider
+
+
+class FakeConfidentialClientApplication:
+    def __init__(self, client_id, client_credential, authority):
+        self.calls = 0
+
+    def acquire_token_for_client(self, scopes):
+        self.calls += 1
+        return {"access_token": f"token-{self.calls}", "expires_in": 3599}
+
+
+@pytest.fixture
+def cold_provider(monkeypatch):
+    monkeypatch.setitem(sys.modules, "msal", types.SimpleNamespace(ConfidentialClientApplication=FakeConfidentialClientApplication))
+    monkeypatch.delenv("TOKEN", raising=False)
+    monkeypatch.setattr(TokenProvider, "msal_app", None)
+    monkeypatch.setattr(TokenProvider, "access_token", None)
+    monkeypatch.setattr(TokenProvider, "expires_at", 0.0)
+    monkeypatch.setattr(TokenProvider, "stats", dict.fromkeys(TokenProvider.stats, 0))
+    return TokenProvider
+
+
+def test_get_token_from_cold_state_does_not_deadlock(cold_provider):
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(token=cold_provider.get_token()), daemon=True)
+    thread.start()
+    thread.join(timeout=3)
+    assert not thread.is_alive(), "get_token() blocked on a cold start"
+    assert result["token"] == "token-1"
+    assert cold_provider.get_stats()["refreshes"] == 1
+
+
+def test_concurrent_cold_callers_share_one_refresh(cold_provider):
+    tokens = []
+    threads = [threading.Thread(target=lambda: tokens.append(cold_provider.get_token()), daemon=True) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=3)
+    assert tokens == ["token-1"] * 8
+    stats = cold_provider.get_stats()
+    assert stats["refreshes"] == 1
+    assert stats["misses"] + stats["hits"] == 8
@@ -0,0 +1,85 @@
+import logging
+import os
+import uuid
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from utils.storage_table_entities import AttachmentClaimEntity
+from utils.storage_table_util import StorageTableUtil
+
+
+@dataclass
+class ClaimOutcome:
+    state: str                  # "acquired", "held" (leased by another worker) or "done"
+    owner: Optional[str] = None # lease token when acquired
+    etag: Optional[str] = None  # ETag of our claim row when acquired; complete() and release() delete with it
+
+
+class AttachmentClaims:
+    # Atomic per-attachment claims in a table keyed by (email id, attachment id).
+    # A claim is a conditional insert; an existing claim whose lease has
+    # expired is taken over with an ETag-conditional replace, so exactly one
+    # worker wins even when several race for the same crashed claim. Claims
+    # are deleted once the attachment's metadata row exists, so the table
+    # only holds attachments in flight. The ETag returned by the insert or
+    # takeover is kept, so settling a claim is a single conditional delete.
+
+    @staticmethod
+    def get_table_name() -> str:
+        return os.getenv("STORAGE_CLAIM_TABLE_NAME", "AttachmentClaims")
+
+    @staticmethod
+    def get_lease_seconds() -> int:
+        # Should comfortably exceed the time to transfer the largest attachment.
+        return int(os.getenv("ATTACHMENT_LEASE_SECONDS", "900"))
+
+    @classmethod
+    def new_claim(cls, email_id: str, attachment_id: str, owner: str) -> AttachmentClaimEntity:
+        now = datetime.now(timezone.utc)
+        return AttachmentClaimEntity(
+            PartitionKey=email_id,
+            RowKey=attachment_id,
+            owner=owner,
+            status="leased",
+            leaseExpiresAt=(now + timedelta(seconds=cls.get_lease_seconds())).isoformat(),
+            claimedDateTime=now.isoformat()
+        )
+
+    @classmethod
+    def claim(cls, email_id: str, attachment_id: str) -> ClaimOutcome:
+        # A claim deleted by complete() is indistinguishable from one never taken,
+        # so the caller re-checks the processed rows after acquiring.
+        owner = str(uuid.uuid4())
+        table_name = cls.get_table_name()
+        etag = StorageTableUtil.create_entity_if_absent(table_name, asdict(cls.new_claim(email_id, attachment_id, owner)))
+        if etag is not None:
+            return ClaimOutcome("acquired", owner, etag)
+        existing = StorageTableUtil.get_entity(table_name, email_id, attachment_id)
+        if existing is None:
+            # Released between our insert and read; try once more.
+            etag = StorageTableUtil.create_entity_if_absent(table_name, asdict(cls.new_claim(email_id, attachment_id, owner)))
+            return ClaimOutcome("acquired", owner, etag) if etag is not None else ClaimOutcome("held")
+        current = AttachmentClaimEntity.from_dict(existing)
+        if current.status == "done":
+            return ClaimOutcome("done")
+        if not current.is_expired(datetime.now(timezone.utc)):
+            return ClaimOutcome("held")
+        # Take over the expired lease only if nobody else changed it since we read it.
+        etag = StorageTableUtil.update_entity_if_match(table_name, asdict(cls.new_claim(email_id, attachment_id, owner)), existing.metadata["etag"])
+        if etag is not None:
+            logging.warning(f"Took over expired claim on attachment {attachment_id} of email {email_id} from {current.owner}.")
+            return ClaimOutcome("acquired", owner, etag)
+        return ClaimOutcome("held")
+
+    @classmethod
+    def complete(cls, email_id: str, attachment_id: str, etag: str):
+        # Called once the metadata row is written, which from then on marks the attachment as processed.
+        if not StorageTableUtil.delete_entity(cls.get_table_name(), email_id, attachment_id, etag=etag):
+            logging.warning(f"Claim on attachment {attachment_id} of email {email_id} was lost before completion.")
+
+    @classmethod
+    def release(cls, email_id: str, attachment_id: str, etag: str):
+        # Drops our claim after a failure so a retry can claim it straight away. The ETag
+        # condition leaves a claim that another worker took over since alone.
+        StorageTableUtil.delete_entity(cls.get_table_name(), email_id, attachment_id, etag=etag)
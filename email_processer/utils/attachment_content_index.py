@@ -0,0 +1,81 @@
+import logging
+import os
+import threading
+from dataclasses import asdict
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+
+from utils.storage_table_entities import AttachmentContentEntity
+from utils.storage_table_util import StorageTableUtil
+
+
+class AttachmentContentIndex:
+    # Content-addressed index of uploaded attachments, keyed by (SHA-256, size).
+    # Files keep their attachment names, so a later attachment with the same
+    # name can overwrite an indexed file. An entry therefore records the drive
+    # item's id and eTag, and is only reused while the item still has that
+    # eTag (is_current). Entries are kept in a per-worker cache, so repeated
+    # resends in one run cost no table read.
+    cache: Dict[Tuple[str, int], AttachmentContentEntity] = {}
+    lock = threading.Lock()
+
+    @staticmethod
+    def get_table_name() -> str:
+        return os.getenv("STORAGE_CONTENT_TABLE_NAME", "AttachmentContents")
+
+    @staticmethod
+    def is_enabled() -> bool:
+        # Off by default: dedup downloads each attachment in full (in memory, or in /tmp above
+        # ATTACHMENT_SPOOL_MAX_MEMORY_BYTES) to hash it before the upload, instead of streaming it.
+        return os.getenv("ATTACHMENT_CONTENT_DEDUP", "false").lower() == "true"
+
+    @staticmethod
+    def is_reusable(entry: AttachmentContentEntity, filepath: str) -> bool:
+        # Only the file the attachment would be uploaded to, so every vendor folder keeps every file name.
+        return entry.filepath == filepath and bool(entry.itemId) and bool(entry.itemETag)
+
+    @staticmethod
+    def is_current(entry: AttachmentContentEntity, item: Optional[Dict[str, Any]]) -> bool:
+        # item is the drive item as it is now (None if deleted); any overwrite changes its eTag.
+        return item is not None and item.get("id") == entry.itemId and item.get("eTag") == entry.itemETag
+
+    @classmethod
+    def lookup(cls, sha256: str, size: int) -> Optional[AttachmentContentEntity]:
+        key = (sha256, size)
+        entry = cls.cache.get(key)
+        if entry is not None:
+            return entry
+        existing = StorageTableUtil.get_entity(cls.get_table_name(), sha256, str(size))
+        if existing is None:
+            return None
+        entry = AttachmentContentEntity.from_dict(existing)
+        with cls.lock:
+            cls.cache[key] = entry
+        return entry
+
+    @classmethod
+    def record(cls, sha256: str, size: int, filepath: str, drive_id: str, item_id: str, item_etag: str,
+               attachment_name: str, email_id: str, attachment_id: str, replace: bool = False) -> AttachmentContentEntity:
+        # First writer wins; a concurrent upload of the same content keeps its own
+        # file but the index keeps pointing at the first one. replace overwrites an
+        # entry that could not be reused (another path, or its file changed since).
+        entry = AttachmentContentEntity(
+            PartitionKey=sha256,
+            RowKey=str(size),
+            filepath=filepath,
+            driveId=drive_id,
+            itemId=item_id,
+            attachmentName=attachment_name,
+            emailId=email_id,
+            attachmentId=attachment_id,
+            uploadedDateTime=datetime.now(timezone.utc).isoformat(),
+            itemETag=item_etag
+        )
+        if replace:
+            StorageTableUtil.upsert_entity(cls.get_table_name(), asdict(entry))
+        elif StorageTableUtil.create_entity_if_absent(cls.get_table_name(), asdict(entry)) is None:
+            logging.info(f"Content {sha256} ({size} bytes) was indexed by another upload first.")
+            return entry
+        with cls.lock:
+            cls.cache[(sha256, size)] = entry
+        return entry
@@ -0,0 +1,70 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from utils.email_dtos import FileAttachment
+
+
+@dataclass
+class AttachmentResult:
+    attachment_id: str
+    name: str
+    status: str                 # "processed", "skipped" or "failed"
+    elapsed_ms: float = 0.0
+    error: Optional[str] = None
+
+
+class AttachmentPipeline:
+    # Runs one task per attachment on a bounded thread pool. Tasks wrap each
+    # network stage in stage(name), which caps how many attachments can be in
+    # that stage at once, so the download of one attachment overlaps the
+    # upload of another. A failing attachment never aborts the others.
+    def __init__(self, max_workers: int = None, stage_limits: Dict[str, int] = None):
+        self.max_workers = max_workers or int(os.getenv("ATTACHMENT_MAX_WORKERS", "4"))
+        if stage_limits is None:
+            stage_limits = {
+                "download": int(os.getenv("ATTACHMENT_MAX_DOWNLOADS", str(self.max_workers))),
+                "upload": int(os.getenv("ATTACHMENT_MAX_UPLOADS", str(self.max_workers)))
+            }
+        self.stage_slots = {name: threading.BoundedSemaphore(limit) for name, limit in stage_limits.items()}
+
+    @contextmanager
+    def stage(self, name: str):
+        slots = self.stage_slots.get(name)
+        if slots is None:
+            yield
+            return
+        with slots:
+            yield
+
+    def run_one(self, attachment: FileAttachment, process: Callable[[FileAttachment], bool]) -> AttachmentResult:
+        start = time.perf_counter()
+        try:
+            processed = process(attachment)
+            status = "processed" if processed else "skipped"
+            error = None
+        except Exception as e:
+            logging.error(f"Failed to process attachment {attachment.name}: {e}")
+            status = "failed"
+            error = str(e)
+        return AttachmentResult(
+            attachment_id=attachment.id,
+            name=attachment.name,
+            status=status,
+            elapsed_ms=round((time.perf_counter() - start) * 1000, 1),
+            error=error
+        )
+
+    def run(self, attachments: List[FileAttachment], process: Callable[[FileAttachment], bool]) -> List[AttachmentResult]:
+        # process returns True when the attachment was handled and False when it was skipped.
+        if not attachments:
+            return []
+        if len(attachments) == 1 or self.max_workers == 1:
+            return [self.run_one(attachment, process) for attachment in attachments]
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(attachments)), thread_name_prefix="attachment") as executor:
+            return list(executor.map(lambda attachment: self.run_one(attachment, process), attachments))
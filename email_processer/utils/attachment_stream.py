@@ -0,0 +1,86 @@
+import hashlib
+import tempfile
+from typing import Iterable, Iterator, Optional
+
+
+class AttachmentStream:
+    # Attachment content as an iterator of byte chunks, either from a
+    # streamed Graph response or from decoded contentBytes. size is the exact
+    # byte count when known (Content-Length or decoded length), otherwise None.
+    def __init__(self, chunks: Iterable[bytes], size: Optional[int], response=None):
+        self.chunks: Iterator[bytes] = iter(chunks)
+        self.size = size
+        self.response = response
+
+    def read_all(self) -> bytes:
+        return b"".join(self.chunks)
+
+    def close(self):
+        if self.response is not None:
+            self.response.close()
+            self.response = None
+
+    def __enter__(self) -> "AttachmentStream":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class SpooledAttachment:
+    # Attachment content drained from a download stream into memory, rolling
+    # over to a temp file above max_memory bytes. The SHA-256 and exact size
+    # are computed on the way in, so the content can be looked up by hash
+    # before deciding whether to upload it at all.
+    def __init__(self, chunks: Iterable[bytes], max_memory: int):
+        self.file = tempfile.SpooledTemporaryFile(max_size=max_memory)
+        digest = hashlib.sha256()
+        size = 0
+        for chunk in chunks:
+            digest.update(chunk)
+            self.file.write(chunk)
+            size += len(chunk)
+        self.sha256 = digest.hexdigest()
+        self.size = size
+
+    def open_stream(self, chunk_size: int = 64 * 1024) -> AttachmentStream:
+        self.file.seek(0)
+        return AttachmentStream(iter(lambda: self.file.read(chunk_size), b""), self.size)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self) -> "SpooledAttachment":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class StreamWindow:
+    # Serves read(offset, length) over a forward-only chunk iterator while
+    # buffering at most one upload chunk. Offsets may move forward or stay
+    # inside the buffered window (an upload session resuming within the
+    # chunk that failed), but never before it.
+    def __init__(self, chunks: Iterator[bytes]):
+        self.chunks = chunks
+        self.start = 0
+        self.buffer = bytearray()
+        self.eof = False
+
+    def fill(self, length: int):
+        while len(self.buffer) < length and not self.eof:
+            try:
+                self.buffer.extend(next(self.chunks))
+            except StopIteration:
+                self.eof = True
+
+    def read(self, offset: int, length: int) -> bytes:
+        if offset < self.start:
+            raise Exception(f"Cannot rewind streamed attachment to byte {offset}, window starts at {self.start}.")
+        skip = offset - self.start
+        self.fill(skip)
+        del self.buffer[:skip]
+        self.start = offset
+        self.fill(length)
+        return bytes(self.buffer[:length])
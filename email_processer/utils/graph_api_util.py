@@ -1,11 +1,16 @@
 import base64
 import os
-from typing import List
-import msal
-import requests
+import tempfile
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote
 import logging
 
-from utils.email_dtos import FileAttachment, MessageResponse
+from utils.attachment_stream import AttachmentStream, SpooledAttachment
+from utils.graph_batch import GraphBatchClient, GraphBatchRequest
+from utils.http_session import GraphRequestError, HttpSession
+from utils.large_file_uploader import LargeFileUploader
+from utils.token_provider import TokenProvider
+from utils.email_dtos import FileAttachment, Message, MessageResponse
 class GraphAPIUtil:
     @staticmethod
     def get_graph_api_url():
@@ -21,10 +26,10 @@ class GraphAPIUtil:
 
     @staticmethod
     def get_sharepoint_site_id(site_name: str):
-        response = requests.get(
-            f"{GraphAPIUtil.get_graph_api_url()}/{GraphAPIUtil.get_hostname()}:/sites/{site_name}",
+        response = HttpSession.graph_request(
+            "GET",
+            f"{GraphAPIUtil.get_graph_api_url()}/sites/{GraphAPIUtil.get_hostname()}:/sites/{site_name}",
             headers={
-                "Authorization": f"Bearer {GraphAPIUtil.get_access_token()}",
                 "Content-Type": "application/json"
             }
         )
@@ -37,10 +42,10 @@ class GraphAPIUtil:
     
     @staticmethod
     def get_sharepoint_drive_id(site_id: str = None):
-        response = requests.get(
+        response = HttpSession.graph_request(
+            "GET",
             f"{GraphAPIUtil.get_graph_api_url()}/sites/{site_id}/drive",
             headers={
-                "Authorization": f"Bearer {GraphAPIUtil.get_access_token()}",
                 "Content-Type": "application/json"
             }
         )
@@ -64,56 +69,67 @@ class GraphAPIUtil:
     
     @staticmethod
     def get_msal_app():
-        return msal.ConfidentialClientApplication(
-            client_id=GraphAPIUtil.get_client_id(),
-            client_credential=GraphAPIUtil.get_client_secret(),
-            authority=f"https://login.microsoftonline.com/{GraphAPIUtil.get_tenant_id()}"
-        )
+        return TokenProvider.get_msal_app()
     
     @staticmethod
     def get_access_token():
-        # if token provided in env, use it directly (for testing)
-        token = os.getenv("TOKEN", None)
-        if token:
-            logging.info("Using token from environment variable.")
-            return token
-        app = GraphAPIUtil.get_msal_app()
-        scopes = ["https://graph.microsoft.com/.default"]
-        result = app.acquire_token_for_client(scopes=scopes)
-        if "access_token" in result:
-            return result["access_token"]
-        else:
-            raise Exception("Could not obtain access token from MSAL.")
+        return TokenProvider.get_token()
 
     @staticmethod
-    def get_messages_by_filter(filter: str) -> MessageResponse:
-        token = GraphAPIUtil.get_access_token()
+    def build_query(params: Dict[str, Any]) -> str:
+        # Encode OData query options with %20 for spaces; Graph does not treat "+" as a space in $filter.
+        return "&".join(
+            key + "=" + quote(str(value), safe="',()") for key, value in params.items() if value not in (None, "")
+        )
+
+    @staticmethod
+    def iter_messages(filter: str = None, top: int = None, select: List[str] = None, orderby: str = None) -> Iterator[Message]:
+        # Yields messages one page at a time, following @odata.nextLink lazily so
+        # callers can start work before the last page has been requested.
         headers = {
-            "Authorization": f"Bearer {token}",
             "Content-Type": "application/json"
         }
-        url = f"{GraphAPIUtil.get_graph_api_messages_url()}?$filter={filter}"
-        response = requests.get(url, headers=headers)
-        if response.status_code == 200:
-            msg_resp : MessageResponse = MessageResponse.from_dict(response.json())
-            logging.info(f"response: {response.text}")
-            return msg_resp
-        else:
-            raise Exception(f"Error fetching messages: {response.status_code} {response.text}")
+        query = GraphAPIUtil.build_query({
+            "$filter": filter,
+            "$top": top,
+            "$select": ",".join(select) if select else None,
+            "$orderby": orderby
+        })
+        url = f"{GraphAPIUtil.get_graph_api_messages_url()}?{query}" if query else GraphAPIUtil.get_graph_api_messages_url()
+        page = 0
+        while url:
+            response = HttpSession.graph_request("GET", url, headers=headers)
+            if response.status_code != 200:
+                raise Exception(f"Error fetching messages: {response.status_code} {response.text}")
+            data = response.json()
+            page += 1
+            values = data.get("value", [])
+            # nextLink already carries every query option of the original request
+            url = data.get("@odata.nextLink")
+            del data
+            logging.info(f"Fetched page {page} with {len(values)} messages, more pages: {url is not None}.")
+            values.reverse()
+            while values:
+                yield Message.from_dict(values.pop())
+
+    @staticmethod
+    def get_messages_by_filter(filter: str) -> MessageResponse:
+        return MessageResponse(
+            odata_context="",
+            value=list(GraphAPIUtil.iter_messages(filter=filter))
+        )
         
 
     @staticmethod
     def mark_message_as_read(message_id: str) -> None:
-        token = GraphAPIUtil.get_access_token()
         headers = {
-            "Authorization": f"Bearer {token}",
             "Content-Type": "application/json"
         }
         url = f"{GraphAPIUtil.get_graph_api_messages_url()}/{message_id}"
         body = {
             "isRead": True
         }
-        response = requests.patch(url, headers=headers, json=body)
+        response = HttpSession.graph_request("PATCH", url, headers=headers, json=body)
         if response.status_code == 200:
             logging.info(f"Message {message_id} marked as read.")
         else:
@@ -122,110 +138,218 @@ class GraphAPIUtil:
     
     @staticmethod
     def mark_message_as_unread(message_id: str) -> None:
-        token = GraphAPIUtil.get_access_token()
         headers = {
-            "Authorization": f"Bearer {token}",
             "Content-Type": "application/json"
         }
         url = f"{GraphAPIUtil.get_graph_api_messages_url()}/{message_id}"
         body = {    
             "isRead": False
         }
-        response = requests.patch(url, headers=headers, json=body)
+        response = HttpSession.graph_request("PATCH", url, headers=headers, json=body)
         if response.status_code == 200:
             logging.info(f"Message {message_id} marked as unread.")
         else:
             raise Exception(f"Error marking message as unread: {response.status_code} {response.text}")
         
     @staticmethod
-    def upload_attachment_to_sharepoint(site_name: str, file_path: str, folder_path: str) -> None:
-        token = GraphAPIUtil.get_access_token()
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json"
-        }
-        
+    def get_sharepoint_item_url(site_id: str, drive_id: str, folder_path: str, file_name: str) -> str:
+        return f"{GraphAPIUtil.get_graph_api_url()}/sites/{site_id}/drives/{drive_id}/root:/{quote(folder_path)}/{quote(file_name)}:"
+
+    @staticmethod
+    def get_one_drive_item_url(folder_path: str, file_name: str) -> str:
+        return f"{GraphAPIUtil.get_graph_api_url()}/me/drive/root:/{quote(folder_path)}/{quote(file_name)}:"
+
+    @staticmethod
+    def get_one_drive_item(item_id: str) -> Optional[Dict[str, Any]]:
+        # None if the item no longer exists.
+        url = f"{GraphAPIUtil.get_graph_api_url()}/me/drive/items/{quote(item_id)}?$select=id,eTag,name,parentReference"
+        response = HttpSession.graph_request("GET", url)
+        if response.status_code == 404:
+            return None
+        if response.status_code != 200:
+            raise Exception(f"Error fetching drive item {item_id}: {response.status_code} {response.text}")
+        return response.json()
+
+    @staticmethod
+    def upload_attachment_to_sharepoint(site_name: str, file_path: str, folder_path: str) -> Tuple[str, str]:
+        # Imported here because the resolver itself looks ids up through GraphAPIUtil.
+        from utils.sharepoint_resolver import SharePointResolver
         file_name = os.path.basename(file_path)
-        site_id = GraphAPIUtil.get_sharepoint_site_id(site_name)
-        drive_id = GraphAPIUtil.get_sharepoint_drive_id(site_id)
-        url = f"{GraphAPIUtil.get_graph_api_url()}/sites/{site_id}/drives/{drive_id}/root:/{folder_path}/{file_name}:/content"
-        with open(file_path, 'rb') as file_data:
-            response = requests.put(url, headers=headers, data=file_data)
-            if response.status_code in (200, 201):
+        for attempt in range(2):
+            site_id, drive_id = SharePointResolver.resolve(site_name)
+            item_url = GraphAPIUtil.get_sharepoint_item_url(site_id, drive_id, folder_path, file_name)
+            try:
+                LargeFileUploader.upload(item_url, file_path)
                 logging.info(f"File {file_name} uploaded to SharePoint folder {folder_path}.")
-            else:
-                raise Exception(f"Error uploading file to SharePoint: {response.status_code} {response.text}")
+                return site_id, drive_id
+            except GraphRequestError as e:
+                if e.status_code == 404 and attempt == 0:
+                    # Cached site/drive ids may be stale; resolve them again once.
+                    logging.warning(f"SharePoint drive for site {site_name} not found, refreshing cached ids.")
+                    SharePointResolver.invalidate(site_name)
+                    continue
+                raise Exception(f"Error uploading file to SharePoint: {e}")
+            except Exception as e:
+                raise Exception(f"Error uploading file to SharePoint: {e}")
 
     @staticmethod
     def get_attachments_metadata(message_id: str)->List[FileAttachment]:
-        token = GraphAPIUtil.get_access_token()
         headers = {
-            "Authorization": f"Bearer {token}",
             "Content-Type": "application/json"
         }
         url = f"{GraphAPIUtil.get_graph_api_messages_url()}/{message_id}/attachments"
-        response = requests.get(url, headers=headers)
+        response = HttpSession.graph_request("GET", url, headers=headers)
         if response.status_code == 200:
             attachments_data = response.json().get("value", [])
-            attachments = [FileAttachment(
-                odata_type=att.get("@odata.type", ""),
-                id=att.get("id", ""),
-                name=att.get("name", ""),
-                size=att.get("size", 0),
-                media_content_type=att.get("@odata.mediaContentType", ""),
-                media_read_link=att.get("@odata.mediaReadLink", ""),
-                content_bytes=att.get("contentBytes", None)
-            ) for att in attachments_data if att.get("@odata.type") == "#microsoft.graph.fileAttachment"]
-            return attachments
+            return GraphAPIUtil.parse_file_attachments(attachments_data)
         else:
             raise Exception(f"Error fetching attachments: {response.status_code} {response.text}")     
 
     @staticmethod
-    def download_attachment(attachment: FileAttachment) -> str:
+    def parse_file_attachments(attachments_data: List[Dict[str, Any]]) -> List[FileAttachment]:
+        return [
+            FileAttachment.from_dict(att) for att in attachments_data
+            if att.get("@odata.type") == "#microsoft.graph.fileAttachment"
+        ]
+
+    @staticmethod
+    def get_attachments_metadata_batch(message_ids: List[str]) -> Tuple[Dict[str, List[FileAttachment]], Dict[str, str]]:
+        # One $batch round trip per 20 messages; returns (attachments by message id, errors by message id).
+        # contentBytes is excluded so the batch response stays small.
+        batch_requests = [
+            GraphBatchRequest(
+                id=str(i),
+                method="GET",
+                url=f"/me/messages/{message_id}/attachments?$select=id,name,size,contentType"
+            )
+            for i, message_id in enumerate(message_ids)
+        ]
+        results = GraphBatchClient.execute(batch_requests)
+        attachments: Dict[str, List[FileAttachment]] = {}
+        errors: Dict[str, str] = {}
+        for i, message_id in enumerate(message_ids):
+            result = results.get(str(i))
+            if result is not None and result.ok:
+                attachments[message_id] = GraphAPIUtil.parse_file_attachments((result.body or {}).get("value", []))
+            else:
+                errors[message_id] = result.error_message if result is not None else "no response"
+        return attachments, errors
+
+    @staticmethod
+    def set_messages_read_state_batch(message_ids: List[str], is_read: bool = True) -> Dict[str, str]:
+        # Returns errors by message id; an empty dict means every message was updated.
+        batch_requests = [
+            GraphBatchRequest(
+                id=str(i),
+                method="PATCH",
+                url=f"/me/messages/{message_id}",
+                body={"isRead": is_read}
+            )
+            for i, message_id in enumerate(message_ids)
+        ]
+        results = GraphBatchClient.execute(batch_requests)
+        errors: Dict[str, str] = {}
+        for i, message_id in enumerate(message_ids):
+            result = results.get(str(i))
+            if result is None or not result.ok:
+                errors[message_id] = result.error_message if result is not None else "no response"
+        logging.info(f"Set isRead={is_read} on {len(message_ids) - len(errors)} of {len(message_ids)} messages.")
+        return errors
+
+    @staticmethod
+    def download_attachment(attachment: FileAttachment, message_id: str = None) -> str:
         temp_dir = "/tmp"
         os.makedirs(temp_dir, exist_ok=True)
-        destination_path = os.path.join(temp_dir, attachment.name)
-        if not attachment.media_read_link:
-            if attachment.content_bytes:
-            # Decode base64 content
-                file_content = base64.b64decode(attachment.content_bytes)
-                # Write to file
-                with open(destination_path, "wb") as f:
-                    f.write(file_content)
-                    logging.info(f"Attachment saved as {destination_path}")
-            else:
-                raise Exception("No content available for attachment.")
-        else:
-            token = GraphAPIUtil.get_access_token()
-            headers = {
-                "Authorization": f"Bearer {token}"
-            }
-            download_url = attachment.media_read_link
-            response = requests.get(download_url, stream=True, headers=headers)
-        
-            if response.status_code == 200:
-                with open(destination_path, 'wb') as file:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        file.write(chunk)
-                logging.info(f"Attachment {attachment.name} downloaded to {destination_path}.")
-            else:
-                raise Exception(f"Error downloading attachment: {response.status_code} {response.text}")
+        # One directory per download so attachments with the same name can be processed concurrently.
+        destination_path = os.path.join(tempfile.mkdtemp(prefix="attachment-", dir=temp_dir), attachment.name)
+        with GraphAPIUtil.open_attachment_stream(attachment, message_id) as stream:
+            with open(destination_path, 'wb') as file:
+                for chunk in stream.chunks:
+                    file.write(chunk)
+        logging.info(f"Attachment {attachment.name} downloaded to {destination_path}.")
+        return destination_path
 
-        return destination_path  
+    @staticmethod
+    def open_attachment_stream(attachment: FileAttachment, message_id: str = None) -> AttachmentStream:
+        # Streams attachment content without touching disk. Falls back to the
+        # attachment's $value endpoint when the metadata carries neither a
+        # media link nor contentBytes (e.g. metadata fetched with $select).
+        chunk_size = 64 * 1024
+        if not attachment.media_read_link and attachment.content_bytes:
+            content = base64.b64decode(attachment.content_bytes)
+            return AttachmentStream((content[i:i + chunk_size] for i in range(0, len(content), chunk_size)), len(content))
+        download_url = attachment.media_read_link
+        if not download_url and message_id:
+            download_url = f"{GraphAPIUtil.get_graph_api_messages_url()}/{message_id}/attachments/{attachment.id}/$value"
+        if not download_url:
+            raise Exception("No content available for attachment.")
+        response = HttpSession.graph_request("GET", download_url, stream=True, timeout=HttpSession.get_transfer_timeout())
+        if response.status_code != 200:
+            raise Exception(f"Error downloading attachment: {response.status_code} {response.text}")
+        content_length = response.headers.get("Content-Length")
+        return AttachmentStream(
+            response.iter_content(chunk_size=chunk_size),
+            int(content_length) if content_length else None,
+            response=response
+        )
 
-    
     @staticmethod
-    def upload_attachment_to_one_drive(file_path: str, folder_path: str) -> None:
-        token = GraphAPIUtil.get_access_token()
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json"
-        }
+    def stream_attachment_to_one_drive(attachment: FileAttachment, folder_path: str, message_id: str = None) -> Dict[str, Any]:
+        # Returns the uploaded drive item.
+        item_url = GraphAPIUtil.get_one_drive_item_url(folder_path, attachment.name)
+        with GraphAPIUtil.open_attachment_stream(attachment, message_id) as stream:
+            item = LargeFileUploader.upload_stream(item_url, attachment.name, stream)
+        logging.info(f"File {attachment.name} streamed to OneDrive folder {folder_path}.")
+        return item
+
+    @staticmethod
+    def get_spool_max_memory() -> int:
+        # Spooled attachments above this size roll over from memory to a temp file.
+        return int(os.getenv("ATTACHMENT_SPOOL_MAX_MEMORY_BYTES", str(4 * 1024 * 1024)))
+
+    @staticmethod
+    def spool_attachment(attachment: FileAttachment, message_id: str = None) -> SpooledAttachment:
+        # Downloads the attachment and hashes it in the same pass.
+        with GraphAPIUtil.open_attachment_stream(attachment, message_id) as stream:
+            spool = SpooledAttachment(stream.chunks, GraphAPIUtil.get_spool_max_memory())
+        logging.info(f"Attachment {attachment.name} spooled, {spool.size} bytes, sha256 {spool.sha256}.")
+        return spool
+
+    @staticmethod
+    def upload_spooled_attachment_to_one_drive(spool: SpooledAttachment, file_name: str, folder_path: str) -> Dict[str, Any]:
+        item_url = GraphAPIUtil.get_one_drive_item_url(folder_path, file_name)
+        try:
+            item = LargeFileUploader.upload_stream(item_url, file_name, spool.open_stream())
+            logging.info(f"File {file_name} uploaded to OneDrive folder {folder_path}.")
+            return item
+        except Exception as e:
+            raise Exception(f"Error uploading file to OneDrive: {e}")
+
+    @staticmethod
+    def remove_downloaded_attachment(file_path: str) -> None:
+        try:
+            os.remove(file_path)
+            os.rmdir(os.path.dirname(file_path))
+        except OSError as e:
+            logging.warning(f"Could not remove downloaded attachment {file_path}: {e}")
+
+    @staticmethod
+    def upload_attachment_to_one_drive(file_path: str, folder_path: str) -> Dict[str, Any]:
+        # Returns the uploaded drive item.
         file_name = os.path.basename(file_path)
-        url = f"{GraphAPIUtil.get_graph_api_url()}/me/drive/root:/{folder_path}/{file_name}:/content"
-        with open(file_path, 'rb') as file_data:   
-            response = requests.put(url, headers=headers, data=file_data)
-            if response.status_code in (200, 201):
-                logging.info(f"File {file_name} uploaded to OneDrive folder {folder_path}.")
-            else:
-                raise Exception(f"Error uploading file to OneDrive: {response.status_code} {response.text}")
\ No newline at end of file
+        item_url = GraphAPIUtil.get_one_drive_item_url(folder_path, file_name)
+        try:
+            item = LargeFileUploader.upload(item_url, file_path)
+            logging.info(f"File {file_name} uploaded to OneDrive folder {folder_path}.")
+            return item
+        except Exception as e:
+            raise Exception(f"Error uploading file to OneDrive: {e}")
+
+    @staticmethod
+    def upload_attachments_to_one_drive(file_paths: List[str], folder_path: str, max_workers: int = None) -> Dict[str, Optional[str]]:
+        # Uploads several files at once; returns the error message (or None) by file path.
+        uploads = [
+            (GraphAPIUtil.get_one_drive_item_url(folder_path, os.path.basename(file_path)), file_path)
+            for file_path in file_paths
+        ]
+        return LargeFileUploader.upload_many(uploads, max_workers=max_workers)
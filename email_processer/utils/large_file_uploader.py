@@ -0,0 +1,167 @@
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils.attachment_stream import AttachmentStream, StreamWindow
+from utils.http_session import GraphRequestError, HttpSession
+
+
+class LargeFileUploader:
+    # Uploads a file to a drive item path such as
+    # ".../me/drive/root:/Attachments/report.xlsx:". Files up to the threshold
+    # go in one PUT .../content; larger files use a Graph upload session and
+    # are sent one chunk at a time, read either from disk or from a download
+    # stream, resuming from the server-reported next expected range after a
+    # failed chunk.
+    chunk_alignment = 320 * 1024    # Graph requires chunk sizes in multiples of 320 KiB
+
+    @staticmethod
+    def get_threshold_bytes() -> int:
+        return int(os.getenv("UPLOAD_SESSION_THRESHOLD_BYTES", str(4 * 1024 * 1024)))
+
+    @classmethod
+    def get_chunk_size(cls) -> int:
+        chunk_size = int(os.getenv("UPLOAD_CHUNK_SIZE_BYTES", str(10 * cls.chunk_alignment)))
+        return max(cls.chunk_alignment, chunk_size - chunk_size % cls.chunk_alignment)
+
+    @staticmethod
+    def get_max_retries() -> int:
+        return int(os.getenv("UPLOAD_MAX_RETRIES", "5"))
+
+    @classmethod
+    def upload(cls, item_url: str, file_path: str) -> Dict[str, Any]:
+        size = os.path.getsize(file_path)
+        if size <= cls.get_threshold_bytes():
+            return cls.upload_small(item_url, file_path)
+        upload_url = cls.create_upload_session(item_url)
+        return cls.upload_session_chunks(upload_url, file_path, size)
+
+    @staticmethod
+    def upload_small(item_url: str, file_path: str) -> Dict[str, Any]:
+        with open(file_path, 'rb') as file_data:
+            response = HttpSession.graph_request(
+                "PUT",
+                f"{item_url}/content",
+                headers={"Content-Type": "application/octet-stream"},
+                data=file_data,
+                timeout=HttpSession.get_transfer_timeout()
+            )
+        if response.status_code in (200, 201):
+            return response.json()
+        raise GraphRequestError(f"Error uploading file {os.path.basename(file_path)}: {response.status_code} {response.text}", response.status_code)
+
+    @staticmethod
+    def create_upload_session(item_url: str) -> str:
+        response = HttpSession.graph_request(
+            "POST",
+            f"{item_url}/createUploadSession",
+            headers={"Content-Type": "application/json"},
+            json={"item": {"@microsoft.graph.conflictBehavior": "replace"}}
+        )
+        if response.status_code == 200:
+            return response.json()["uploadUrl"]
+        raise GraphRequestError(f"Error creating upload session: {response.status_code} {response.text}", response.status_code)
+
+    @staticmethod
+    def get_next_offset(upload_url: str) -> Optional[int]:
+        # The upload URL is pre-authenticated, so no bearer token is sent to it.
+        response = HttpSession.request("GET", upload_url)
+        if response.status_code != 200:
+            raise Exception(f"Error reading upload session status: {response.status_code} {response.text}")
+        ranges = response.json().get("nextExpectedRanges", [])
+        return int(ranges[0].split("-")[0]) if ranges else None
+
+    @classmethod
+    def upload_session_chunks(cls, upload_url: str, file_path: str, size: int) -> Dict[str, Any]:
+        with open(file_path, 'rb') as file_data:
+            def read_range(offset: int, length: int) -> bytes:
+                file_data.seek(offset)
+                return file_data.read(length)
+            return cls.upload_session_ranges(upload_url, read_range, size, os.path.basename(file_path))
+
+    @classmethod
+    def upload_stream(cls, item_url: str, name: str, stream: AttachmentStream) -> Dict[str, Any]:
+        # Uploads straight from a download stream, buffering at most one chunk
+        # (or the whole file when it is below the simple-upload threshold).
+        if stream.size is None:
+            raise Exception(f"Size of {name} is unknown, cannot stream it into an upload.")
+        if stream.size <= cls.get_threshold_bytes():
+            response = HttpSession.graph_request(
+                "PUT",
+                f"{item_url}/content",
+                headers={"Content-Type": "application/octet-stream"},
+                data=stream.read_all(),
+                timeout=HttpSession.get_transfer_timeout()
+            )
+            if response.status_code in (200, 201):
+                return response.json()
+            raise GraphRequestError(f"Error uploading file {name}: {response.status_code} {response.text}", response.status_code)
+        upload_url = cls.create_upload_session(item_url)
+        return cls.upload_session_ranges(upload_url, StreamWindow(stream.chunks).read, stream.size, name)
+
+    @classmethod
+    def upload_session_ranges(cls, upload_url: str, read_range: Callable[[int, int], bytes], size: int, name: str) -> Dict[str, Any]:
+        chunk_size = cls.get_chunk_size()
+        offset = 0
+        failures = 0
+        while True:
+            chunk = read_range(offset, min(chunk_size, size - offset))
+            end = offset + len(chunk) - 1
+            try:
+                response = HttpSession.request(
+                    "PUT",
+                    upload_url,
+                    headers={
+                        "Content-Length": str(len(chunk)),
+                        "Content-Range": f"bytes {offset}-{end}/{size}"
+                    },
+                    data=chunk,
+                    timeout=HttpSession.get_transfer_timeout()
+                )
+                status = response.status_code
+            except Exception as e:
+                response = None
+                status = None
+                logging.warning(f"Chunk {offset}-{end} of {name} failed: {e}")
+
+            if status in (200, 201):
+                logging.info(f"Uploaded {name} ({size} bytes) via upload session.")
+                return response.json()
+            if status == 202:
+                ranges = response.json().get("nextExpectedRanges", [])
+                offset = int(ranges[0].split("-")[0]) if ranges else end + 1
+                failures = 0
+                continue
+            if status is not None and status not in (409, 416, 429) and status < 500:
+                raise Exception(f"Error uploading chunk {offset}-{end}: {status} {response.text}")
+
+            failures += 1
+            if failures > cls.get_max_retries():
+                raise Exception(f"Giving up on upload of {name} after {failures} failed chunks.")
+            time.sleep(min(2 ** failures, 30))
+            next_offset = cls.get_next_offset(upload_url)
+            if next_offset is None:
+                raise Exception(f"Upload session for {name} has no expected ranges left.")
+            logging.info(f"Resuming upload of {name} at byte {next_offset}.")
+            offset = next_offset
+
+    @classmethod
+    def upload_many(cls, uploads: List[Tuple[str, str]], max_workers: int = None) -> Dict[str, Optional[str]]:
+        # uploads is a list of (item_url, file_path); returns error message (or None) by file path.
+        max_workers = max_workers or int(os.getenv("UPLOAD_MAX_PARALLEL_FILES", "4"))
+        results: Dict[str, Optional[str]] = {}
+
+        def upload_one(item_url: str, file_path: str):
+            try:
+                cls.upload(item_url, file_path)
+                results[file_path] = None
+            except Exception as e:
+                logging.error(f"Upload of {file_path} failed: {e}")
+                results[file_path] = str(e)
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="upload") as executor:
+            for item_url, file_path in uploads:
+                executor.submit(upload_one, item_url, file_path)
+        return results
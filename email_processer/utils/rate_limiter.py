@@ -0,0 +1,119 @@
+import os
+import random
+import threading
+import time
+from typing import Dict, Optional
+
+
+class TokenBucket:
+    # Token bucket whose refill rate adapts to throttle signals: it halves on
+    # every 429/503 and creeps back up towards max_rate on successes (AIMD).
+    def __init__(self, max_rate: float, capacity: float = None, min_rate: float = 0.5):
+        self.max_rate = max_rate
+        self.min_rate = min(min_rate, max_rate)
+        self.rate = max_rate
+        self.capacity = capacity or max(1.0, max_rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            self.refill(now)
+            # Reserve a token even if it is not there yet; the debt is paid by waiting.
+            self.tokens -= 1
+            wait = max(self.blocked_until - now, -self.tokens / self.rate if self.tokens < 0 else 0.0)
+        if wait > 0:
+            time.sleep(wait)
+
+    def on_success(self):
+        with self.lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+    def on_throttled(self, retry_after: Optional[float] = None):
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = min(self.tokens, 0.0)
+            if retry_after:
+                # Every caller of this endpoint class waits out the server's Retry-After.
+                self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+
+
+class GraphRateLimiter:
+    # One adaptive token bucket per Graph endpoint class in this worker.
+    # Requests per second per class can be tuned with GRAPH_RATE_<CLASS>.
+    default_rates = {
+        "mail": 10.0,
+        "drive": 10.0,
+        "batch": 2.0,    # each $batch call can carry 20 sub-requests
+        "default": 10.0
+    }
+    idempotent_methods = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+    buckets: Dict[str, TokenBucket] = {}
+    lock = threading.Lock()
+
+    @staticmethod
+    def classify(url: str) -> str:
+        path = url.split("?", 1)[0]
+        if path.endswith("/$batch"):
+            return "batch"
+        if "/drive" in path or "/sites/" in path:
+            return "drive"
+        if "/messages" in path or "/mailFolders" in path:
+            return "mail"
+        return "default"
+
+    @staticmethod
+    def get_max_retries() -> int:
+        return int(os.getenv("GRAPH_MAX_RETRIES", "4"))
+
+    @classmethod
+    def get_bucket(cls, endpoint_class: str) -> TokenBucket:
+        bucket = cls.buckets.get(endpoint_class)
+        if bucket is None:
+            with cls.lock:
+                bucket = cls.buckets.get(endpoint_class)
+                if bucket is None:
+                    rate = float(os.getenv(f"GRAPH_RATE_{endpoint_class.upper()}", cls.default_rates.get(endpoint_class, 10.0)))
+                    bucket = TokenBucket(max_rate=rate)
+                    cls.buckets[endpoint_class] = bucket
+        return bucket
+
+    @classmethod
+    def acquire(cls, endpoint_class: str):
+        cls.get_bucket(endpoint_class).acquire()
+
+    @classmethod
+    def on_success(cls, endpoint_class: str):
+        cls.get_bucket(endpoint_class).on_success()
+
+    @classmethod
+    def on_throttled(cls, endpoint_class: str, retry_after: Optional[float] = None):
+        cls.get_bucket(endpoint_class).on_throttled(retry_after)
+
+    @staticmethod
+    def parse_retry_after(value: Optional[str]) -> Optional[float]:
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            return None
+
+    @staticmethod
+    def get_backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+        if retry_after is not None:
+            return retry_after
+        # Full jitter exponential backoff, capped at 30 seconds.
+        return random.uniform(0, min(30.0, 0.5 * 2 ** attempt))
+
+    @classmethod
+    def get_stats(cls) -> Dict[str, float]:
+        return {name: round(bucket.rate, 2) for name, bucket in cls.buckets.items()}
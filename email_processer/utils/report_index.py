@@ -0,0 +1,84 @@
+import logging
+import os
+import threading
+from dataclasses import asdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Set, Tuple
+
+from utils.storage_table_entities import EmailAttachmentEntity, EmailAttachmentIndexEntity
+from utils.storage_table_util import StorageTableUtil
+from utils.table_batch_writer import ChunkResult
+
+
+class ReportIndex:
+    # Hour-partitioned index of processed attachments read by the daily report.
+    # Index rows are written after their main rows; when that write fails, the
+    # retry finds the attachments processed, so ensure_indexed() re-creates
+    # the missing rows. A keys-only query per hour bucket finds what is
+    # missing and only that is inserted, never overwritten, so a row the
+    # report already marked as reported stays marked. Attachments known to be
+    # indexed are remembered per worker, so a re-dispatched email costs no
+    # index read after the first check.
+    indexed: Set[Tuple[str, str]] = set()
+    lock = threading.Lock()
+    max_remembered = 100000
+
+    @staticmethod
+    def get_table_name() -> str:
+        return os.getenv("STORAGE_INDEX_TABLE_NAME", "AttachmentsByHour")
+
+    @staticmethod
+    def get_repair_hours() -> int:
+        # The report reads the last 24 hourly partitions; older rows are not re-created.
+        return int(os.getenv("REPORT_INDEX_REPAIR_HOURS", "24"))
+
+    @classmethod
+    def remember(cls, email_id: str, attachment_ids: Iterable[str]):
+        with cls.lock:
+            if len(cls.indexed) > cls.max_remembered:
+                cls.indexed.clear()
+            cls.indexed.update((email_id, attachment_id) for attachment_id in attachment_ids)
+
+    @classmethod
+    def write(cls, entities: List[EmailAttachmentEntity]) -> List[ChunkResult]:
+        # Index rows of freshly written main rows, one transaction per hour bucket.
+        writer = StorageTableUtil.get_batch_writer(cls.get_table_name())
+        for entity in entities:
+            writer.add(asdict(EmailAttachmentIndexEntity.from_attachment_entity(entity)), operation="upsert")
+        results = writer.flush()
+        if all(result.success for result in results):
+            for entity in entities:
+                cls.remember(entity.PartitionKey, [entity.RowKey])
+        return results
+
+    @classmethod
+    def ensure_indexed(cls, main_table_name: str, email_id: str, attachment_ids: List[str]) -> int:
+        # Re-creates index rows missing for processed attachments of the email; returns how many.
+        unchecked = {attachment_id for attachment_id in attachment_ids if (email_id, attachment_id) not in cls.indexed}
+        if not unchecked:
+            return 0
+        since = (datetime.now(timezone.utc) - timedelta(hours=cls.get_repair_hours())).strftime("%Y%m%d%H")
+        rows = StorageTableUtil.get_partition_entities(main_table_name, email_id, select=["RowKey", "processDateTime", "isReported"])
+        buckets: Dict[str, List[str]] = {}
+        for row in rows:
+            entity = EmailAttachmentEntity.from_dict(row)
+            if entity.RowKey not in unchecked or entity.isReported or not entity.processDateTime:
+                continue
+            bucket = EmailAttachmentIndexEntity.get_hour_bucket(entity.processDateTime)
+            if bucket >= since:
+                buckets.setdefault(bucket, []).append(entity.RowKey)
+        created = 0
+        for bucket, bucket_ids in buckets.items():
+            existing = StorageTableUtil.get_row_keys_with_prefix(cls.get_table_name(), bucket, f"{email_id}|")
+            for attachment_id in bucket_ids:
+                if f"{email_id}|{attachment_id}" in existing:
+                    continue
+                main = StorageTableUtil.get_entity(main_table_name, email_id, attachment_id)
+                if main is None:
+                    continue
+                index_entity = EmailAttachmentIndexEntity.from_attachment_entity(EmailAttachmentEntity.from_dict(main))
+                if StorageTableUtil.create_entity_if_absent(cls.get_table_name(), asdict(index_entity)) is not None:
+                    logging.warning(f"Re-created missing report index row of attachment {attachment_id} of email {email_id}.")
+                    created += 1
+        cls.remember(email_id, unchecked)
+        return created
@@ -0,0 +1,90 @@
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from utils.graph_api_util import GraphAPIUtil
+
+
+class SharePointResolver:
+    # Process-wide cache of SharePoint site and drive ids keyed by
+    # (hostname, site name). Entries live for SHAREPOINT_ID_TTL_SECONDS and
+    # are dropped early by invalidate() when Graph reports the ids as gone.
+    # A failed lookup is remembered for SHAREPOINT_ID_NEGATIVE_TTL_SECONDS, so
+    # while the site is missing or Graph is down, callers fail fast instead of
+    # queueing on the lock for one Graph round trip each.
+    cache: Dict[Tuple[str, str], Tuple[str, str, float]] = {}
+    failures: Dict[Tuple[str, str], Tuple[Exception, float]] = {}
+    lock = threading.Lock()
+
+    @staticmethod
+    def get_ttl_seconds() -> int:
+        return int(os.getenv("SHAREPOINT_ID_TTL_SECONDS", "86400"))
+
+    @staticmethod
+    def get_negative_ttl_seconds() -> int:
+        return int(os.getenv("SHAREPOINT_ID_NEGATIVE_TTL_SECONDS", "60"))
+
+    @classmethod
+    def raise_if_failed_recently(cls, key: Tuple[str, str]):
+        failure = cls.failures.get(key)
+        if failure is not None and time.time() < failure[1]:
+            raise Exception(f"SharePoint site {key[1]} could not be resolved recently: {failure[0]}") from failure[0]
+
+    @classmethod
+    def resolve(cls, site_name: str, hostname: str = None) -> Tuple[str, str]:
+        # Returns (site_id, drive_id).
+        key = (hostname or GraphAPIUtil.get_hostname(), site_name)
+        entry = cls.cache.get(key)
+        if entry is not None and time.time() < entry[2]:
+            return entry[0], entry[1]
+        cls.raise_if_failed_recently(key)
+        with cls.lock:
+            entry = cls.cache.get(key)
+            if entry is not None and time.time() < entry[2]:
+                return entry[0], entry[1]
+            cls.raise_if_failed_recently(key)
+            try:
+                site_id = GraphAPIUtil.get_sharepoint_site_id(site_name)
+                drive_id = GraphAPIUtil.get_sharepoint_drive_id(site_id)
+            except Exception as e:
+                cls.failures[key] = (e, time.time() + cls.get_negative_ttl_seconds())
+                raise
+            cls.failures.pop(key, None)
+            cls.cache[key] = (site_id, drive_id, time.time() + cls.get_ttl_seconds())
+            logging.info(f"Resolved SharePoint site {site_name} to site {site_id}, drive {drive_id}.")
+            return site_id, drive_id
+
+    @classmethod
+    def get_cached(cls, site_name: str, hostname: str = None) -> Optional[Tuple[str, str]]:
+        entry = cls.cache.get((hostname or GraphAPIUtil.get_hostname(), site_name))
+        if entry is not None and time.time() < entry[2]:
+            return entry[0], entry[1]
+        return None
+
+    @classmethod
+    def invalidate(cls, site_name: str = None, hostname: str = None):
+        with cls.lock:
+            if site_name is None:
+                cls.cache.clear()
+                cls.failures.clear()
+            else:
+                key = (hostname or GraphAPIUtil.get_hostname(), site_name)
+                cls.cache.pop(key, None)
+                cls.failures.pop(key, None)
+
+    @classmethod
+    def warm(cls, site_name: str = None):
+        # Resolve the configured site in the background so the first invocation does not pay for it.
+        site_name = site_name or os.getenv("SHAREPOINT_SITE_NAME")
+        if not site_name:
+            return
+
+        def resolve_quietly():
+            try:
+                cls.resolve(site_name)
+            except Exception as e:
+                logging.warning(f"Could not warm SharePoint ids for site {site_name}: {e}")
+
+        threading.Thread(target=resolve_quietly, name="sharepoint-resolver-warmup", daemon=True).start()
@@ -1,12 +1,19 @@
-from azure.data.tables import TableServiceClient, TableClient, UpdateMode, TableTransactionError
-from datetime import datetime, timedelta, timezone
 import os
+import threading
 import logging
+from typing import TYPE_CHECKING, Dict, List, Optional, Set
+
+from utils.table_batch_writer import ChunkResult, TableBatchWriter
+
+if TYPE_CHECKING:
+    from azure.data.tables import TableClient
 
-from utils.email_dtos import FileAttachment
 
 class StorageTableUtil:
     table_service = None
+    # Per-process registry of table clients whose table is known to exist.
+    table_clients = {}
+    lock = threading.Lock()
     
     @classmethod
     def get_connection_string(cls)-> str:
@@ -15,8 +22,11 @@ class StorageTableUtil:
     @classmethod
     def get_table_service(cls):
         if cls.table_service is None:
-            
-            cls.table_service = TableServiceClient.from_connection_string(cls.get_connection_string())
+            # The Azure SDK is imported on first use to keep it off the cold-start path.
+            from azure.data.tables import TableServiceClient
+            with cls.lock:
+                if cls.table_service is None:
+                    cls.table_service = TableServiceClient.from_connection_string(cls.get_connection_string())
         return cls.table_service
     
     @classmethod
@@ -28,56 +38,184 @@ class StorageTableUtil:
             raise Exception(f"Error creating or accessing table {table_name}: {str(e)}")
         
     @classmethod
-    def get_table_client(cls, table_name: str)-> TableClient:
-        cls.ensure_table_exists(table_name)
-        table_service = cls.get_table_service()
-        return table_service.get_table_client(table_name)
+    def get_table_client(cls, table_name: str)-> "TableClient":
+        # The table is checked/created only the first time it is used in this process.
+        table_client = cls.table_clients.get(table_name)
+        if table_client is None:
+            cls.ensure_table_exists(table_name)
+            table_client = cls.get_table_service().get_table_client(table_name)
+            cls.table_clients[table_name] = table_client
+        return table_client
+
+    @classmethod
+    def is_table_not_found(cls, e: Exception) -> bool:
+        from azure.core.exceptions import ResourceNotFoundError
+        return isinstance(e, ResourceNotFoundError) and getattr(e, "error_code", None) == "TableNotFound"
+
+    @classmethod
+    def run_table_operation(cls, table_name: str, operation):
+        # Runs operation(table_client); if the table was deleted since it was
+        # registered, re-creates it once and retries.
+        try:
+            return operation(cls.get_table_client(table_name))
+        except Exception as e:
+            if not cls.is_table_not_found(e):
+                raise
+            logging.warning(f"Table {table_name} not found, re-creating it.")
+            cls.table_clients.pop(table_name, None)
+            return operation(cls.get_table_client(table_name))
     
     @classmethod
     def insert_entity(cls, table_name: str, entity: dict):
-        table_client = cls.get_table_client(table_name)
         try:
-            table_client.create_entity(entity=entity)
+            cls.run_table_operation(table_name, lambda table_client: table_client.create_entity(entity=entity))
         except Exception as e:
             logging.error(f"Error inserting entity into table {table_name}: {str(e)}")
         
     @classmethod
-    def get_all_attachments_processed_in_24hrs(cls, table_name: str):
-        
-        table_client = cls.get_table_client(table_name)
+    def get_batch_writer(cls, table_name: str) -> TableBatchWriter:
+        return TableBatchWriter(
+            table_name,
+            submit=lambda ops: cls.run_table_operation(table_name, lambda table_client: table_client.submit_transaction(ops))
+        )
+
+    @classmethod
+    def batch_update_entity(cls, table_name: str, entities: list) -> List[ChunkResult]:
+        # Split per partition into transactions of at most 100 entities; failed chunks are retried and reported.
+        from azure.data.tables import UpdateMode
+        writer = cls.get_batch_writer(table_name)
+        writer.add_all(entities, operation="update", options={"mode": UpdateMode.MERGE})
+        results = writer.flush()
+        for result in results:
+            if not result.success:
+                logging.error(f"Batch update of {result.size} entities in partition {result.partition_key} failed: {result.error}")
+        return results
+
+    @classmethod
+    def upsert_entity(cls, table_name: str, entity: dict):
+        from azure.data.tables import UpdateMode
         try:
-            twenty_four_hours_ago = datetime.now(timezone.utc) - timedelta(hours=24)
-            filter_query = f"processDateTime ge '{twenty_four_hours_ago.isoformat()} and isReported eq false'"
-            entities = table_client.query_entities(filter=filter_query)
-            return list(entities)
+            cls.run_table_operation(table_name, lambda table_client: table_client.upsert_entity(entity=entity, mode=UpdateMode.REPLACE))
         except Exception as e:
-            raise Exception(f"Error querying entities from table {table_name}: {str(e)}")
-    
+            raise Exception(f"Error upserting entity into table {table_name}: {str(e)}")
+
     @classmethod
-    def batch_update_entity(cls, table_name: str, entities: list):
-        table_client:TableClient = cls.get_table_client(table_name)
-        batch_ops = [
-        ("update", entity, {"mode": UpdateMode.MERGE}) for entity in entities
-        ]
+    def create_entity_if_absent(cls, table_name: str, entity: dict) -> Optional[str]:
+        # Conditional insert: returns the new entity's ETag, or None if an entity with the same keys already exists.
+        from azure.core.exceptions import ResourceExistsError
         try:
-            responses = table_client.submit_transaction(batch_ops)
-            return responses
-        except TableTransactionError as e:
-            # - e.message : error message
-            # - e.response : HTTP response from the server
-            logging.error("Batch update failed!")
-            logging.error("Error message:", e.message)
-            
-            # The failed operation details are inside e.response
-            logging.error("Failed operation HTTP status:", e.response.status_code)
-            logging.error("Failed operation body:", e.response.text)
-
-    @classmethod
-    def get_entity(cls, table_name: str, partition_key: str, row_key: str) -> dict:
-        table_client = cls.get_table_client(table_name)
+            metadata = cls.run_table_operation(table_name, lambda table_client: table_client.create_entity(entity=entity))
+            return (metadata or {}).get("etag", "")
+        except ResourceExistsError:
+            return None
+        except Exception as e:
+            raise Exception(f"Error inserting entity into table {table_name}: {str(e)}")
+
+    @classmethod
+    def get_entity(cls, table_name: str, partition_key: str, row_key: str) -> Optional[dict]:
+        # The returned entity carries its ETag in entity.metadata["etag"].
+        from azure.core.exceptions import ResourceNotFoundError
+        try:
+            return cls.run_table_operation(table_name, lambda table_client: table_client.get_entity(partition_key=partition_key, row_key=row_key))
+        except ResourceNotFoundError:
+            return None
+        except Exception as e:
+            raise Exception(f"Error reading entity from table {table_name}: {str(e)}")
+
+    @classmethod
+    def update_entity_if_match(cls, table_name: str, entity: dict, etag: str) -> Optional[str]:
+        # Replaces the entity only if it is unchanged since etag was read. Returns the new ETag,
+        # or None if someone else changed or removed it.
+        from azure.core import MatchConditions
+        from azure.core.exceptions import ResourceModifiedError, ResourceNotFoundError
+        from azure.data.tables import UpdateMode
+        try:
+            metadata = cls.run_table_operation(table_name, lambda table_client: table_client.update_entity(
+                entity=entity, mode=UpdateMode.REPLACE, etag=etag, match_condition=MatchConditions.IfNotModified
+            ))
+            return (metadata or {}).get("etag", "")
+        except (ResourceModifiedError, ResourceNotFoundError):
+            return None
+        except Exception as e:
+            raise Exception(f"Error updating entity in table {table_name}: {str(e)}")
+
+    @classmethod
+    def delete_entity(cls, table_name: str, partition_key: str, row_key: str, etag: str = None) -> bool:
+        # With etag, only deletes the entity if it is unchanged since it was read; False if it changed or is gone.
+        from azure.core import MatchConditions
+        from azure.core.exceptions import ResourceModifiedError, ResourceNotFoundError
+        kwargs = {"etag": etag, "match_condition": MatchConditions.IfNotModified} if etag else {}
+        try:
+            cls.run_table_operation(table_name, lambda table_client: table_client.delete_entity(partition_key=partition_key, row_key=row_key, **kwargs))
+            return True
+        except (ResourceModifiedError, ResourceNotFoundError):
+            logging.info(f"Entity {partition_key}/{row_key} in table {table_name} changed, not deleted.")
+            return False
+        except Exception as e:
+            raise Exception(f"Error deleting entity from table {table_name}: {str(e)}")
+
+    @classmethod
+    def get_processed_row_keys(cls, table_name: str, partition_keys: List[str]) -> Dict[str, Set[str]]:
+        # One partition query per group of partition keys, projecting only the keys,
+        # instead of a point read per row. Returns the RowKeys found per PartitionKey.
+        result: Dict[str, Set[str]] = {pk: set() for pk in partition_keys}
+        unique_keys = list(result.keys())
+        group_size = 15
+        try:
+            for start in range(0, len(unique_keys), group_size):
+                group = unique_keys[start:start + group_size]
+                parameters = {f"pk{i}": pk for i, pk in enumerate(group)}
+                filter_query = " or ".join(f"PartitionKey eq @pk{i}" for i in range(len(group)))
+                entities = cls.run_table_operation(
+                    table_name,
+                    lambda table_client: list(table_client.query_entities(
+                        query_filter=filter_query,
+                        parameters=parameters,
+                        select=["PartitionKey", "RowKey"]
+                    ))
+                )
+                for entity in entities:
+                    result.setdefault(entity["PartitionKey"], set()).add(entity["RowKey"])
+            return result
+        except Exception as e:
+            raise Exception(f"Error querying processed keys from table {table_name}: {str(e)}")
+
+    @classmethod
+    def get_row_keys_with_prefix(cls, table_name: str, partition_key: str, prefix: str) -> Set[str]:
+        # Keys-only range query over the RowKeys of one partition that start with prefix.
+        parameters = {"pk": partition_key, "start": prefix, "end": prefix[:-1] + chr(ord(prefix[-1]) + 1)}
+        try:
+            entities = cls.run_table_operation(
+                table_name,
+                lambda table_client: list(table_client.query_entities(
+                    query_filter="PartitionKey eq @pk and RowKey ge @start and RowKey lt @end",
+                    parameters=parameters,
+                    select=["PartitionKey", "RowKey"]
+                ))
+            )
+            return {entity["RowKey"] for entity in entities}
+        except Exception as e:
+            raise Exception(f"Error querying keys of partition {partition_key} of table {table_name}: {str(e)}")
+
+    @classmethod
+    def get_partition_entities(cls, table_name: str, partition_key: str, select: List[str] = None) -> List[dict]:
+        # Every row of one partition in a single partition query.
+        try:
+            return cls.run_table_operation(
+                table_name,
+                lambda table_client: list(table_client.query_entities(
+                    query_filter="PartitionKey eq @pk",
+                    parameters={"pk": partition_key},
+                    select=select
+                ))
+            )
+        except Exception as e:
+            raise Exception(f"Error querying partition {partition_key} of table {table_name}: {str(e)}")
+
+    @classmethod
+    def list_entities(cls, table_name: str, select: List[str] = None) -> List[dict]:
+        # Whole-table read, for small lookup tables loaded into memory.
         try:
-            entity = table_client.get_entity(partition_key=partition_key, row_key=row_key)
-            return entity
+            return cls.run_table_operation(table_name, lambda table_client: list(table_client.list_entities(select=select)))
         except Exception as e:
-            logging.error(f"Error retrieving entity from table {table_name}: {str(e)}")
-            return None
\ No newline at end of file
+            raise Exception(f"Error listing entities from table {table_name}: {str(e)}")
@@ -0,0 +1,132 @@
+import logging
+import os
+import threading
+import time
+
+
+class TokenProvider:
+    # One MSAL app and one cached Graph token per worker process.
+    # Tokens are served from memory until they enter the refresh window,
+    # at which point a single background refresh is started while the
+    # current token keeps being served. Callers that find no usable token
+    # block on the lock and share one refresh.
+    scopes = ["https://graph.microsoft.com/.default"]
+
+    msal_app = None
+    access_token = None
+    expires_at = 0.0
+    refreshing = False
+    lock = threading.Lock()
+    # Separate from lock: refresh_token() builds the app while holding lock.
+    app_lock = threading.Lock()
+    refresh_flag_lock = threading.Lock()
+    stats_lock = threading.Lock()
+    stats = {
+        "hits": 0,
+        "misses": 0,
+        "refreshes": 0,
+        "background_refreshes": 0,
+        "failures": 0
+    }
+
+    @classmethod
+    def get_refresh_margin_seconds(cls) -> int:
+        # MSAL only goes back to the identity provider once a cached token is
+        # within 5 minutes of expiry, so the margin should not exceed 300.
+        return int(os.getenv("TOKEN_REFRESH_MARGIN_SECONDS", "300"))
+
+    @classmethod
+    def get_expiry_skew_seconds(cls) -> int:
+        return int(os.getenv("TOKEN_EXPIRY_SKEW_SECONDS", "30"))
+
+    @classmethod
+    def get_msal_app(cls):
+        if cls.msal_app is None:
+            # msal is imported on first use to keep it off the cold-start path.
+            import msal
+            with cls.app_lock:
+                if cls.msal_app is None:
+                    cls.msal_app = msal.ConfidentialClientApplication(
+                        client_id=os.getenv("CLIENT_ID", ""),
+                        client_credential=os.getenv("CLIENT_SECRET", ""),
+                        authority=f"https://login.microsoftonline.com/{os.getenv('TENANT_ID', '')}"
+                    )
+        return cls.msal_app
+
+    @classmethod
+    def count(cls, name: str):
+        with cls.stats_lock:
+            cls.stats[name] += 1
+
+    @classmethod
+    def get_token(cls) -> str:
+        # if token provided in env, use it directly (for testing)
+        env_token = os.getenv("TOKEN", None)
+        if env_token:
+            logging.info("Using token from environment variable.")
+            return env_token
+        now = time.time()
+        token = cls.access_token
+        if token and now < cls.expires_at - cls.get_refresh_margin_seconds():
+            cls.count("hits")
+            return token
+        if token and now < cls.expires_at - cls.get_expiry_skew_seconds():
+            # Still valid but close to expiry: keep serving it and refresh in the background.
+            cls.count("hits")
+            cls.start_background_refresh()
+            return token
+
+        cls.count("misses")
+        with cls.lock:
+            # Another caller may have refreshed while we were waiting for the lock.
+            if cls.access_token and time.time() < cls.expires_at - cls.get_expiry_skew_seconds():
+                return cls.access_token
+            return cls.refresh_token()
+
+    @classmethod
+    def refresh_token(cls) -> str:
+        # Caller must hold cls.lock.
+        app = cls.get_msal_app()
+        result = app.acquire_token_for_client(scopes=cls.scopes)
+        if "access_token" not in result:
+            cls.count("failures")
+            raise Exception(f"Could not obtain access token from MSAL: {result.get('error_description', result.get('error', ''))}")
+        cls.access_token = result["access_token"]
+        cls.expires_at = time.time() + int(result.get("expires_in", 3599))
+        cls.count("refreshes")
+        logging.info(f"Acquired Graph access token, expires in {result.get('expires_in')} seconds.")
+        return cls.access_token
+
+    @classmethod
+    def start_background_refresh(cls):
+        with cls.refresh_flag_lock:
+            if cls.refreshing:
+                return
+            cls.refreshing = True
+        threading.Thread(target=cls.background_refresh, name="graph-token-refresh", daemon=True).start()
+
+    @classmethod
+    def background_refresh(cls):
+        try:
+            with cls.lock:
+                if time.time() < cls.expires_at - cls.get_refresh_margin_seconds():
+                    return
+                cls.refresh_token()
+                cls.count("background_refreshes")
+        except Exception as e:
+            # The current token is still valid; the next caller will retry.
+            logging.error(f"Background token refresh failed: {e}")
+        finally:
+            cls.refreshing = False
+
+    @classmethod
+    def get_stats(cls) -> dict:
+        with cls.stats_lock:
+            stats = dict(cls.stats)
+        return dict(stats, expires_in=max(0, int(cls.expires_at - time.time())))
+
+    @classmethod
+    def invalidate(cls):
+        with cls.lock:
+            cls.access_token = None
+            cls.expires_at = 0.0
@@ -1,8 +1,6 @@
 import azure.functions as func
 import logging
 import os
-from azure.identity import DefaultAzureCredential
-from azure.keyvault.secrets import SecretClient
 from utils.email_dtos import Message
 
 app = func.FunctionApp(http_auth_level=func.AuthLevel.ANONYMOUS)